@@ -0,0 +1,55 @@
+"""
+Benchmark the import time of the package.
+
+It adds to the cold start of serverless functions and short-lived workers.
+
+Each import runs in a fresh interpreter. It reports the median time over
+a few runs, and the optional dependencies it loaded.
+
+    python -m benchmarks.import_time
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+IMPORTS = [
+    "import fastapi_users",
+    "from fastapi_users import FastAPIUsers",
+    "from fastapi_users.db import SQLAlchemyUserDatabase",
+    "from fastapi_users.db import MongoDBUserDatabase",
+    "from fastapi_users.db import TortoiseUserDatabase",
+    "from fastapi_users.router import get_oauth_router",
+]
+OPTIONAL_DEPENDENCIES = ["databases", "httpx_oauth", "motor", "sqlalchemy", "tortoise"]
+RUNS = 5
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+loaded = [name for name in {dependencies!r} if name in sys.modules]
+print(json.dumps({{"duration": duration, "loaded": loaded}}))
+"""
+
+
+def measure(statement: str) -> dict:
+    script = SCRIPT.format(statement=statement, dependencies=OPTIONAL_DEPENDENCIES)
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    print(f"{'import':<54} {'time (ms)':>9}  loaded optional dependencies")
+    for statement in IMPORTS:
+        results = [measure(statement) for _ in range(RUNS)]
+        duration_ms = statistics.median(result["duration"] for result in results) * 1000
+        loaded = ", ".join(results[0]["loaded"]) or "-"
+        print(f"{statement:<54} {duration_ms:>9.0f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark the case-insensitive email lookup of the SQLAlchemy adapter.
+
+It compares the lookup cost with and without the index on the lowercased email
+as the users table grows, on an in-memory SQLite database.
+
+    python -m benchmarks.sqlalchemy_email_lookup
+"""
+import timeit
+import uuid
+
+import sqlalchemy
+from sqlalchemy import func
+from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
+
+from fastapi_users.db.sqlalchemy import SQLAlchemyBaseUserTable
+
+TABLE_SIZES = [1_000, 10_000, 100_000]
+LOOKUPS = 200
+
+
+def create_users_table(engine, size: int) -> sqlalchemy.Table:
+    Base: DeclarativeMeta = declarative_base()
+
+    class User(SQLAlchemyBaseUserTable, Base):
+        pass
+
+    Base.metadata.create_all(engine)
+    users = User.__table__
+    engine.execute(
+        users.insert(),
+        [
+            {
+                "id": uuid.uuid4(),
+                "email": f"User{i}@camelot.bt",
+                "hashed_password": "hashed_password",
+            }
+            for i in range(size)
+        ],
+    )
+    return users
+
+
+def time_lookups(engine, users: sqlalchemy.Table, size: int) -> float:
+    def lookup():
+        email = f"user{size // 2}@camelot.bt"
+        query = users.select().where(func.lower(users.c.email) == func.lower(email))
+        engine.execute(query).fetchone()
+
+    return timeit.timeit(lookup, number=LOOKUPS) / LOOKUPS * 1000
+
+
+def main():
+    print(f"{'users':>10} {'with index (ms)':>16} {'without index (ms)':>19}")
+    for size in TABLE_SIZES:
+        engine = sqlalchemy.create_engine("sqlite://")
+        users = create_users_table(engine, size)
+        with_index = time_lookups(engine, users, size)
+
+        engine.execute(f"DROP INDEX ix_{users.name}_email_lower")
+        without_index = time_lookups(engine, users, size)
+
+        print(f"{size:>10} {with_index:>16.3f} {without_index:>19.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark the retrieval of a user by the Tortoise ORM adapter.
+
+It compares the former reflective `to_dict`, which queries again the OAuth
+accounts already retrieved with `prefetch_related`, with the current one,
+on an in-memory SQLite database.
+
+    python -m benchmarks.tortoise_to_dict
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+from tortoise import Tortoise, fields
+
+from fastapi_users import models
+from fastapi_users.db.tortoise import (
+    TortoiseBaseOAuthAccountModel,
+    TortoiseBaseUserModel,
+    TortoiseUserDatabase,
+)
+
+OAUTH_ACCOUNTS_COUNTS = [0, 1, 5]
+LOOKUPS = 1_000
+
+
+class User(models.BaseUser, models.BaseOAuthAccountMixin):
+    pass
+
+
+class UserDB(User, models.BaseUserDB):
+    pass
+
+
+class UserModel(TortoiseBaseUserModel):
+    pass
+
+
+class OAuthAccountModel(TortoiseBaseOAuthAccountModel):
+    user = fields.ForeignKeyField("models.UserModel", related_name="oauth_accounts")
+
+
+async def legacy_to_dict(self):
+    d = {}
+    for field in self._meta.db_fields:
+        d[field] = getattr(self, field)
+    for field in self._meta.backward_fk_fields:
+        d[field] = await getattr(self, field).all().values()
+    return d
+
+
+async def create_user(user_db: TortoiseUserDatabase, oauth_accounts_count: int):
+    user = UserDB(
+        email=f"{uuid.uuid4()}@camelot.bt",
+        hashed_password="hashed_password",
+        oauth_accounts=[
+            models.BaseOAuthAccount(
+                oauth_name=f"service{i}",
+                access_token="TOKEN",
+                expires_at=1579000751,
+                account_id=str(uuid.uuid4()),
+                account_email="king.arthur@camelot.bt",
+            )
+            for i in range(oauth_accounts_count)
+        ],
+    )
+    return await user_db.create(user)
+
+
+async def time_lookups(user_db: TortoiseUserDatabase, user: UserDB) -> float:
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        await user_db.get(user.id)
+    return (time.perf_counter() - start) / LOOKUPS * 1000
+
+
+async def main():
+    # Register the models of this very module, even when run as __main__
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": [sys.modules[__name__]]}
+    )
+    await Tortoise.generate_schemas()
+    user_db = TortoiseUserDatabase(UserDB, UserModel, OAuthAccountModel)
+
+    print(f"{'OAuth accounts':>14} {'current (ms)':>13} {'legacy (ms)':>12}")
+    for oauth_accounts_count in OAUTH_ACCOUNTS_COUNTS:
+        user = await create_user(user_db, oauth_accounts_count)
+
+        current = await time_lookups(user_db, user)
+
+        to_dict = UserModel.to_dict
+        UserModel.to_dict = legacy_to_dict  # type: ignore
+        legacy = await time_lookups(user_db, user)
+        UserModel.to_dict = to_dict  # type: ignore
+
+        print(f"{oauth_accounts_count:>14} {current:>13.3f} {legacy:>12.3f}")
+
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Benchmark the construction of users read from the database.
+
+It compares the CPU time spent building a user with pydantic validation,
+the default, and without it, with `validate_on_load=False`,
+for users with more or less OAuth accounts.
+
+    python -m benchmarks.trusted_construction
+"""
+import timeit
+import uuid
+
+from fastapi_users import models
+from fastapi_users.db.base import construct_trusted_model
+
+OAUTH_ACCOUNTS_COUNTS = [0, 1, 5]
+CONSTRUCTIONS = 10_000
+
+
+class User(models.BaseUser, models.BaseOAuthAccountMixin):
+    pass
+
+
+class UserDB(User, models.BaseUserDB):
+    pass
+
+
+def get_user_dict(oauth_accounts_count: int) -> dict:
+    """Return a user as read from the database, with a foreign key on the accounts."""
+    user_id = uuid.uuid4()
+    return {
+        "id": user_id,
+        "email": "king.arthur@camelot.bt",
+        "hashed_password": "$2b$12$KtKSh5Y0RrBwhXm5MB4Wze8hqPp9xAX5Q.OVkWMPSNpoM7",
+        "is_active": True,
+        "is_superuser": False,
+        "oauth_accounts": [
+            {
+                "id": uuid.uuid4(),
+                "oauth_name": f"service{i}",
+                "access_token": "TOKEN",
+                "expires_at": 1579000751,
+                "refresh_token": None,
+                "account_id": str(uuid.uuid4()),
+                "account_email": "king.arthur@camelot.bt",
+                "user_id": user_id,
+            }
+            for i in range(oauth_accounts_count)
+        ],
+    }
+
+
+def main():
+    print(f"{'OAuth accounts':>14} {'validated (µs)':>15} {'trusted (µs)':>13}")
+    for oauth_accounts_count in OAUTH_ACCOUNTS_COUNTS:
+        user_dict = get_user_dict(oauth_accounts_count)
+        assert construct_trusted_model(UserDB, user_dict) == UserDB(**user_dict)
+
+        validated = timeit.timeit(lambda: UserDB(**user_dict), number=CONSTRUCTIONS)
+        trusted = timeit.timeit(
+            lambda: construct_trusted_model(UserDB, user_dict), number=CONSTRUCTIONS
+        )
+
+        validated_us = validated / CONSTRUCTIONS * 1_000_000
+        trusted_us = trusted / CONSTRUCTIONS * 1_000_000
+        print(f"{oauth_accounts_count:>14} {validated_us:>15.1f} {trusted_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,28 @@
 
 __version__ = "3.0.7"
 
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
 from fastapi_users import models  # noqa: F401
-from fastapi_users.fastapi_users import FastAPIUsers  # noqa: F401
+
+if TYPE_CHECKING:  # pragma: no cover
+    from fastapi_users.fastapi_users import FastAPIUsers  # noqa: F401
+
+# Exports imported on first access (PEP 562), so importing a submodule,
+# e.g. in a worker only hashing passwords, doesn't load FastAPI and the routers
+_LAZY_EXPORTS = {
+    "FastAPIUsers": "fastapi_users.fastapi_users",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_LAZY_EXPORTS])
@@ -68,37 +68,40 @@ class Authenticator:
         async def get_optional_current_user(*args, **kwargs):
             return await self._authenticate(*args, **kwargs)
 
-        @with_signature(signature, func_name="get_optional_current_active_user")
-        async def get_optional_current_active_user(*args, **kwargs):
-            user = await get_optional_current_user(*args, **kwargs)
+        # The other callables depend on the one above instead of calling it.
+        # This way, FastAPI caches the authenticated user for the whole request,
+        # even if a route depends on several of them.
+        async def get_optional_current_active_user(
+            user: Optional[BaseUserDB] = Depends(get_optional_current_user),
+        ):
             if not user or not user.is_active:
                 return None
             return user
 
-        @with_signature(signature, func_name="get_optional_current_superuser")
-        async def get_optional_current_superuser(*args, **kwargs):
-            user = await get_optional_current_active_user(*args, **kwargs)
+        async def get_optional_current_superuser(
+            user: Optional[BaseUserDB] = Depends(get_optional_current_active_user),
+        ):
             if not user or not user.is_superuser:
                 return None
             return user
 
-        @with_signature(signature, func_name="get_current_user")
-        async def get_current_user(*args, **kwargs):
-            user = await get_optional_current_user(*args, **kwargs)
+        async def get_current_user(
+            user: Optional[BaseUserDB] = Depends(get_optional_current_user),
+        ):
             if user is None:
                 raise self._get_credentials_exception()
             return user
 
-        @with_signature(signature, func_name="get_current_active_user")
-        async def get_current_active_user(*args, **kwargs):
-            user = await get_optional_current_active_user(*args, **kwargs)
+        async def get_current_active_user(
+            user: Optional[BaseUserDB] = Depends(get_optional_current_active_user),
+        ):
             if user is None:
                 raise self._get_credentials_exception()
             return user
 
-        @with_signature(signature, func_name="get_current_superuser")
-        async def get_current_superuser(*args, **kwargs):
-            user = await get_optional_current_active_user(*args, **kwargs)
+        async def get_current_superuser(
+            user: Optional[BaseUserDB] = Depends(get_optional_current_active_user),
+        ):
             if user is None:
                 raise self._get_credentials_exception()
             if not user.is_superuser:
@@ -1,15 +1,37 @@
-from typing import Any, Optional
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Type
 
 import jwt
 from fastapi import Response
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import UUID4
+from pydantic import UUID4, ValidationError
 
 from fastapi_users.authentication.base import BaseAuthentication
 from fastapi_users.db.base import BaseUserDatabase
-from fastapi_users.models import BaseUserDB
+from fastapi_users.models import BaseUserDB, UserFromClaims
 from fastapi_users.utils import JWT_ALGORITHM, generate_jwt
 
+STATELESS_CLAIMS_FIELDS = ("email", "is_active", "is_superuser")
+
+
+@lru_cache(maxsize=None)
+def get_user_from_claims_model(user_db_model: Type[BaseUserDB]) -> Type[BaseUserDB]:
+    """
+    Return the model of the users built from the claims of a stateless JWT.
+
+    It's a subclass of the user DB model, marked with `UserFromClaims`,
+    whose password hash is `None` since it's never signed into the token.
+    """
+
+    class Model(UserFromClaims, user_db_model):  # type: ignore
+        hashed_password: Optional[str] = None  # type: ignore
+
+    Model.__name__ = f"{user_db_model.__name__}FromClaims"
+    Model.__qualname__ = Model.__name__
+    return Model
+
 
 class JWTAuthentication(BaseAuthentication[str]):
     """
@@ -19,12 +41,21 @@ class JWTAuthentication(BaseAuthentication[str]):
     :param lifetime_seconds: Lifetime duration of the JWT in seconds.
     :param tokenUrl: Path where to get a token.
     :param name: Name of the backend. It will be used to name the login route.
+    :param stateless: Whether to sign the user data into the JWT
+    and build the user from it instead of querying the database.
+    :param extra_claims_fields: Additional user fields to sign into the JWT
+    in stateless mode.
+    :param max_staleness_seconds: In stateless mode, maximum age of a JWT
+    before the user is retrieved from the database again.
     """
 
     scheme: OAuth2PasswordBearer
     token_audience: str = "fastapi-users:auth"
     secret: str
     lifetime_seconds: int
+    stateless: bool
+    claims_fields: Sequence[str]
+    max_staleness_seconds: Optional[int]
 
     def __init__(
         self,
@@ -32,11 +63,17 @@ class JWTAuthentication(BaseAuthentication[str]):
         lifetime_seconds: int,
         tokenUrl: str = "/login",
         name: str = "jwt",
+        stateless: bool = False,
+        extra_claims_fields: Sequence[str] = (),
+        max_staleness_seconds: Optional[int] = None,
     ):
         super().__init__(name, logout=False)
         self.scheme = OAuth2PasswordBearer(tokenUrl, auto_error=False)
         self.secret = secret
         self.lifetime_seconds = lifetime_seconds
+        self.stateless = stateless
+        self.claims_fields = (*STATELESS_CLAIMS_FIELDS, *extra_claims_fields)
+        self.max_staleness_seconds = max_staleness_seconds
 
     async def __call__(
         self,
@@ -61,14 +98,42 @@ class JWTAuthentication(BaseAuthentication[str]):
 
         try:
             user_uiid = UUID4(user_id)
-            return await user_db.get(user_uiid)
         except ValueError:
             return None
 
+        if self.stateless and self._is_fresh(data):
+            return self._make_user_from_claims(user_db, user_uiid, data.get("user", {}))
+
+        return await user_db.get(user_uiid)
+
     async def get_login_response(self, user: BaseUserDB, response: Response) -> Any:
         token = await self._generate_token(user)
         return {"access_token": token, "token_type": "bearer"}
 
     async def _generate_token(self, user: BaseUserDB) -> str:
-        data = {"user_id": str(user.id), "aud": self.token_audience}
+        data: Dict[str, Any] = {"user_id": str(user.id), "aud": self.token_audience}
+        if self.stateless:
+            data["user"] = json.loads(user.json(include=set(self.claims_fields)))
+            data["iat"] = datetime.utcnow()
         return generate_jwt(data, self.lifetime_seconds, self.secret, JWT_ALGORITHM)
+
+    def _is_fresh(self, data: Dict[str, Any]) -> bool:
+        if "user" not in data or "iat" not in data:
+            return False
+        if self.max_staleness_seconds is None:
+            return True
+        issued_at = datetime.utcfromtimestamp(data["iat"])
+        max_staleness = timedelta(seconds=self.max_staleness_seconds)
+        return datetime.utcnow() - issued_at <= max_staleness
+
+    def _make_user_from_claims(
+        self,
+        user_db: BaseUserDatabase[BaseUserDB],
+        user_id: UUID4,
+        claims: Dict[str, Any],
+    ) -> Optional[BaseUserDB]:
+        user_model = get_user_from_claims_model(user_db.user_db_model)
+        try:
+            return user_model(id=user_id, **claims)
+        except ValidationError:
+            return None
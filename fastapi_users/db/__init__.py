@@ -1,24 +1,50 @@
-from fastapi_users.db.base import BaseUserDatabase  # noqa: F401
+import importlib
+from typing import TYPE_CHECKING, Any, List
 
-try:
-    from fastapi_users.db.mongodb import MongoDBUserDatabase  # noqa: F401
-except ImportError:  # pragma: no cover
-    pass
+from fastapi_users.db.base import (  # noqa: F401
+    BaseUserDatabase,
+    UserAlreadyExists,
+    UserNotWritable,
+)
+from fastapi_users.db.cache import CachedUserDatabase  # noqa: F401
+from fastapi_users.db.loader import BatchingUserDatabase  # noqa: F401
+from fastapi_users.db.proxy import UserDatabaseProxy  # noqa: F401
+from fastapi_users.db.singleflight import SingleFlightUserDatabase  # noqa: F401
 
-try:
+if TYPE_CHECKING:  # pragma: no cover
+    from fastapi_users.db.mongodb import MongoDBUserDatabase  # noqa: F401
     from fastapi_users.db.sqlalchemy import (  # noqa: F401
         SQLAlchemyBaseOAuthAccountTable,
         SQLAlchemyBaseUserTable,
         SQLAlchemyUserDatabase,
     )
-except ImportError:  # pragma: no cover
-    pass
-
-try:
     from fastapi_users.db.tortoise import (  # noqa: F401
         TortoiseBaseOAuthAccountModel,
         TortoiseBaseUserModel,
         TortoiseUserDatabase,
     )
-except ImportError:  # pragma: no cover
-    pass
+
+# Adapters imported on first access (PEP 562), so only the driver
+# of the database in use is loaded, even if others are installed
+_LAZY_EXPORTS = {
+    "MongoDBUserDatabase": "fastapi_users.db.mongodb",
+    "SQLAlchemyBaseOAuthAccountTable": "fastapi_users.db.sqlalchemy",
+    "SQLAlchemyBaseUserTable": "fastapi_users.db.sqlalchemy",
+    "SQLAlchemyUserDatabase": "fastapi_users.db.sqlalchemy",
+    "TortoiseBaseOAuthAccountModel": "fastapi_users.db.tortoise",
+    "TortoiseBaseUserModel": "fastapi_users.db.tortoise",
+    "TortoiseUserDatabase": "fastapi_users.db.tortoise",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Raises an ImportError naming the missing driver if it's not installed
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_LAZY_EXPORTS])
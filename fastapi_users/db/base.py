@@ -1,10 +1,167 @@
-from typing import Generic, Optional, Type
+import uuid
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from fastapi.security import OAuth2PasswordRequestForm
-from pydantic import UUID4
+from pydantic import UUID4, BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+from pydantic.utils import lenient_issubclass
 
 from fastapi_users import password
-from fastapi_users.models import UD
+from fastapi_users.models import UD, UserFromClaims, UserListFilters
+
+# SQLSTATE of unique violations (PostgreSQL) and error code of duplicate entries (MySQL)
+UNIQUE_VIOLATION_SQLSTATE = "23505"
+DUPLICATE_ENTRY_MYSQL_ERROR = 1062
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class UserAlreadyExists(Exception):
+    """A user with the same email, or id, already exists."""
+
+
+class UserNotWritable(Exception):
+    """The user was built from JWT claims: retrieve it from the database first."""
+
+
+def check_writable(user: UD) -> None:
+    """
+    Refuse to write a user built from the claims of a stateless JWT.
+
+    Writing it back would erase its password hash
+    and the other fields which are not in the claims.
+
+    :raises UserNotWritable: The user was built from claims.
+    """
+    if isinstance(user, UserFromClaims):
+        raise UserNotWritable()
+
+
+def is_unique_violation(error: BaseException) -> bool:
+    """
+    Return whether a database driver error is a unique constraint violation.
+
+    Wrapped errors, like the ones raised by SQLAlchemy or Tortoise ORM,
+    are unwrapped.
+    """
+    original_error = getattr(error, "orig", None)
+    if isinstance(original_error, BaseException):
+        return is_unique_violation(original_error)
+    if error.args and isinstance(error.args[0], BaseException):
+        return is_unique_violation(error.args[0])
+
+    # asyncpg and psycopg2
+    for attribute in ("sqlstate", "pgcode"):
+        if getattr(error, attribute, None) == UNIQUE_VIOLATION_SQLSTATE:
+            return True
+    # PyMySQL and aiomysql
+    if error.args and error.args[0] == DUPLICATE_ENTRY_MYSQL_ERROR:
+        return True
+    # SQLite
+    return "UNIQUE constraint failed" in str(error)
+
+
+@lru_cache(maxsize=None)
+def _get_construct_plan(
+    model: Type[BaseModel],
+) -> Tuple[Tuple[str, Optional[Type[BaseModel]], bool, bool], ...]:
+    """
+    Compute once per model how to build it from trusted data.
+
+    :return: For each field, its name, its nested model if any,
+    whether it's a list of this model and whether it's a UUID.
+    """
+    plan = []
+    for name, field in model.__fields__.items():
+        nested_model: Optional[Type[BaseModel]] = None
+        if lenient_issubclass(field.type_, BaseModel) and field.shape in (
+            SHAPE_LIST,
+            SHAPE_SINGLETON,
+        ):
+            nested_model = field.type_
+        is_uuid = lenient_issubclass(field.type_, uuid.UUID)
+        plan.append((name, nested_model, field.shape == SHAPE_LIST, is_uuid))
+    return tuple(plan)
+
+
+def construct_trusted_model(model: Type[M], data: Mapping[str, Any]) -> M:
+    """
+    Build a model from trusted data, like our own database rows, without validation.
+
+    Unlike pydantic's `construct`, keys which are not fields are ignored,
+    nested models are built the same way and UUID strings are converted.
+
+    :param model: Pydantic model.
+    :param data: Field values, already of the types of the fields.
+    """
+    values = {}
+    for name, nested_model, is_list, is_uuid in _get_construct_plan(model):
+        if name not in data:
+            continue
+        value = data[name]
+        if nested_model is not None and value is not None:
+            if is_list:
+                value = [construct_trusted_model(nested_model, v) for v in value]
+            else:
+                value = construct_trusted_model(nested_model, value)
+        elif is_uuid and isinstance(value, str):
+            value = uuid.UUID(value)
+        values[name] = value
+    return model.construct(**values)
+
+
+def oauth_accounts_loaded(user: UD) -> bool:
+    """
+    Return whether the OAuth accounts of a user were loaded.
+
+    Adapters may skip retrieving them. The user then has an empty list
+    which wasn't explicitly set and shouldn't be written back.
+    """
+    return bool(getattr(user, "oauth_accounts", None)) or (
+        "oauth_accounts" in user.__fields_set__
+    )
+
+
+def diff_oauth_accounts(
+    existing_oauth_accounts: Iterable[Mapping[str, Any]],
+    oauth_accounts: Iterable[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[UUID4]]:
+    """
+    Compare the OAuth accounts stored in database with the ones of a user.
+
+    Accounts are matched by id. Only the fields of the user's accounts
+    are compared, so extra database columns like the user foreign key are ignored.
+
+    :return: A tuple with the accounts to insert, the accounts to update
+    and the ids of the accounts to delete.
+    """
+    existing_by_id = {account["id"]: account for account in existing_oauth_accounts}
+    to_insert = []
+    to_update = []
+    for oauth_account in oauth_accounts:
+        existing_oauth_account = existing_by_id.pop(oauth_account["id"], None)
+        if existing_oauth_account is None:
+            to_insert.append(oauth_account)
+        elif any(
+            existing_oauth_account[field] != value
+            for field, value in oauth_account.items()
+        ):
+            to_update.append(oauth_account)
+    return to_insert, to_update, list(existing_by_id)
 
 
 class BaseUserDatabase(Generic[UD]):
@@ -15,6 +172,7 @@ class BaseUserDatabase(Generic[UD]):
     """
 
     user_db_model: Type[UD]
+    validate_on_load: bool = True
 
     def __init__(self, user_db_model: Type[UD]):
         self.user_db_model = user_db_model
@@ -31,18 +189,132 @@ class BaseUserDatabase(Generic[UD]):
         """Get a single user by OAuth account id."""
         raise NotImplementedError()
 
+    async def get_many(self, ids: Iterable[UUID4]) -> Dict[UUID4, UD]:
+        """
+        Get several users by id.
+
+        Defaults to one `get` per id. Adapters may override it
+        to retrieve them in a single query.
+
+        :return: A mapping of the ids to the users. Unknown ids are left out.
+        """
+        users = {}
+        for id in set(ids):
+            user = await self.get(id)
+            if user is not None:
+                users[id] = user
+        return users
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, UD]:
+        """
+        Get several users by email.
+
+        Defaults to one `get_by_email` per email. Adapters may override it
+        to retrieve them in a single query.
+
+        :return: A mapping of the lowercased emails to the users.
+        Unknown emails are left out.
+        """
+        users = {}
+        for email in {email.lower() for email in emails}:
+            user = await self.get_by_email(email)
+            if user is not None:
+                users[email] = user
+        return users
+
+    async def list(
+        self,
+        cursor: Optional[UUID4] = None,
+        limit: int = 100,
+        filters: Optional[UserListFilters] = None,
+    ) -> List[UD]:
+        """
+        List users ordered by id, a page at a time.
+
+        Pages are retrieved by keyset: the next page starts after
+        the id of the last user of the previous one, so deep pages
+        are as cheap as the first one.
+
+        :param cursor: Id of the last user of the previous page.
+        None to get the first page.
+        :param limit: Maximum number of users to return.
+        :param filters: Optional filters on the users.
+        """
+        raise NotImplementedError()
+
+    async def iterate(self, batch_size: int = 1000) -> AsyncIterator[UD]:
+        """
+        Iterate over all the users ordered by id, without loading them all in memory.
+
+        Defaults to retrieving them a page of `batch_size` users at a time
+        with `list`. Adapters may override it to stream them from a cursor.
+
+        :param batch_size: Number of users retrieved at a time.
+        """
+        cursor: Optional[UUID4] = None
+        while True:
+            users = await self.list(cursor, batch_size)
+            for user in users:
+                yield user
+            if len(users) < batch_size:
+                return
+            cursor = users[-1].id
+
     async def create(self, user: UD) -> UD:
-        """Create a user."""
+        """
+        Create a user.
+
+        :raises UserAlreadyExists: A user with the same email,
+        regardless of case, already exists.
+        """
         raise NotImplementedError()
 
+    async def create_many(self, users: Sequence[UD]) -> List[int]:
+        """
+        Create several users at once, skipping the ones which already exist.
+
+        Defaults to creating them one by one.
+        Adapters may override it to insert them in bulk.
+
+        :param users: Users to create.
+        :return: The indexes in `users` of the users which already existed.
+        """
+        existing_indexes = []
+        for index, user in enumerate(users):
+            try:
+                await self.create(user)
+            except UserAlreadyExists:
+                existing_indexes.append(index)
+        return existing_indexes
+
     async def update(self, user: UD) -> UD:
         """Update a user."""
         raise NotImplementedError()
 
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        """
+        Update only some fields of a user.
+
+        Adapters may override it to write only those fields.
+        Defaults to a full update.
+        """
+        return await self.update(user)
+
     async def delete(self, user: UD) -> None:
         """Delete a user."""
         raise NotImplementedError()
 
+    def _load_user(self, user_dict: Mapping[str, Any]) -> UD:
+        """
+        Build a user read from the database.
+
+        It's validated by the user DB model,
+        unless `validate_on_load` is disabled.
+        """
+        if self.validate_on_load:
+            return self.user_db_model(**user_dict)
+        return construct_trusted_model(self.user_db_model, user_dict)
+
     async def authenticate(
         self, credentials: OAuth2PasswordRequestForm
     ) -> Optional[UD]:
@@ -56,10 +328,13 @@ class BaseUserDatabase(Generic[UD]):
         if user is None:
             # Run the hasher to mitigate timing attack
             # Inspired from Django: https://code.djangoproject.com/ticket/20760
-            password.get_password_hash(credentials.password)
+            await password.verify_dummy_password_async(credentials.password)
             return None
 
-        verified, updated_password_hash = password.verify_and_update_password(
+        (
+            verified,
+            updated_password_hash,
+        ) = await password.verify_and_update_password_async(
             credentials.password, user.hashed_password
         )
         if not verified:
@@ -67,6 +342,6 @@ class BaseUserDatabase(Generic[UD]):
         # Update password hash to a more robust one if needed
         if updated_password_hash is not None:
             user.hashed_password = updated_password_hash
-            await self.update(user)
+            await self.update_fields(user, {"hashed_password"})
 
         return user
@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from pydantic import UUID4
+
+from fastapi_users.db.base import BaseUserDatabase
+from fastapi_users.db.proxy import UserDatabaseProxy
+from fastapi_users.models import UD
+
+
+class CachedUserDatabase(UserDatabaseProxy[UD]):
+    """
+    Database adapter caching the users retrieved by id.
+
+    Entries expire after `ttl_seconds`. When the cache is full,
+    the least recently used entry is evicted. Entries are invalidated
+    when a user is updated or deleted through this adapter.
+
+    :param user_db: Database adapter instance to wrap.
+    :param ttl_seconds: Lifetime of a cache entry in seconds.
+    :param max_size: Maximum number of users kept in cache.
+    """
+
+    ttl_seconds: float
+    max_size: int
+    hits: int
+    misses: int
+    _cache: "OrderedDict[UUID4, Tuple[float, UD]]"
+
+    def __init__(
+        self,
+        user_db: BaseUserDatabase[UD],
+        ttl_seconds: float = 60,
+        max_size: int = 1024,
+    ):
+        super().__init__(user_db)
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    async def get(self, id: UUID4) -> Optional[UD]:
+        entry = self._cache.get(id)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                self._cache.move_to_end(id)
+                # Return a copy so callers can't alter the cached entry
+                return user.copy(deep=True)
+            del self._cache[id]
+
+        self.misses += 1
+        user = await self.user_db.get(id)
+        if user is not None:
+            self._cache[id] = (
+                time.monotonic() + self.ttl_seconds,
+                user.copy(deep=True),
+            )
+            self._cache.move_to_end(id)
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return user
+
+    async def update(self, user: UD) -> UD:
+        self.invalidate(user.id)
+        updated_user = await self.user_db.update(user)
+        self.invalidate(user.id)
+        return updated_user
+
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        self.invalidate(user.id)
+        updated_user = await self.user_db.update_fields(user, fields)
+        self.invalidate(user.id)
+        return updated_user
+
+    async def delete(self, user: UD) -> None:
+        self.invalidate(user.id)
+        await self.user_db.delete(user)
+        self.invalidate(user.id)
+
+    def invalidate(self, id: UUID4) -> None:
+        """Remove a single user from the cache."""
+        self._cache.pop(id, None)
+
+    def clear(self) -> None:
+        """Remove every user from the cache."""
+        self._cache.clear()
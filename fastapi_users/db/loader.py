@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from pydantic import UUID4
+
+from fastapi_users.db.base import BaseUserDatabase
+from fastapi_users.db.proxy import UserDatabaseProxy
+from fastapi_users.models import UD
+
+PendingLookups = Dict[Hashable, List["asyncio.Future[Optional[Any]]"]]
+
+
+class BatchingUserDatabase(UserDatabaseProxy[UD]):
+    """
+    Database adapter batching the user lookups of one event loop iteration.
+
+    The lookups by id, respectively by email, issued during the same
+    iteration of the event loop are resolved by a single `get_many`,
+    respectively `get_many_by_email`, call on the next one.
+
+    :param user_db: Database adapter instance to wrap.
+    """
+
+    calls: int
+    batches: int
+    _pending_ids: PendingLookups
+    _pending_emails: PendingLookups
+
+    def __init__(self, user_db: BaseUserDatabase[UD]):
+        super().__init__(user_db)
+        self.calls = 0
+        self.batches = 0
+        self._pending_ids = {}
+        self._pending_emails = {}
+
+    async def get(self, id: UUID4) -> Optional[UD]:
+        return await self._enqueue(self._pending_ids, id, self._load_ids)
+
+    async def get_by_email(self, email: str) -> Optional[UD]:
+        return await self._enqueue(
+            self._pending_emails, email.lower(), self._load_emails
+        )
+
+    def _enqueue(
+        self,
+        pending: PendingLookups,
+        key: Hashable,
+        load: Callable[[], Awaitable[None]],
+    ) -> "asyncio.Future[Optional[UD]]":
+        self.calls += 1
+        loop = asyncio.get_event_loop()
+        if not pending:
+            # Let the other tasks of this iteration enqueue their lookups first
+            loop.call_soon(lambda: asyncio.ensure_future(load()))
+        future: "asyncio.Future[Optional[UD]]" = loop.create_future()
+        pending.setdefault(key, []).append(future)
+        return future
+
+    async def _load_ids(self):
+        pending, self._pending_ids = self._pending_ids, {}
+        await self._load(pending, self.user_db.get_many)
+
+    async def _load_emails(self):
+        pending, self._pending_emails = self._pending_emails, {}
+        await self._load(pending, self.user_db.get_many_by_email)
+
+    async def _load(
+        self,
+        pending: PendingLookups,
+        get_many: Callable[[Iterable], Awaitable[Dict]],
+    ):
+        self.batches += 1
+        try:
+            users = await get_many(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in pending.items():
+            user = users.get(key)
+            for index, future in enumerate(futures):
+                if not future.done():
+                    # Each caller gets its own copy, so they can't alter
+                    # each other's user
+                    future.set_result(
+                        user.copy(deep=True) if user is not None and index else user
+                    )
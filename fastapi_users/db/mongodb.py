@@ -1,11 +1,26 @@
-from typing import Optional, Type
+import asyncio
+import logging
+import re
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Type
 
 from motor.motor_asyncio import AsyncIOMotorCollection
 from pydantic import UUID4
+from pymongo import ASCENDING, IndexModel
 from pymongo.collation import Collation
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from fastapi_users.db.base import BaseUserDatabase
-from fastapi_users.models import UD
+from fastapi_users.db.base import (
+    BaseUserDatabase,
+    UserAlreadyExists,
+    check_writable,
+    oauth_accounts_loaded,
+)
+from fastapi_users.models import UD, UserListFilters
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+CASE_INSENSITIVE_EMAIL_INDEX = "case_insensitive_email_index"
+
+logger = logging.getLogger("fastapi_users")
 
 
 class MongoDBUserDatabase(BaseUserDatabase[UD]):
@@ -14,59 +29,261 @@ class MongoDBUserDatabase(BaseUserDatabase[UD]):
 
     :param user_db_model: Pydantic model of a DB representation of a user.
     :param collection: Collection instance from `motor`.
+    :param email_collation: Collation used for case-insensitive email lookups.
+    :param load_oauth_accounts_on_get: Whether to load the OAuth accounts
+    when getting a user by id. Disable it to keep their tokens out of
+    the documents read on the authentication path if you don't need them there.
+    :param validate_on_load: Whether to validate the users read from the database
+    with the user DB model. Disable it to build them faster from the stored values,
+    which must then already have the types of the model fields:
+    custom validators are not run.
     """
 
     collection: AsyncIOMotorCollection
     email_collation: Collation
+    load_oauth_accounts_on_get: bool
+    indexes_initialized: bool
+    email_index_unique: bool
+    _init_indexes_lock: Optional[asyncio.Lock]
 
     def __init__(
         self,
         user_db_model: Type[UD],
         collection: AsyncIOMotorCollection,
         email_collation: Optional[Collation] = None,
+        load_oauth_accounts_on_get: bool = True,
+        validate_on_load: bool = True,
     ):
         super().__init__(user_db_model)
         self.collection = collection
-        self.collection.create_index("id", unique=True)
-        self.collection.create_index("email", unique=True)
 
         if email_collation:
             self.email_collation = email_collation  # pragma: no cover
         else:
             self.email_collation = Collation("en", strength=2)
 
-        self.collection.create_index(
-            "email",
-            name="case_insensitive_email_index",
-            collation=self.email_collation,
-        )
+        self.load_oauth_accounts_on_get = load_oauth_accounts_on_get
+        self.validate_on_load = validate_on_load
+        self.indexes_initialized = False
+        self.email_index_unique = True
+        self._init_indexes_lock = None
+
+    async def init_indexes(self) -> List[str]:
+        """
+        Create the indexes of the users collection if they don't exist yet.
+
+        It's safe to call it several times, e.g. on the startup of each worker.
+        Otherwise, it's called before the first operation on the collection.
+
+        The case-insensitive email index used not to be unique. If the
+        collection still has this version, an error is logged and case
+        variants of an existing email are looked up before each insert.
+
+        :return: The names of the indexes which were created.
+        """
+        if self._init_indexes_lock is None:
+            self._init_indexes_lock = asyncio.Lock()
+
+        async with self._init_indexes_lock:
+            if self.indexes_initialized:
+                return []
+
+            existing_indexes = await self.collection.index_information()
+            email_index = existing_indexes.get(CASE_INSENSITIVE_EMAIL_INDEX)
+            if email_index is not None and not email_index.get("unique"):
+                self.email_index_unique = False
+                logger.error(
+                    "The index %s is not unique: case variants of an existing "
+                    "email are looked up before each insert. Drop it to let "
+                    "the adapter create the unique one.",
+                    CASE_INSENSITIVE_EMAIL_INDEX,
+                )
+            missing_indexes = [
+                index
+                for index in self._get_indexes()
+                if index.document["name"] not in existing_indexes
+            ]
+
+            created_indexes: List[str] = []
+            if missing_indexes:
+                created_indexes = await self.collection.create_indexes(missing_indexes)
+
+            self.indexes_initialized = True
+            return created_indexes
 
     async def get(self, id: UUID4) -> Optional[UD]:
-        user = await self.collection.find_one({"id": id})
-        return self.user_db_model(**user) if user else None
+        await self._ensure_indexes()
+        user = await self.collection.find_one({"id": id}, self._get_projection())
+        return self._load_user(user) if user else None
 
     async def get_by_email(self, email: str) -> Optional[UD]:
+        await self._ensure_indexes()
         user = await self.collection.find_one(
             {"email": email}, collation=self.email_collation
         )
-        return self.user_db_model(**user) if user else None
+        return self._load_user(user) if user else None
 
     async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[UD]:
+        await self._ensure_indexes()
         user = await self.collection.find_one(
             {
-                "oauth_accounts.oauth_name": oauth,
-                "oauth_accounts.account_id": account_id,
+                "oauth_accounts": {
+                    "$elemMatch": {"oauth_name": oauth, "account_id": account_id}
+                }
             }
         )
-        return self.user_db_model(**user) if user else None
+        return self._load_user(user) if user else None
+
+    async def get_many(self, ids: Iterable[UUID4]) -> Dict[UUID4, UD]:
+        await self._ensure_indexes()
+        ids = list(set(ids))
+        if not ids:
+            return {}
+        documents = self.collection.find({"id": {"$in": ids}}, self._get_projection())
+        users = await documents.to_list(length=None)
+        return {user["id"]: self._load_user(user) for user in users}
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, UD]:
+        await self._ensure_indexes()
+        emails = list({email.lower() for email in emails})
+        if not emails:
+            return {}
+        documents = self.collection.find(
+            {"email": {"$in": emails}}, collation=self.email_collation
+        )
+        users = await documents.to_list(length=None)
+        return {user["email"].lower(): self._load_user(user) for user in users}
+
+    async def list(
+        self,
+        cursor: Optional[UUID4] = None,
+        limit: int = 100,
+        filters: Optional[UserListFilters] = None,
+    ) -> List[UD]:
+        await self._ensure_indexes()
+        query: Dict[str, Any] = {}
+        if cursor is not None:
+            query["id"] = {"$gt": cursor}
+        if filters is not None:
+            if filters.is_active is not None:
+                query["is_active"] = filters.is_active
+            if filters.is_superuser is not None:
+                query["is_superuser"] = filters.is_superuser
+            if filters.email_prefix:
+                query["email"] = {
+                    "$regex": f"^{re.escape(filters.email_prefix)}",
+                    "$options": "i",
+                }
+
+        # Walk the unique index on id rather than skipping documents
+        documents = self.collection.find(query, self._get_projection())
+        documents = documents.sort("id", ASCENDING).limit(limit)
+        users = await documents.to_list(length=limit)
+        return [self._load_user(user) for user in users]
+
+    async def iterate(self, batch_size: int = 1000) -> AsyncIterator[UD]:
+        await self._ensure_indexes()
+        documents = self.collection.find({}, self._get_projection())
+        documents = documents.sort("id", ASCENDING).batch_size(batch_size)
+        async for user in documents:
+            yield self._load_user(user)
 
     async def create(self, user: UD) -> UD:
-        await self.collection.insert_one(user.dict())
+        await self._ensure_indexes()
+        if not self.email_index_unique:
+            if await self.get_by_email(str(user.email)) is not None:
+                raise UserAlreadyExists()
+        try:
+            await self.collection.insert_one(user.dict())
+        except DuplicateKeyError as e:
+            raise UserAlreadyExists() from e
         return user
 
+    async def create_many(self, users: Sequence[UD]) -> List[int]:
+        """
+        Create several users with an unordered `insert_many`.
+
+        Duplicates don't stop the insertion of the other users.
+        Without the unique case-insensitive email index,
+        they are created one by one.
+        """
+        await self._ensure_indexes()
+        if not users:
+            return []
+        if not self.email_index_unique:
+            return await super().create_many(users)
+
+        try:
+            await self.collection.insert_many(
+                [user.dict() for user in users], ordered=False
+            )
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+            if any(
+                write_error["code"] != DUPLICATE_KEY_ERROR_CODE
+                for write_error in write_errors
+            ):
+                raise
+            return sorted(write_error["index"] for write_error in write_errors)
+
+        return []
+
     async def update(self, user: UD) -> UD:
-        await self.collection.replace_one({"id": user.id}, user.dict())
+        check_writable(user)
+        await self._ensure_indexes()
+        if self._has_oauth_accounts() and not oauth_accounts_loaded(user):
+            # Leave them untouched if they were not retrieved with the user
+            await self.collection.update_one(
+                {"id": user.id}, {"$set": user.dict(exclude={"oauth_accounts"})}
+            )
+        else:
+            await self.collection.replace_one({"id": user.id}, user.dict())
+        return user
+
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        check_writable(user)
+        await self._ensure_indexes()
+        user_dict = user.dict(include=set(fields))
+        if user_dict:
+            await self.collection.update_one({"id": user.id}, {"$set": user_dict})
         return user
 
     async def delete(self, user: UD) -> None:
+        await self._ensure_indexes()
         await self.collection.delete_one({"id": user.id})
+
+    async def _ensure_indexes(self):
+        if not self.indexes_initialized:
+            await self.init_indexes()
+
+    def _has_oauth_accounts(self) -> bool:
+        return "oauth_accounts" in self.user_db_model.__fields__
+
+    def _get_projection(self) -> Optional[Dict[str, Any]]:
+        """Leave the OAuth accounts out if they shouldn't be loaded on get."""
+        if self._has_oauth_accounts() and not self.load_oauth_accounts_on_get:
+            return {"oauth_accounts": False}
+        return None
+
+    def _get_indexes(self) -> List[IndexModel]:
+        indexes = [
+            IndexModel("id", name="id_1", unique=True),
+            IndexModel("email", name="email_1", unique=True),
+            IndexModel(
+                "email",
+                name=CASE_INSENSITIVE_EMAIL_INDEX,
+                collation=self.email_collation,
+                unique=True,
+            ),
+        ]
+        if self._has_oauth_accounts():
+            indexes.append(
+                IndexModel(
+                    [
+                        ("oauth_accounts.oauth_name", ASCENDING),
+                        ("oauth_accounts.account_id", ASCENDING),
+                    ],
+                    name="oauth_account_index",
+                )
+            )
+        return indexes
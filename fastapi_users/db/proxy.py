@@ -0,0 +1,63 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+from pydantic import UUID4
+
+from fastapi_users.db.base import BaseUserDatabase
+from fastapi_users.models import UD, UserListFilters
+
+
+class UserDatabaseProxy(BaseUserDatabase[UD]):
+    """
+    Base adapter forwarding every operation to another database adapter.
+
+    Subclass it to add behaviour on top of an existing adapter.
+
+    :param user_db: Database adapter instance to wrap.
+    """
+
+    user_db: BaseUserDatabase[UD]
+
+    def __init__(self, user_db: BaseUserDatabase[UD]):
+        super().__init__(user_db.user_db_model)
+        self.user_db = user_db
+
+    async def get(self, id: UUID4) -> Optional[UD]:
+        return await self.user_db.get(id)
+
+    async def get_by_email(self, email: str) -> Optional[UD]:
+        return await self.user_db.get_by_email(email)
+
+    async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[UD]:
+        return await self.user_db.get_by_oauth_account(oauth, account_id)
+
+    async def get_many(self, ids: Iterable[UUID4]) -> Dict[UUID4, UD]:
+        return await self.user_db.get_many(ids)
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, UD]:
+        return await self.user_db.get_many_by_email(emails)
+
+    async def list(
+        self,
+        cursor: Optional[UUID4] = None,
+        limit: int = 100,
+        filters: Optional[UserListFilters] = None,
+    ) -> List[UD]:
+        return await self.user_db.list(cursor, limit, filters)
+
+    def iterate(self, batch_size: int = 1000) -> AsyncIterator[UD]:
+        return self.user_db.iterate(batch_size)
+
+    async def create(self, user: UD) -> UD:
+        return await self.user_db.create(user)
+
+    async def create_many(self, users: Sequence[UD]) -> List[int]:
+        return await self.user_db.create_many(users)
+
+    async def update(self, user: UD) -> UD:
+        return await self.user_db.update(user)
+
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        return await self.user_db.update_fields(user, fields)
+
+    async def delete(self, user: UD) -> None:
+        await self.user_db.delete(user)
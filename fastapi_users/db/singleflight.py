@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from pydantic import UUID4
+
+from fastapi_users.db.base import BaseUserDatabase
+from fastapi_users.db.proxy import UserDatabaseProxy
+from fastapi_users.models import UD
+
+
+class SingleFlightUserDatabase(UserDatabaseProxy[UD]):
+    """
+    Database adapter coalescing concurrent identical user lookups.
+
+    While a lookup is in flight, the callers asking for the same user
+    await its result instead of issuing another query.
+
+    :param user_db: Database adapter instance to wrap.
+    """
+
+    calls: int
+    coalesced: int
+    _in_flight: Dict[Hashable, "asyncio.Future[Optional[Any]]"]
+
+    def __init__(self, user_db: BaseUserDatabase[UD]):
+        super().__init__(user_db)
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def get(self, id: UUID4) -> Optional[UD]:
+        return await self._single_flight(("id", id), self.user_db.get, id)
+
+    async def get_by_email(self, email: str) -> Optional[UD]:
+        return await self._single_flight(
+            ("email", email.lower()), self.user_db.get_by_email, email
+        )
+
+    async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[UD]:
+        return await self._single_flight(
+            ("oauth_account", oauth, account_id),
+            self.user_db.get_by_oauth_account,
+            oauth,
+            account_id,
+        )
+
+    async def _single_flight(
+        self, key: Hashable, func: Callable[..., Awaitable[Optional[UD]]], *args
+    ) -> Optional[UD]:
+        self.calls += 1
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            user = await asyncio.shield(future)
+            # Each caller gets its own copy, so they can't alter each other's user
+            return user.copy(deep=True) if user is not None else None
+
+        future = asyncio.ensure_future(func(*args))
+        self._in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
@@ -1,15 +1,66 @@
+import logging
 import uuid
-from typing import Mapping, Optional, Type
+from itertools import groupby
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Type,
+    cast,
+)
 
 from databases import Database
 from pydantic import UUID4
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Table, func, select
+from sqlalchemy import (
+    Boolean,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    event,
+    func,
+    select,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql import FromClause, Select
 from sqlalchemy.types import CHAR, TypeDecorator
 
-from fastapi_users.db.base import BaseUserDatabase
-from fastapi_users.models import UD
+from fastapi_users.db.base import (
+    BaseUserDatabase,
+    UserAlreadyExists,
+    check_writable,
+    diff_oauth_accounts,
+    is_unique_violation,
+    oauth_accounts_loaded,
+)
+from fastapi_users.models import UD, UserListFilters
+
+OAUTH_ACCOUNT_COLUMN_PREFIX = "oauth_account__"
+# Bound parameters per multi-row INSERT: SQLite's default limit, the lowest one
+MULTI_ROW_INSERT_MAX_PARAMETERS = 999
+EXPRESSION_INDEX_DIALECTS = {"postgresql", "sqlite"}
+# Whether an index is unique, by dialect supporting the lowercased email index
+UNIQUE_INDEX_QUERIES = {
+    "postgresql": (
+        "SELECT pg_index.indisunique FROM pg_index "
+        "JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :index_name"
+    ),
+    "sqlite": (
+        'SELECT "unique" FROM pragma_index_list(:table_name) '
+        "WHERE name = :index_name"
+    ),
+}
+
+logger = logging.getLogger("fastapi_users")
 
 
 class GUID(TypeDecorator):  # pragma: no cover
@@ -47,6 +98,26 @@ class GUID(TypeDecorator):  # pragma: no cover
             return value
 
 
+def email_lower_index(table_name: str, email: Column) -> Index:
+    """
+    Return a unique index on the lowercased email.
+
+    It serves the case-insensitive lookup of `get_by_email`
+    and rejects the case variants of an existing email.
+    It's not created on dialects not supporting expression indexes.
+    """
+    index = Index(f"ix_{table_name}_email_lower", func.lower(email), unique=True)
+
+    @event.listens_for(index, "after_parent_attach")
+    def _after_parent_attach(index: Index, table: Table):
+        @event.listens_for(table, "before_create")
+        def _before_create(table: Table, connection, **kwargs):
+            if connection.dialect.name not in EXPRESSION_INDEX_DIALECTS:
+                table.indexes.discard(index)
+
+    return index
+
+
 class SQLAlchemyBaseUserTable:
     """Base SQLAlchemy users table definition."""
 
@@ -58,6 +129,10 @@ class SQLAlchemyBaseUserTable:
     is_active = Column(Boolean, default=True, nullable=False)
     is_superuser = Column(Boolean, default=False, nullable=False)
 
+    @declared_attr
+    def __table_args__(cls):
+        return (email_lower_index(cls.__tablename__, cls.email),)
+
 
 class SQLAlchemyBaseOAuthAccountTable:
     """Base SQLAlchemy OAuth account table definition."""
@@ -96,11 +171,20 @@ class SQLAlchemyUserDatabase(BaseUserDatabase[UD]):
     :param database: `Database` instance from `encode/databases`.
     :param users: SQLAlchemy users table instance.
     :param oauth_accounts: Optional SQLAlchemy OAuth accounts table instance.
+    :param load_oauth_accounts_on_get: Whether to load the OAuth accounts
+    when getting a user by id. Disable it to skip the join on the
+    authentication path if you don't need them there.
+    :param validate_on_load: Whether to validate the users read from the database
+    with the user DB model. Disable it to build them faster from the stored values,
+    which must then already have the types of the model fields:
+    custom validators are not run.
     """
 
     database: Database
     users: Table
     oauth_accounts: Optional[Table]
+    load_oauth_accounts_on_get: bool
+    email_index_unique: Optional[bool]
 
     def __init__(
         self,
@@ -108,37 +192,130 @@ class SQLAlchemyUserDatabase(BaseUserDatabase[UD]):
         database: Database,
         users: Table,
         oauth_accounts: Optional[Table] = None,
+        load_oauth_accounts_on_get: bool = True,
+        validate_on_load: bool = True,
     ):
         super().__init__(user_db_model)
         self.database = database
         self.users = users
         self.oauth_accounts = oauth_accounts
+        self.load_oauth_accounts_on_get = load_oauth_accounts_on_get
+        self.validate_on_load = validate_on_load
+        self.email_index_unique = None
 
     async def get(self, id: UUID4) -> Optional[UD]:
-        query = self.users.select().where(self.users.c.id == id)
-        user = await self.database.fetch_one(query)
-        return await self._make_user(user) if user else None
+        load_oauth_accounts = self.load_oauth_accounts_on_get
+        query = self._select_user(load_oauth_accounts).where(self.users.c.id == id)
+        return await self._get_user(query, load_oauth_accounts)
 
     async def get_by_email(self, email: str) -> Optional[UD]:
-        query = self.users.select().where(
+        query = self._select_user().where(
             func.lower(self.users.c.email) == func.lower(email)
         )
-        user = await self.database.fetch_one(query)
-        return await self._make_user(user) if user else None
+        return await self._get_user(query)
 
     async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[UD]:
         if self.oauth_accounts is not None:
-            query = (
-                select([self.users])
-                .select_from(self.users.join(self.oauth_accounts))
-                .where(self.oauth_accounts.c.oauth_name == oauth)
-                .where(self.oauth_accounts.c.account_id == account_id)
+            oauth_account = self.oauth_accounts.alias()
+            user_id_query = (
+                select([oauth_account.c.user_id])
+                .where(oauth_account.c.oauth_name == oauth)
+                .where(oauth_account.c.account_id == account_id)
             )
-            user = await self.database.fetch_one(query)
-            return await self._make_user(user) if user else None
+            query = self._select_user().where(self.users.c.id.in_(user_id_query))
+            return await self._get_user(query)
         raise NotSetOAuthAccountTableError()
 
+    async def get_many(self, ids: Iterable[UUID4]) -> Dict[UUID4, UD]:
+        ids = set(ids)
+        if not ids:
+            return {}
+        query = self.users.select().where(self.users.c.id.in_(ids))
+        users = await self._get_many_users(query, self.load_oauth_accounts_on_get)
+        return {user.id: user for user in users}
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, UD]:
+        lower_emails = {email.lower() for email in emails}
+        if not lower_emails:
+            return {}
+        query = self.users.select().where(
+            func.lower(self.users.c.email).in_(lower_emails)
+        )
+        users = await self._get_many_users(query)
+        return {str(user.email).lower(): user for user in users}
+
+    async def list(
+        self,
+        cursor: Optional[UUID4] = None,
+        limit: int = 100,
+        filters: Optional[UserListFilters] = None,
+    ) -> List[UD]:
+        load_oauth_accounts = self.load_oauth_accounts_on_get
+        page_query = self.users.select()
+        if cursor is not None:
+            page_query = page_query.where(self.users.c.id > cursor)
+        if filters is not None:
+            if filters.is_active is not None:
+                page_query = page_query.where(
+                    self.users.c.is_active == filters.is_active
+                )
+            if filters.is_superuser is not None:
+                page_query = page_query.where(
+                    self.users.c.is_superuser == filters.is_superuser
+                )
+            if filters.email_prefix:
+                page_query = page_query.where(
+                    func.lower(self.users.c.email).startswith(
+                        filters.email_prefix.lower(), autoescape=True
+                    )
+                )
+        page_query = page_query.order_by(self.users.c.id).limit(limit)
+
+        if not self._joins_oauth_accounts(load_oauth_accounts):
+            rows = await self.database.fetch_all(page_query)
+            return [self._make_user([row], load_oauth_accounts) for row in rows]
+
+        # Limit the users before the join, which has one row per OAuth account
+        page = page_query.alias("users_page")
+        query = self._select_user(load_oauth_accounts, page).order_by(page.c.id)
+        rows = await self.database.fetch_all(query)
+        return [
+            self._make_user(list(user_rows), load_oauth_accounts)
+            for _, user_rows in groupby(rows, key=lambda row: row["id"])
+        ]
+
+    async def iterate(self, batch_size: int = 1000) -> AsyncIterator[UD]:
+        """
+        Stream the users from a single query.
+
+        Rows are fetched from a server-side cursor when the database driver
+        supports it, e.g. asyncpg. The connection is held until the iteration ends.
+        """
+        load_oauth_accounts = self.load_oauth_accounts_on_get
+        query = self._select_user(load_oauth_accounts).order_by(self.users.c.id)
+
+        # The joined rows of a user are consecutive
+        user_rows: List[Mapping] = []
+        async for row in self.database.iterate(query):
+            if user_rows and row["id"] != user_rows[0]["id"]:
+                yield self._make_user(user_rows, load_oauth_accounts)
+                user_rows = []
+            user_rows.append(row)
+        if user_rows:
+            yield self._make_user(user_rows, load_oauth_accounts)
+
     async def create(self, user: UD) -> UD:
+        """
+        Create a user.
+
+        Case variants of an existing email are rejected by the unique index
+        on the lowercased email. If the table doesn't have it,
+        they are looked up first.
+        """
+        if not await self.check_email_index():
+            if await self.get_by_email(str(user.email)) is not None:
+                raise UserAlreadyExists()
+
         user_dict = user.dict()
         oauth_accounts_values = None
 
@@ -150,7 +327,12 @@ class SQLAlchemyUserDatabase(BaseUserDatabase[UD]):
                 oauth_accounts_values.append({"user_id": user.id, **oauth_account})
 
         query = self.users.insert()
-        await self.database.execute(query, user_dict)
+        try:
+            await self.database.execute(query, user_dict)
+        except Exception as e:
+            if is_unique_violation(e):
+                raise UserAlreadyExists() from e
+            raise
 
         if oauth_accounts_values is not None:
             if self.oauth_accounts is None:
@@ -160,42 +342,252 @@ class SQLAlchemyUserDatabase(BaseUserDatabase[UD]):
 
         return user
 
+    async def create_many(self, users: Sequence[UD]) -> List[int]:
+        """
+        Create several users with multi-row INSERT statements, in a transaction.
+
+        If one of them already exists, the transaction is rolled back
+        and they are created one by one to find which ones.
+        They are also created one by one if the table doesn't have
+        the unique index on the lowercased email.
+        """
+        if not await self.check_email_index():
+            return await super().create_many(users)
+
+        users_values = []
+        oauth_accounts_values: List[Dict[str, Any]] = []
+        for user in users:
+            user_dict = user.dict()
+            oauth_accounts = user_dict.pop("oauth_accounts", None)
+            if oauth_accounts is not None:
+                if self.oauth_accounts is None:
+                    raise NotSetOAuthAccountTableError()
+                oauth_accounts_values.extend(
+                    {"user_id": user.id, **oauth_account}
+                    for oauth_account in oauth_accounts
+                )
+            users_values.append(user_dict)
+
+        try:
+            async with self.database.transaction():
+                await self._insert_many(self.users, users_values)
+                if oauth_accounts_values:
+                    await self._insert_many(
+                        cast(Table, self.oauth_accounts), oauth_accounts_values
+                    )
+        except Exception as e:
+            if is_unique_violation(e):
+                return await super().create_many(users)
+            raise
+
+        return []
+
     async def update(self, user: UD) -> UD:
+        check_writable(user)
         user_dict = user.dict()
+        oauth_accounts = user_dict.pop("oauth_accounts", None)
 
-        if "oauth_accounts" in user_dict:
-            if self.oauth_accounts is None:
-                raise NotSetOAuthAccountTableError()
+        if oauth_accounts is not None and self.oauth_accounts is None:
+            raise NotSetOAuthAccountTableError()
+
+        async with self.database.transaction():
+            # Leave them untouched if they were not retrieved with the user
+            if oauth_accounts is not None and oauth_accounts_loaded(user):
+                await self._update_oauth_accounts(user.id, oauth_accounts)
 
-            query = self.oauth_accounts.delete().where(
-                self.oauth_accounts.c.user_id == user.id
+            query = (
+                self.users.update().where(self.users.c.id == user.id).values(user_dict)
             )
             await self.database.execute(query)
 
-            oauth_accounts_values = []
-            oauth_accounts = user_dict.pop("oauth_accounts")
-            for oauth_account in oauth_accounts:
-                oauth_accounts_values.append({"user_id": user.id, **oauth_account})
+        return user
 
-            query = self.oauth_accounts.insert()
-            await self.database.execute_many(query, oauth_accounts_values)
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        check_writable(user)
+        user_dict = user.dict(include=set(fields))
+        oauth_accounts = user_dict.pop("oauth_accounts", None)
+
+        if oauth_accounts is not None and self.oauth_accounts is None:
+            raise NotSetOAuthAccountTableError()
+
+        async with self.database.transaction():
+            if oauth_accounts is not None:
+                await self._update_oauth_accounts(user.id, oauth_accounts)
+
+            if user_dict:
+                query = (
+                    self.users.update()
+                    .where(self.users.c.id == user.id)
+                    .values(user_dict)
+                )
+                await self.database.execute(query)
 
-        query = self.users.update().where(self.users.c.id == user.id).values(user_dict)
-        await self.database.execute(query)
         return user
 
     async def delete(self, user: UD) -> None:
         query = self.users.delete().where(self.users.c.id == user.id)
         await self.database.execute(query)
 
-    async def _make_user(self, user: Mapping) -> UD:
-        user_dict = {**user}
+    async def _insert_many(self, table: Table, values: List[Dict[str, Any]]):
+        """Insert rows with as few statements as the bound parameters limit allows."""
+        if not values:
+            return
+        rows_per_statement = max(1, MULTI_ROW_INSERT_MAX_PARAMETERS // len(values[0]))
+        for start in range(0, len(values), rows_per_statement):
+            end = start + rows_per_statement
+            await self.database.execute(table.insert().values(values[start:end]))
+
+    async def _update_oauth_accounts(
+        self, user_id: UUID4, oauth_accounts: List[Dict[str, Any]]
+    ):
+        """Write only the OAuth accounts which were added, changed or removed."""
+        oauth_accounts_table = cast(Table, self.oauth_accounts)
+        query = oauth_accounts_table.select().where(
+            oauth_accounts_table.c.user_id == user_id
+        )
+        existing_oauth_accounts = await self.database.fetch_all(query)
 
-        if self.oauth_accounts is not None:
-            query = self.oauth_accounts.select().where(
-                self.oauth_accounts.c.user_id == user["id"]
+        to_insert, to_update, to_delete = diff_oauth_accounts(
+            existing_oauth_accounts, oauth_accounts
+        )
+
+        if to_delete:
+            query = oauth_accounts_table.delete().where(
+                oauth_accounts_table.c.id.in_(to_delete)
             )
-            oauth_accounts = await self.database.fetch_all(query)
-            user_dict["oauth_accounts"] = oauth_accounts
+            await self.database.execute(query)
+
+        for oauth_account in to_update:
+            query = (
+                oauth_accounts_table.update()
+                .where(oauth_accounts_table.c.id == oauth_account["id"])
+                .values(oauth_account)
+            )
+            await self.database.execute(query)
+
+        if to_insert:
+            query = oauth_accounts_table.insert()
+            await self.database.execute_many(
+                query,
+                [{"user_id": user_id, **oauth_account} for oauth_account in to_insert],
+            )
+
+    async def _get_many_users(
+        self, query: Select, load_oauth_accounts: bool = True
+    ) -> List[UD]:
+        """
+        Retrieve users, then their OAuth accounts in one more query.
+
+        Unlike a join, the user columns are not repeated for each OAuth account.
+        """
+        user_rows = await self.database.fetch_all(query)
+        if not user_rows:
+            return []
+
+        oauth_accounts: Dict[UUID4, List[Dict[str, Any]]] = {}
+        if self._joins_oauth_accounts(load_oauth_accounts):
+            oauth_accounts_table = cast(Table, self.oauth_accounts)
+            oauth_accounts_query = oauth_accounts_table.select().where(
+                oauth_accounts_table.c.user_id.in_([row["id"] for row in user_rows])
+            )
+            for row in await self.database.fetch_all(oauth_accounts_query):
+                oauth_accounts.setdefault(row["user_id"], []).append(
+                    {column.name: row[column.name] for column in oauth_accounts_table.c}
+                )
+
+        users = []
+        for row in user_rows:
+            user_dict = {column.name: row[column.name] for column in self.users.c}
+            if self._joins_oauth_accounts(load_oauth_accounts):
+                user_dict["oauth_accounts"] = oauth_accounts.get(row["id"], [])
+            users.append(self._load_user(user_dict))
+        return users
+
+    async def check_email_index(self) -> bool:
+        """
+        Check once whether the unique index on the lowercased email exists.
+
+        Tables created before it was unique, or without it, accept
+        case variants of an existing email: an error is logged.
+        Dialects without expression indexes, like MySQL, rely on their
+        case-insensitive collations instead.
+
+        :return: Whether case variants of an existing email are rejected.
+        """
+        if self.email_index_unique is None:
+            query = UNIQUE_INDEX_QUERIES.get(self.database.url.dialect)
+            if query is None:
+                self.email_index_unique = True
+            else:
+                index_name = f"ix_{self.users.name}_email_lower"
+                unique = await self.database.fetch_val(
+                    query, {"table_name": self.users.name, "index_name": index_name}
+                )
+                self.email_index_unique = bool(unique)
+                if not self.email_index_unique:
+                    logger.error(
+                        "The unique index %s is missing: case variants of "
+                        "an existing email are looked up before each insert. "
+                        "Create it to avoid concurrent duplicates.",
+                        index_name,
+                    )
+        return self.email_index_unique
+
+    def _select_user(
+        self, load_oauth_accounts: bool = True, users: Optional[FromClause] = None
+    ) -> Select:
+        """
+        Select a user and, if needed, its OAuth accounts in a single query.
+
+        The OAuth accounts are retrieved with a LEFT JOIN:
+        there is one row per OAuth account, with the user columns repeated.
+
+        :param users: Selectable of users to join, defaults to the users table.
+        """
+        if users is None:
+            users = self.users
+
+        if not self._joins_oauth_accounts(load_oauth_accounts):
+            return users.select()
+
+        oauth_accounts_columns = [
+            column.label(f"{OAUTH_ACCOUNT_COLUMN_PREFIX}{column.name}")
+            for column in self.oauth_accounts.c  # type: ignore
+        ]
+        return select([users, *oauth_accounts_columns]).select_from(
+            users.outerjoin(
+                self.oauth_accounts,
+                self.oauth_accounts.c.user_id == users.c.id,  # type: ignore
+            )
+        )
 
-        return self.user_db_model(**user_dict)
+    async def _get_user(
+        self, query: Select, load_oauth_accounts: bool = True
+    ) -> Optional[UD]:
+        rows = await self.database.fetch_all(query)
+        if not rows:
+            return None
+        # The lookup may match several users, e.g. case variants of an email
+        # in a table without the unique index: keep the first one only
+        user_id = rows[0]["id"]
+        user_rows = [row for row in rows if row["id"] == user_id]
+        return self._make_user(user_rows, load_oauth_accounts)
+
+    def _make_user(self, rows: Sequence[Mapping], load_oauth_accounts: bool) -> UD:
+        user_dict = {column.name: rows[0][column.name] for column in self.users.c}
+
+        if self._joins_oauth_accounts(load_oauth_accounts):
+            oauth_account_id_key = f"{OAUTH_ACCOUNT_COLUMN_PREFIX}id"
+            user_dict["oauth_accounts"] = [
+                {
+                    column.name: row[f"{OAUTH_ACCOUNT_COLUMN_PREFIX}{column.name}"]
+                    for column in self.oauth_accounts.c  # type: ignore
+                }
+                for row in rows
+                if row[oauth_account_id_key] is not None
+            ]
+
+        return self._load_user(user_dict)
+
+    def _joins_oauth_accounts(self, load_oauth_accounts: bool) -> bool:
+        return self.oauth_accounts is not None and load_oauth_accounts
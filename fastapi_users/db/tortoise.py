@@ -1,11 +1,57 @@
-from typing import Optional, Type
+from functools import lru_cache
+from operator import attrgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    cast,
+)
 
 from pydantic import UUID4
 from tortoise import fields, models
-from tortoise.exceptions import DoesNotExist
+from tortoise.exceptions import DoesNotExist, IntegrityError
+from tortoise.functions import Lower
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from fastapi_users.db.base import (
+    BaseUserDatabase,
+    UserAlreadyExists,
+    check_writable,
+    diff_oauth_accounts,
+    is_unique_violation,
+    oauth_accounts_loaded,
+)
+from fastapi_users.models import UD, UserListFilters
+
+
+@lru_cache(maxsize=None)
+def _get_to_dict_plan(
+    model: Type[models.Model],
+) -> Tuple[Callable[[models.Model], Dict[str, Any]], Tuple[str, ...]]:
+    """
+    Compute once per model how to serialize its instances to a dictionary.
+
+    :param model: Tortoise ORM model.
+    :return: A function returning the database fields of an instance
+    and the names of the backward foreign keys.
+    """
+    db_fields = tuple(model._meta.db_fields)
+    get_values = attrgetter(*db_fields)
+
+    def get_fields(instance: models.Model) -> Dict[str, Any]:
+        values = get_values(instance)
+        if len(db_fields) == 1:
+            values = (values,)
+        return dict(zip(db_fields, values))
 
-from fastapi_users.db.base import BaseUserDatabase
-from fastapi_users.models import UD
+    return get_fields, tuple(model._meta.backward_fk_fields)
 
 
 class TortoiseBaseUserModel(models.Model):
@@ -16,11 +62,18 @@ class TortoiseBaseUserModel(models.Model):
     is_superuser = fields.BooleanField(default=False, null=False)
 
     async def to_dict(self):
-        d = {}
-        for field in self._meta.db_fields:
-            d[field] = getattr(self, field)
-        for field in self._meta.backward_fk_fields:
-            d[field] = await getattr(self, field).all().values()
+        get_fields, backward_fk_fields = _get_to_dict_plan(type(self))
+        d = get_fields(self)
+        for field in backward_fk_fields:
+            relation = getattr(self, field)
+            if relation._fetched:
+                # Already retrieved with prefetch_related: don't query them again
+                d[field] = [
+                    _get_to_dict_plan(type(related_object))[0](related_object)
+                    for related_object in relation.related_objects
+                ]
+            else:
+                d[field] = await relation.all().values()
         return d
 
     class Meta:
@@ -47,6 +100,10 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
     :param user_db_model: Pydantic model of a DB representation of a user.
     :param model: Tortoise ORM model.
     :param oauth_account_model: Optional Tortoise ORM model of a OAuth account.
+    :param validate_on_load: Whether to validate the users read from the database
+    with the user DB model. Disable it to build them faster from the stored values,
+    which must then already have the types of the model fields:
+    custom validators are not run.
     """
 
     model: Type[TortoiseBaseUserModel]
@@ -57,10 +114,12 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
         user_db_model: Type[UD],
         model: Type[TortoiseBaseUserModel],
         oauth_account_model: Optional[Type[TortoiseBaseOAuthAccountModel]] = None,
+        validate_on_load: bool = True,
     ):
         super().__init__(user_db_model)
         self.model = model
         self.oauth_account_model = oauth_account_model
+        self.validate_on_load = validate_on_load
 
     async def get(self, id: UUID4) -> Optional[UD]:
         try:
@@ -72,7 +131,7 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
             user = await query
             user_dict = await user.to_dict()
 
-            return self.user_db_model(**user_dict)
+            return self._load_user(user_dict)
         except DoesNotExist:
             return None
 
@@ -88,7 +147,7 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
             return None
 
         user_dict = await user.to_dict()
-        return self.user_db_model(**user_dict)
+        return self._load_user(user_dict)
 
     async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[UD]:
         try:
@@ -99,16 +158,65 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
             user = await query
             user_dict = await user.to_dict()
 
-            return self.user_db_model(**user_dict)
+            return self._load_user(user_dict)
         except DoesNotExist:
             return None
 
+    async def get_many(self, ids: Iterable[UUID4]) -> Dict[UUID4, UD]:
+        ids = set(ids)
+        if not ids:
+            return {}
+        users = await self._get_many(self.model.filter(id__in=list(ids)))
+        return {user.id: user for user in users}
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, UD]:
+        lower_emails = {email.lower() for email in emails}
+        if not lower_emails:
+            return {}
+        query = self.model.annotate(email_lower=Lower("email")).filter(
+            email_lower__in=list(lower_emails)
+        )
+        users = await self._get_many(query)
+        return {str(user.email).lower(): user for user in users}
+
+    async def list(
+        self,
+        cursor: Optional[UUID4] = None,
+        limit: int = 100,
+        filters: Optional[UserListFilters] = None,
+    ) -> List[UD]:
+        query = self.model.all()
+        if cursor is not None:
+            query = query.filter(id__gt=cursor)
+        if filters is not None:
+            if filters.is_active is not None:
+                query = query.filter(is_active=filters.is_active)
+            if filters.is_superuser is not None:
+                query = query.filter(is_superuser=filters.is_superuser)
+            if filters.email_prefix:
+                query = query.filter(email__istartswith=filters.email_prefix)
+        return await self._get_many(query.order_by("id").limit(limit))
+
     async def create(self, user: UD) -> UD:
+        """
+        Create a user.
+
+        The unique constraint on the email is case-sensitive,
+        so case variants of an existing email are looked up first.
+        """
+        if await self._emails_exist([str(user.email)]):
+            raise UserAlreadyExists()
+
         user_dict = user.dict()
         oauth_accounts = user_dict.pop("oauth_accounts", None)
 
         model = self.model(**user_dict)
-        await model.save()
+        try:
+            await model.save()
+        except IntegrityError as e:
+            if is_unique_violation(e):
+                raise UserAlreadyExists() from e
+            raise
 
         if oauth_accounts and self.oauth_account_model:
             oauth_account_objects = []
@@ -120,26 +228,141 @@ class TortoiseUserDatabase(BaseUserDatabase[UD]):
 
         return user
 
+    async def create_many(self, users: Sequence[UD]) -> List[int]:
+        """
+        Create several users with `bulk_create`, in a transaction.
+
+        If one of them already exists, the transaction is rolled back
+        and they are created one by one to find which ones.
+        """
+        if not users:
+            return []
+
+        lower_emails = {str(user.email).lower() for user in users}
+        if len(lower_emails) < len(users) or await self._emails_exist(lower_emails):
+            return await super().create_many(users)
+
+        user_objects = []
+        oauth_account_objects: List[TortoiseBaseOAuthAccountModel] = []
+        for user in users:
+            user_dict = user.dict()
+            oauth_accounts = user_dict.pop("oauth_accounts", None)
+            user_objects.append(self.model(**user_dict))
+            if oauth_accounts and self.oauth_account_model:
+                oauth_account_objects.extend(
+                    self.oauth_account_model(user_id=user.id, **oauth_account)
+                    for oauth_account in oauth_accounts
+                )
+
+        try:
+            async with in_transaction():
+                await self.model.bulk_create(user_objects)
+                if oauth_account_objects:
+                    await cast(
+                        Type[TortoiseBaseOAuthAccountModel], self.oauth_account_model
+                    ).bulk_create(oauth_account_objects)
+        except IntegrityError as e:
+            if is_unique_violation(e):
+                return await super().create_many(users)
+            raise
+
+        return []
+
+    async def _emails_exist(self, emails: Iterable[str]) -> bool:
+        lower_emails = [str(email).lower() for email in emails]
+        return await (
+            self.model.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=lower_emails)
+            .exists()
+        )
+
     async def update(self, user: UD) -> UD:
+        check_writable(user)
         user_dict = user.dict()
         user_dict.pop("id")  # Tortoise complains if we pass the PK again
         oauth_accounts = user_dict.pop("oauth_accounts", None)
 
-        model = await self.model.get(id=user.id)
-        for field in user_dict:
-            setattr(model, field, user_dict[field])
-        await model.save()
+        # Leave them untouched if they were not retrieved with the user
+        if not oauth_accounts_loaded(user):
+            oauth_accounts = None
 
-        if oauth_accounts and self.oauth_account_model:
-            await model.oauth_accounts.all().delete()
-            oauth_account_objects = []
-            for oauth_account in oauth_accounts:
-                oauth_account_objects.append(
-                    self.oauth_account_model(user=model, **oauth_account)
-                )
-            await self.oauth_account_model.bulk_create(oauth_account_objects)
+        await self._update(user.id, user_dict, oauth_accounts)
+
+        return user
+
+    async def update_fields(self, user: UD, fields: Iterable[str]) -> UD:
+        check_writable(user)
+        user_dict = user.dict(include=set(fields))
+        user_dict.pop("id", None)  # Tortoise complains if we pass the PK again
+        oauth_accounts = user_dict.pop("oauth_accounts", None)
+
+        await self._update(user.id, user_dict, oauth_accounts)
 
         return user
 
     async def delete(self, user: UD) -> None:
         await self.model.filter(id=user.id).delete()
+
+    async def _get_many(self, query: QuerySet) -> List[UD]:
+        """Retrieve users, then their OAuth accounts in one more query."""
+        if self.oauth_account_model is not None:
+            query = query.prefetch_related("oauth_accounts")
+        return [self._load_user(await user.to_dict()) for user in await query]
+
+    async def _update(
+        self,
+        user_id: UUID4,
+        user_dict: Dict[str, Any],
+        oauth_accounts: Optional[List[Dict[str, Any]]],
+    ):
+        """
+        Update a user in a single statement, without fetching it first.
+
+        :raises DoesNotExist: The user doesn't exist.
+        """
+        async with in_transaction():
+            if user_dict:
+                updated_rows = await self.model.filter(id=user_id).update(**user_dict)
+            else:
+                updated_rows = await self.model.filter(id=user_id).count()
+
+            # MySQL counts the changed rows, not the matched ones:
+            # writing the current values updates no row
+            if updated_rows == 0 and not (await self.model.filter(id=user_id).exists()):
+                raise DoesNotExist(f"User {user_id} does not exist")
+
+            if oauth_accounts is not None and self.oauth_account_model:
+                await self._update_oauth_accounts(user_id, oauth_accounts)
+
+    async def _update_oauth_accounts(
+        self, user_id: UUID4, oauth_accounts: List[Dict[str, Any]]
+    ):
+        """Write only the OAuth accounts which were added, changed or removed."""
+        oauth_account_model = cast(
+            Type[TortoiseBaseOAuthAccountModel], self.oauth_account_model
+        )
+        existing_oauth_accounts = await oauth_account_model.filter(
+            user_id=user_id
+        ).values()
+
+        to_insert, to_update, to_delete = diff_oauth_accounts(
+            existing_oauth_accounts, oauth_accounts
+        )
+
+        if to_delete:
+            await oauth_account_model.filter(id__in=to_delete).delete()
+
+        for oauth_account in to_update:
+            oauth_account_values = {**oauth_account}
+            oauth_account_id = oauth_account_values.pop("id")
+            await oauth_account_model.filter(id=oauth_account_id).update(
+                **oauth_account_values
+            )
+
+        if to_insert:
+            await oauth_account_model.bulk_create(
+                [
+                    oauth_account_model(user_id=user_id, **oauth_account)
+                    for oauth_account in to_insert
+                ]
+            )
@@ -0,0 +1,96 @@
+import csv
+import io
+from enum import Enum
+from typing import Any, AsyncIterator, List, Mapping, Sequence, Type, Union
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+from pydantic.utils import lenient_issubclass
+
+from fastapi_users import models
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+# Secrets never written to an export: the password hash and the OAuth tokens
+DEFAULT_EXPORT_EXCLUDE: Mapping[Union[int, str], Any] = {
+    "hashed_password": ...,
+    "oauth_accounts": {"__all__": {"access_token", "refresh_token"}},
+}
+
+
+def get_export_fields(
+    user_model: Type[BaseModel], export_format: ExportFormat
+) -> List[str]:
+    """
+    Return the fields of a user model to export.
+
+    CSV exports only have the scalar fields, e.g. not the OAuth accounts.
+
+    :param user_model: Pydantic model of a user.
+    :param export_format: Format of the export.
+    """
+    fields = []
+    for name, field in user_model.__fields__.items():
+        if DEFAULT_EXPORT_EXCLUDE.get(name) is ...:
+            continue
+        if export_format == ExportFormat.CSV and (
+            field.shape != SHAPE_SINGLETON or lenient_issubclass(field.type_, BaseModel)
+        ):
+            continue
+        fields.append(name)
+    return fields
+
+
+async def stream_users_export(
+    users: AsyncIterator[models.BaseUserDB],
+    export_format: ExportFormat,
+    fields: Sequence[str],
+    exclude: Mapping[Union[int, str], Any] = DEFAULT_EXPORT_EXCLUDE,
+    chunk_size: int = 100,
+) -> AsyncIterator[str]:
+    """
+    Serialize users one by one into an export, yielded in chunks.
+
+    Only `chunk_size` users are held in the buffer at a time,
+    whatever the number of exported users.
+
+    :param users: Async iterator of users, e.g. from `BaseUserDatabase.iterate`.
+    :param export_format: NDJSON, one JSON object per line, or CSV with a header.
+    :param fields: Fields to export.
+    :param exclude: Fields, or nested fields, to leave out.
+    Defaults to the password hash and the OAuth tokens.
+    :param chunk_size: Number of users per yielded chunk.
+    """
+    include = set(fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == ExportFormat.CSV:
+        writer.writerow(fields)
+
+    buffered_users = 0
+    async for user in users:
+        if export_format == ExportFormat.NDJSON:
+            buffer.write(user.json(include=include, exclude=exclude))
+            buffer.write("\n")
+        else:
+            user_dict = user.dict(include=include, exclude=exclude)
+            writer.writerow([user_dict.get(field) for field in fields])
+
+        buffered_users += 1
+        if buffered_users == chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            buffered_users = 0
+
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
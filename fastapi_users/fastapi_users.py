@@ -1,24 +1,23 @@
-from typing import Any, Callable, Dict, Optional, Sequence, Type
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Sequence, Type
 
 from fastapi import APIRouter, Request
+from passlib.context import CryptContext
 
-from fastapi_users import models
+from fastapi_users import models, password
 from fastapi_users.authentication import Authenticator, BaseAuthentication
 from fastapi_users.db import BaseUserDatabase
+from fastapi_users.ratelimit import RateLimiter
 from fastapi_users.router import (
+    HookDispatcher,
     get_auth_router,
     get_register_router,
     get_reset_password_router,
     get_users_router,
 )
 
-try:
+if TYPE_CHECKING:  # pragma: no cover
     from httpx_oauth.oauth2 import BaseOAuth2
 
-    from fastapi_users.router import get_oauth_router
-except ModuleNotFoundError:  # pragma: no cover
-    BaseOAuth2 = Type
-
 
 class FastAPIUsers:
     """
@@ -30,6 +29,10 @@ class FastAPIUsers:
     :param user_create_model: Pydantic model for creating a user.
     :param user_update_model: Pydantic model for updating a user.
     :param user_db_model: Pydantic model of a DB representation of a user.
+    :param password_context: Optional passlib context used to hash passwords.
+    Defaults to bcrypt.
+    :param hook_dispatcher: Optional dispatcher running the hooks,
+    like `after_register`. Defaults to running them inline in the request.
 
     :attribute get_current_user: Dependency callable to inject authenticated user.
     :attribute get_current_active_user: Dependency callable to inject active user.
@@ -42,6 +45,7 @@ class FastAPIUsers:
     _user_create_model: Type[models.BaseUserCreate]
     _user_update_model: Type[models.BaseUserUpdate]
     _user_db_model: Type[models.BaseUserDB]
+    hook_dispatcher: HookDispatcher
 
     def __init__(
         self,
@@ -51,6 +55,8 @@ class FastAPIUsers:
         user_create_model: Type[models.BaseUserCreate],
         user_update_model: Type[models.BaseUserUpdate],
         user_db_model: Type[models.BaseUserDB],
+        password_context: Optional[CryptContext] = None,
+        hook_dispatcher: Optional[HookDispatcher] = None,
     ):
         self.db = db
         self.authenticator = Authenticator(auth_backends, db)
@@ -61,6 +67,11 @@ class FastAPIUsers:
         self._user_update_model = user_update_model
         self._user_db_model = user_db_model
 
+        self.hook_dispatcher = hook_dispatcher or HookDispatcher()
+
+        if password_context is not None:
+            password.configure_password_context(password_context)
+
         self.get_current_user = self.authenticator.get_current_user
         self.get_current_active_user = self.authenticator.get_current_active_user
         self.get_current_superuser = self.authenticator.get_current_superuser
@@ -78,12 +89,14 @@ class FastAPIUsers:
         activation_callback: Optional[Callable[[models.UD, str, Request], None]] = None,
         activation_token_secret: str = None,
         activation_token_lifetime_seconds: int = 3600,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> APIRouter:
         """
         Return a router with a register route.
 
         :param after_register: Optional function called
         after a successful registration.
+        :param rate_limiter: Optional rate limiter of the registrations.
         """
         return get_register_router(
             self.db,
@@ -94,6 +107,8 @@ class FastAPIUsers:
             activation_callback,
             activation_token_secret,
             activation_token_lifetime_seconds,
+            rate_limiter,
+            self.hook_dispatcher,
         )
 
     def get_reset_password_router(
@@ -103,6 +118,7 @@ class FastAPIUsers:
         after_forgot_password: Optional[
             Callable[[models.UD, str, Request], None]
         ] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> APIRouter:
         """
         Return a reset password process router.
@@ -111,25 +127,31 @@ class FastAPIUsers:
         :param reset_password_token_lifetime_seconds: Lifetime of reset password token.
         :param after_forgot_password: Optional function called after a successful
         forgot password request.
+        :param rate_limiter: Optional rate limiter of the forgot password requests.
         """
         return get_reset_password_router(
             self.db,
             reset_password_token_secret,
             reset_password_token_lifetime_seconds,
             after_forgot_password,
+            rate_limiter,
+            self.hook_dispatcher,
         )
 
-    def get_auth_router(self, backend: BaseAuthentication) -> APIRouter:
+    def get_auth_router(
+        self, backend: BaseAuthentication, rate_limiter: Optional[RateLimiter] = None
+    ) -> APIRouter:
         """
         Return an auth router for a given authentication backend.
 
         :param backend: The authentication backend instance.
+        :param rate_limiter: Optional rate limiter of the login attempts.
         """
-        return get_auth_router(backend, self.db, self.authenticator)
+        return get_auth_router(backend, self.db, self.authenticator, rate_limiter)
 
     def get_oauth_router(
         self,
-        oauth_client: BaseOAuth2,
+        oauth_client: "BaseOAuth2",
         state_secret: str,
         redirect_url: str = None,
         after_register: Optional[Callable[[models.UD, Request], None]] = None,
@@ -144,6 +166,9 @@ class FastAPIUsers:
         :param after_register: Optional function called
         after a successful registration.
         """
+        # Imported on use, so httpx-oauth is only loaded by OAuth setups
+        from fastapi_users.router.oauth import get_oauth_router
+
         return get_oauth_router(
             oauth_client,
             self.db,
@@ -152,6 +177,7 @@ class FastAPIUsers:
             state_secret,
             redirect_url,
             after_register,
+            self.hook_dispatcher,
         )
 
     def get_users_router(
@@ -173,4 +199,5 @@ class FastAPIUsers:
             self._user_db_model,
             self.authenticator,
             after_update,
+            self.hook_dispatcher,
         )
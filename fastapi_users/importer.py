@@ -0,0 +1,249 @@
+import asyncio
+import csv
+import json
+from concurrent.futures import Executor
+from enum import Enum
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pydantic import ValidationError
+
+from fastapi_users import models, password
+from fastapi_users.db import BaseUserDatabase
+
+
+class ImportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ImportErrorCode:
+    INVALID_ROW = "INVALID_ROW"
+    MISSING_PASSWORD = "MISSING_PASSWORD"
+    INVALID_PASSWORD_HASH = "INVALID_PASSWORD_HASH"
+    USER_ALREADY_EXISTS = "USER_ALREADY_EXISTS"
+
+
+class ImportRowError(NamedTuple):
+    """
+    A row which was not imported.
+
+    :param line: Line number of the row in the input.
+    :param email: Email of the row, if any.
+    :param code: Reason why the row was not imported, see `ImportErrorCode`.
+    :param detail: Human-readable details, e.g. the invalid fields.
+    """
+
+    line: int
+    email: Optional[str]
+    code: str
+    detail: Optional[str] = None
+
+
+class ImportReport:
+    """Number of imported users and errors of the rows which were not imported."""
+
+    created: int
+    errors: List[ImportRowError]
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+
+Row = Union[Dict[str, Any], ImportRowError]
+Lines = Union[Iterable[str], AsyncIterable[str]]
+
+
+async def import_users(
+    user_db: BaseUserDatabase[models.UD],
+    lines: Lines,
+    import_format: ImportFormat,
+    batch_size: int = 1000,
+    hashing_executor: Optional[Executor] = None,
+    hashing_chunk_size: int = 50,
+) -> ImportReport:
+    """
+    Import users from NDJSON or CSV lines, e.g. an opened file.
+
+    The lines are read as a stream. Users are created by batches of
+    `batch_size` with `create_many`, each batch being committed on its own.
+
+    Each row is either a JSON object or a CSV row with a header line.
+    It has either a plaintext `password`, which is hashed,
+    or a `hashed_password` hashed with a scheme of the password context.
+    The other keys are fields of the user DB model.
+    CSV fields spanning several lines are not supported.
+
+    Plaintext passwords are hashed by chunks of `hashing_chunk_size`,
+    concurrently on the hashing executor. The hashing admission control
+    doesn't apply: pass a dedicated executor, e.g. a process pool,
+    to keep imports from slowing down logins.
+
+    :param user_db: Database adapter instance.
+    :param lines: Iterable or async iterable of lines.
+    :param import_format: Format of the lines.
+    :param batch_size: Number of users created at a time.
+    :param hashing_executor: Executor hashing the passwords.
+    Defaults to the one set with `configure_hashing_executor`.
+    :param hashing_chunk_size: Number of passwords hashed per executor task.
+    :return: A report of the import, with the errors of the skipped rows.
+    """
+    report = ImportReport()
+    executor = hashing_executor or password.hashing_executor
+
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    async for line_number, row in _read_rows(lines, import_format):
+        if isinstance(row, ImportRowError):
+            report.errors.append(row)
+            continue
+        batch.append((line_number, row))
+        if len(batch) == batch_size:
+            await _import_batch(user_db, batch, report, executor, hashing_chunk_size)
+            batch = []
+
+    if batch:
+        await _import_batch(user_db, batch, report, executor, hashing_chunk_size)
+
+    return report
+
+
+async def _iterate_lines(lines: Lines) -> AsyncIterator[str]:
+    if isinstance(lines, AsyncIterable):
+        async for line in lines:
+            yield line
+    else:
+        for line in lines:
+            yield line
+
+
+async def _read_rows(
+    lines: Lines, import_format: ImportFormat
+) -> AsyncIterator[Tuple[int, Row]]:
+    header: Optional[List[str]] = None
+    line_number = 0
+    async for line in _iterate_lines(lines):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        if import_format == ImportFormat.CSV:
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            # Empty CSV values are missing values
+            yield line_number, {
+                field: value for field, value in zip(header, values) if value != ""
+            }
+        else:
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, ImportRowError(
+                    line_number, None, ImportErrorCode.INVALID_ROW, str(e)
+                )
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ImportRowError(
+                    line_number, None, ImportErrorCode.INVALID_ROW, "Not an object"
+                )
+                continue
+            yield line_number, row
+
+
+async def _import_batch(
+    user_db: BaseUserDatabase[models.UD],
+    batch: List[Tuple[int, Dict[str, Any]]],
+    report: ImportReport,
+    executor: Optional[Executor],
+    hashing_chunk_size: int,
+):
+    line_numbers: List[int] = []
+    users: List[models.UD] = []
+    plain_passwords: List[Tuple[models.UD, str]] = []
+
+    # Validate the rows first, so passwords of invalid rows are not hashed
+    for line_number, row in batch:
+        email = row.get("email")
+        plain_password = row.pop("password", None)
+        hashed_password = row.get("hashed_password")
+
+        if plain_password is None:
+            if not hashed_password:
+                report.errors.append(
+                    ImportRowError(line_number, email, ImportErrorCode.MISSING_PASSWORD)
+                )
+                continue
+            if password.pwd_context.identify(hashed_password) is None:
+                report.errors.append(
+                    ImportRowError(
+                        line_number, email, ImportErrorCode.INVALID_PASSWORD_HASH
+                    )
+                )
+                continue
+
+        try:
+            user = user_db.user_db_model(
+                **{**row, "hashed_password": hashed_password or ""}
+            )
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            )
+            report.errors.append(
+                ImportRowError(line_number, email, ImportErrorCode.INVALID_ROW, detail)
+            )
+            continue
+
+        if plain_password is not None:
+            plain_passwords.append((user, str(plain_password)))
+        line_numbers.append(line_number)
+        users.append(user)
+
+    hashed_passwords = await _hash_passwords(
+        [plain_password for _, plain_password in plain_passwords],
+        executor,
+        hashing_chunk_size,
+    )
+    for (user, _), hashed_password in zip(plain_passwords, hashed_passwords):
+        user.hashed_password = hashed_password
+
+    existing_indexes = await user_db.create_many(users)
+    for index in existing_indexes:
+        report.errors.append(
+            ImportRowError(
+                line_numbers[index],
+                users[index].email,
+                ImportErrorCode.USER_ALREADY_EXISTS,
+            )
+        )
+    report.created += len(users) - len(existing_indexes)
+
+
+async def _hash_passwords(
+    plain_passwords: List[str], executor: Optional[Executor], chunk_size: int
+) -> List[str]:
+    loop = asyncio.get_event_loop()
+    chunks = []
+    for start in range(0, len(plain_passwords), chunk_size):
+        end = start + chunk_size
+        chunks.append(plain_passwords[start:end])
+    hashed_chunks = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, password.get_password_hashes, chunk)
+            for chunk in chunks
+        )
+    )
+    return [hashed_password for chunk in hashed_chunks for hashed_password in chunk]
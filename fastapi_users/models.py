@@ -48,6 +48,23 @@ class BaseUserDB(BaseUser):
 UD = TypeVar("UD", bound=BaseUserDB)
 
 
+class UserFromClaims:
+    """
+    Marker of the users built from the claims of a stateless JWT.
+
+    They lack the fields which are not signed into the token,
+    like the password hash, so database adapters refuse to write them.
+    """
+
+
+class UserListFilters(BaseModel):
+    """Filters of a users listing. Unset filters match every user."""
+
+    is_active: Optional[bool] = None
+    is_superuser: Optional[bool] = None
+    email_prefix: Optional[str] = None
+
+
 class BaseOAuthAccount(BaseModel):
     """Base OAuth account model."""
 
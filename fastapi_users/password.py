@@ -1,10 +1,144 @@
-from typing import Tuple
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from multiprocessing.context import BaseContext
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 from passlib import pwd
 from passlib.context import CryptContext
 
+SUPPORTED_SCHEMES = ("bcrypt", "argon2", "scrypt")
+
+# Cost setting increased by the calibration and its starting value, per scheme
+CALIBRATED_COST_SETTINGS = {
+    "bcrypt": ("rounds", 4),
+    "argon2": ("time_cost", 1),
+    "scrypt": ("rounds", 10),
+}
+ARGON2_DEFAULT_MEMORY_COST = 19456  # KiB
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+hashing_executor: Optional[Executor] = None
+# Settings of the process pool created by `configure_hashing_executor`, if any,
+# to create it again when the password context changes
+_hashing_process_pool_settings: Optional[
+    Tuple[Optional[int], Optional[BaseContext]]
+] = None
+
+
+class PasswordHashingOverloadedError(Exception):
+    """Too many password hashes are already being computed or waiting."""
+
+    retry_after_seconds: int
+
+    def __init__(self, retry_after_seconds: int):
+        super().__init__("Too many password hashes in progress")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class HashingAdmissionController:
+    """
+    Limit the number of password hashes computed and waiting at the same time.
+
+    Hashes beyond those limits are rejected right away
+    with a `PasswordHashingOverloadedError`.
+
+    :param max_in_flight: Maximum number of hashes computed concurrently.
+    :param max_queue_depth: Maximum number of hashes waiting for a slot.
+    :param queue_timeout_seconds: Maximum duration a hash waits for a slot.
+    Unbounded by default.
+    :param retry_after_seconds: Delay after which rejected clients may retry.
+    """
+
+    max_in_flight: int
+    max_queue_depth: int
+    queue_timeout_seconds: Optional[float]
+    retry_after_seconds: int
+    in_flight: int
+    queue_depth: int
+    admitted: int
+    rejected_queue_full: int
+    rejected_timeout: int
+    _semaphore: Optional[asyncio.Semaphore]
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue_depth: int = 0,
+        queue_timeout_seconds: Optional[float] = None,
+        retry_after_seconds: int = 1,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._semaphore = None
+
+    @property
+    def rejected(self) -> int:
+        return self.rejected_queue_full + self.rejected_timeout
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Return a snapshot of the current load and of the counters."""
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Wait for a slot to compute a hash.
+
+        :raises PasswordHashingOverloadedError: The queue is full
+        or no slot was freed in time.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        if self._semaphore.locked():
+            if self.queue_depth >= self.max_queue_depth:
+                self.rejected_queue_full += 1
+                raise PasswordHashingOverloadedError(self.retry_after_seconds)
+
+            self.queue_depth += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), self.queue_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise PasswordHashingOverloadedError(self.retry_after_seconds)
+            finally:
+                self.queue_depth -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+hashing_admission_controller: Optional[HashingAdmissionController] = None
+
+_dummy_password_hash: Optional[Tuple[CryptContext, str]] = None
+
 
 def verify_and_update_password(
     plain_password: str, hashed_password: str
@@ -16,5 +150,231 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def get_password_hashes(passwords: Sequence[str]) -> List[str]:
+    """Hash several passwords, e.g. in a single task of a process pool."""
+    return [pwd_context.hash(password) for password in passwords]
+
+
 def generate_password() -> str:
     return pwd.genword()
+
+
+def get_dummy_password_hash() -> str:
+    """
+    Return a hash of a random password, computed once per password context.
+
+    It uses the default scheme and cost of the context, so verifying a password
+    against it takes as long as against the hash of an actual user.
+    """
+    global _dummy_password_hash
+
+    if _dummy_password_hash is None or _dummy_password_hash[0] is not pwd_context:
+        _dummy_password_hash = (pwd_context, pwd_context.hash(generate_password()))
+    return _dummy_password_hash[1]
+
+
+def verify_dummy_password(plain_password: str) -> None:
+    verify_and_update_password(plain_password, get_dummy_password_hash())
+
+
+def get_password_context(
+    scheme: str = "bcrypt", **scheme_settings: Any
+) -> CryptContext:
+    """
+    Create a password context hashing new passwords with the given scheme.
+
+    Hashes of the other supported schemes are still verified,
+    and replaced by a hash of the new scheme on the next successful login.
+
+    :param scheme: Hashing scheme: `bcrypt`, `argon2` (argon2id) or `scrypt`.
+    :param scheme_settings: Cost settings of the scheme, e.g. `rounds` for bcrypt,
+    `time_cost`, `memory_cost` (KiB) and `parallelism` for argon2,
+    `rounds` (log2 of N), `block_size` and `parallelism` for scrypt.
+    """
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Unsupported password hashing scheme: {scheme}")
+
+    schemes = [scheme, *(s for s in SUPPORTED_SCHEMES if s != scheme)]
+    settings = {f"{scheme}__{key}": value for key, value in scheme_settings.items()}
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+def calibrate_password_context(
+    scheme: str = "bcrypt",
+    target_seconds: float = 0.05,
+    samples: int = 3,
+    **scheme_settings: Any,
+) -> CryptContext:
+    """
+    Create a password context with the highest cost hashing in the target duration.
+
+    The hashing duration is measured on the current host.
+    For argon2, the memory cost is lowered if a single pass is already too slow.
+
+    :param scheme: Hashing scheme: `bcrypt`, `argon2` (argon2id) or `scrypt`.
+    :param target_seconds: Maximum duration of a hash.
+    :param samples: Number of hashes measured for each cost.
+    :param scheme_settings: Fixed settings of the scheme.
+    """
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Unsupported password hashing scheme: {scheme}")
+
+    cost_setting, cost = CALIBRATED_COST_SETTINGS[scheme]
+    settings: Dict[str, Any] = {**scheme_settings, cost_setting: cost}
+
+    if scheme == "argon2":
+        settings.setdefault("memory_cost", ARGON2_DEFAULT_MEMORY_COST)
+        min_memory_cost = 8 * settings.get("parallelism", 1)
+        while (
+            _time_password_hash(get_password_context(scheme, **settings), samples)
+            > target_seconds
+            and settings["memory_cost"] // 2 >= min_memory_cost
+        ):
+            settings["memory_cost"] //= 2
+
+    context = get_password_context(scheme, **settings)
+    while True:
+        settings[cost_setting] += 1
+        next_context = get_password_context(scheme, **settings)
+        if _time_password_hash(next_context, samples) > target_seconds:
+            return context
+        context = next_context
+
+
+def _time_password_hash(context: CryptContext, samples: int) -> float:
+    durations = []
+    for _ in range(samples):
+        password = generate_password()
+        start = time.perf_counter()
+        context.hash(password)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def init_hashing_worker(context_config: str) -> None:
+    """
+    Set the password context of a process pool worker.
+
+    Workers started with the `spawn` method, the default on macOS and Windows,
+    import this module again and would otherwise use the default context.
+    Pass it as `initializer` of your own process pools, with
+    `initargs=(pwd_context.to_string(),)`.
+
+    :param context_config: Password context serialized with `to_string`.
+    """
+    global pwd_context, _dummy_password_hash
+
+    pwd_context = CryptContext.from_string(context_config)
+    _dummy_password_hash = None
+
+
+def configure_password_context(context: CryptContext) -> CryptContext:
+    """
+    Set the password context used to hash and verify passwords.
+
+    The process pool set with `configure_hashing_executor`, if any,
+    is replaced so its workers use this context.
+
+    :param context: passlib `CryptContext` instance.
+    """
+    global pwd_context
+
+    pwd_context = context
+    if _hashing_process_pool_settings is not None:
+        max_workers, mp_context = _hashing_process_pool_settings
+        configure_hashing_executor(max_workers, True, mp_context=mp_context)
+    return context
+
+
+def configure_hashing_executor(
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+    executor: Optional[Executor] = None,
+    mp_context: Optional[BaseContext] = None,
+) -> Executor:
+    """
+    Set the executor running password hashing off the event loop.
+
+    The workers of a process pool are initialized with the current
+    password context, see `init_hashing_worker`.
+
+    :param max_workers: Maximum number of hashes computed concurrently.
+    :param use_processes: Whether to use a process pool instead of a thread pool.
+    :param executor: Custom executor instance. Takes precedence over other arguments.
+    :param mp_context: Optional multiprocessing context starting the processes.
+    """
+    global hashing_executor, _hashing_process_pool_settings
+
+    _hashing_process_pool_settings = None
+    if executor is None:
+        if use_processes:
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=mp_context,
+                initializer=init_hashing_worker,
+                initargs=(pwd_context.to_string(),),
+            )
+            _hashing_process_pool_settings = (max_workers, mp_context)
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="fastapi-users-hashing"
+            )
+
+    previous_executor = hashing_executor
+    hashing_executor = executor
+    if previous_executor is not None:
+        previous_executor.shutdown(wait=False)
+
+    return executor
+
+
+def configure_hashing_admission(
+    max_in_flight: int,
+    max_queue_depth: int = 0,
+    queue_timeout_seconds: Optional[float] = None,
+    retry_after_seconds: int = 1,
+) -> HashingAdmissionController:
+    """
+    Limit the password hashes computed and waiting at the same time.
+
+    :param max_in_flight: Maximum number of hashes computed concurrently.
+    :param max_queue_depth: Maximum number of hashes waiting for a slot.
+    :param queue_timeout_seconds: Maximum duration a hash waits for a slot.
+    :param retry_after_seconds: Delay after which rejected clients may retry.
+    """
+    global hashing_admission_controller
+
+    hashing_admission_controller = HashingAdmissionController(
+        max_in_flight, max_queue_depth, queue_timeout_seconds, retry_after_seconds
+    )
+    return hashing_admission_controller
+
+
+async def _run_in_hashing_executor(func, *args):
+    loop = asyncio.get_event_loop()
+    admission_controller = hashing_admission_controller
+    if admission_controller is None:
+        return await loop.run_in_executor(
+            hashing_executor, functools.partial(func, *args)
+        )
+
+    async with admission_controller.admit():
+        return await loop.run_in_executor(
+            hashing_executor, functools.partial(func, *args)
+        )
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, str]:
+    return await _run_in_hashing_executor(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hashing_executor(get_password_hash, password)
+
+
+async def verify_dummy_password_async(plain_password: str) -> None:
+    await _run_in_hashing_executor(verify_dummy_password, plain_password)
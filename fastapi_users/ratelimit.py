@@ -0,0 +1,158 @@
+import math
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request
+
+
+class RateLimitExceededError(Exception):
+    """Too many requests were made for a rate limit key."""
+
+    retry_after_seconds: int
+
+    def __init__(self, retry_after_seconds: int):
+        super().__init__("Rate limit exceeded")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class RateLimit(NamedTuple):
+    """
+    Allow `times` requests per `seconds`, refilled continuously.
+
+    :param times: Maximum number of requests in a burst.
+    :param seconds: Duration over which `times` requests are allowed.
+    """
+
+    times: int
+    seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.times / self.seconds
+
+
+class BaseRateLimitStore:
+    """Base storage of the token buckets of a rate limiter."""
+
+    async def hit(self, key: str, rate_limit: RateLimit) -> float:
+        """
+        Take a token from the bucket of a key.
+
+        :param key: Rate limit key.
+        :param rate_limit: Capacity and refill rate of the bucket.
+        :return: 0 if a token was taken, otherwise the number of seconds
+        before the next token is available.
+        """
+        raise NotImplementedError()
+
+
+class InMemoryRateLimitStore(BaseRateLimitStore):
+    """
+    Token buckets stored in the memory of the process.
+
+    The buckets are spread over several shards. The full buckets of a shard,
+    which are equivalent to missing ones, are evicted at most once
+    per `eviction_interval_seconds`, so each hit only walks a fraction of them.
+
+    :param shards: Number of shards.
+    :param eviction_interval_seconds: Minimum delay between two evictions
+    of a shard.
+    """
+
+    # Per shard: key -> (tokens, updated_at, full_at)
+    _shards: List[Dict[str, Tuple[float, float, float]]]
+    _evicted_at: List[float]
+
+    def __init__(self, shards: int = 16, eviction_interval_seconds: float = 60):
+        self._shards = [{} for _ in range(shards)]
+        self._evicted_at = [time.monotonic()] * shards
+        self.eviction_interval_seconds = eviction_interval_seconds
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    async def hit(self, key: str, rate_limit: RateLimit) -> float:
+        now = time.monotonic()
+        shard_index = hash(key) % len(self._shards)
+        shard = self._shards[shard_index]
+
+        if now - self._evicted_at[shard_index] >= self.eviction_interval_seconds:
+            self._evict(shard, now)
+            self._evicted_at[shard_index] = now
+
+        refill_per_second = rate_limit.refill_per_second
+        tokens = float(rate_limit.times)
+        bucket = shard.get(key)
+        if bucket is not None:
+            bucket_tokens, updated_at, _ = bucket
+            tokens = min(tokens, bucket_tokens + (now - updated_at) * refill_per_second)
+
+        if tokens < 1:
+            return (1 - tokens) / refill_per_second
+
+        tokens -= 1
+        full_at = now + (rate_limit.times - tokens) / refill_per_second
+        shard[key] = (tokens, now, full_at)
+        return 0
+
+    def _evict(self, shard: Dict[str, Tuple[float, float, float]], now: float):
+        for key in [key for key, (_, _, full_at) in shard.items() if full_at <= now]:
+            del shard[key]
+
+
+def get_client_host(request: Request) -> str:
+    return request.client.host if request.client else ""
+
+
+class RateLimiter:
+    """
+    Limit the requests per client IP address and per target email.
+
+    :param ip_limit: Rate limit per client IP address. None to disable it.
+    :param email_limit: Rate limit per target email. None to disable it.
+    :param store: Storage of the token buckets.
+    Defaults to an in-memory store, local to each process.
+    :param get_client_ip: Callable returning the IP address of a request's client.
+    Defaults to the peer address; override it behind a reverse proxy.
+    """
+
+    ip_limit: Optional[RateLimit]
+    email_limit: Optional[RateLimit]
+    store: BaseRateLimitStore
+    get_client_ip: Callable[[Request], str]
+
+    def __init__(
+        self,
+        ip_limit: Optional[RateLimit] = RateLimit(times=20, seconds=60),
+        email_limit: Optional[RateLimit] = RateLimit(times=5, seconds=60),
+        store: Optional[BaseRateLimitStore] = None,
+        get_client_ip: Callable[[Request], str] = get_client_host,
+    ):
+        self.ip_limit = ip_limit
+        self.email_limit = email_limit
+        self.store = store if store is not None else InMemoryRateLimitStore()
+        self.get_client_ip = get_client_ip
+
+    async def check(
+        self, scope: str, request: Request, email: Optional[str] = None
+    ) -> None:
+        """
+        Take a token for the client IP address, then for the email.
+
+        :param scope: Name of the limited action, e.g. `login`.
+        :param request: Incoming request.
+        :param email: Target email, if any.
+        :raises RateLimitExceededError: One of the limits is exceeded.
+        """
+        if self.ip_limit is not None:
+            key = f"{scope}:ip:{self.get_client_ip(request)}"
+            await self._hit(key, self.ip_limit)
+
+        if self.email_limit is not None and email is not None:
+            key = f"{scope}:email:{email.lower()}"
+            await self._hit(key, self.email_limit)
+
+    async def _hit(self, key: str, rate_limit: RateLimit):
+        retry_after = await self.store.hit(key, rate_limit)
+        if retry_after > 0:
+            raise RateLimitExceededError(math.ceil(retry_after))
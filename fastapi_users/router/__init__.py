@@ -1,10 +1,33 @@
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
 from fastapi_users.router.auth import get_auth_router  # noqa: F401
-from fastapi_users.router.common import ErrorCode  # noqa: F401
+from fastapi_users.router.common import (  # noqa: F401
+    BackgroundHookDispatcher,
+    ErrorCode,
+    HookDispatcher,
+    QueueHookDispatcher,
+)
 from fastapi_users.router.register import get_register_router  # noqa: F401
 from fastapi_users.router.reset import get_reset_password_router  # noqa: F401
 from fastapi_users.router.users import get_users_router  # noqa: F401
 
-try:
+if TYPE_CHECKING:  # pragma: no cover
     from fastapi_users.router.oauth import get_oauth_router  # noqa: F401
-except ModuleNotFoundError:  # pragma: no cover
-    pass
+
+# Imported on first access (PEP 562), so httpx-oauth is only loaded by OAuth setups
+_LAZY_EXPORTS = {
+    "get_oauth_router": "fastapi_users.router.oauth",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_LAZY_EXPORTS])
@@ -1,25 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from fastapi_users import models
 from fastapi_users.authentication import Authenticator, BaseAuthentication
 from fastapi_users.db import BaseUserDatabase
-from fastapi_users.router.common import ErrorCode
+from fastapi_users.ratelimit import RateLimiter
+from fastapi_users.router.common import (
+    ErrorCode,
+    check_rate_limit,
+    handle_password_hashing_overload,
+)
 
 
 def get_auth_router(
     backend: BaseAuthentication,
     user_db: BaseUserDatabase[models.BaseUserDB],
     authenticator: Authenticator,
+    rate_limiter: Optional[RateLimiter] = None,
 ) -> APIRouter:
     """Generate a router with login/logout routes for an authentication backend."""
     router = APIRouter()
 
     @router.post("/login")
     async def login(
-        response: Response, credentials: OAuth2PasswordRequestForm = Depends()
+        request: Request,
+        response: Response,
+        credentials: OAuth2PasswordRequestForm = Depends(),
     ):
-        user = await user_db.authenticate(credentials)
+        await check_rate_limit(rate_limiter, "login", request, credentials.username)
+        with handle_password_hashing_overload():
+            user = await user_db.authenticate(credentials)
 
         if user is None or not user.is_active:
             raise HTTPException(
@@ -1,5 +1,13 @@
 import asyncio
-from typing import Callable
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from fastapi_users.password import PasswordHashingOverloadedError
+from fastapi_users.ratelimit import RateLimiter, RateLimitExceededError
 
 
 class ErrorCode:
@@ -9,6 +17,11 @@ class ErrorCode:
     ACTIVATE_USER_BAD_TOKEN = "ACTIVATE_USER_BAD_TOKEN"
     ACTIVATE_USER_LINK_USED = "ACTIVATE_USER_LINK_USED"
     ACTIVATE_USER_TOKEN_EXPIRED = "ACTIVATE_USER_TOKEN_EXPIRED"
+    PASSWORD_HASHING_OVERLOADED = "PASSWORD_HASHING_OVERLOADED"
+    RATE_LIMIT_EXCEEDED = "RATE_LIMIT_EXCEEDED"
+
+
+logger = logging.getLogger("fastapi_users")
 
 
 async def run_handler(handler: Callable, *args, **kwargs):
@@ -16,3 +29,194 @@ async def run_handler(handler: Callable, *args, **kwargs):
         await handler(*args, **kwargs)
     else:
         handler(*args, **kwargs)
+
+
+async def run_handler_in_threadpool(handler: Callable, *args, **kwargs):
+    if asyncio.iscoroutinefunction(handler):
+        await handler(*args, **kwargs)
+    else:
+        await run_in_threadpool(handler, *args, **kwargs)
+
+
+class HookDispatcher:
+    """
+    Run the hooks, like `after_register`, inline in the request.
+
+    Sync hooks are called directly on the event loop.
+    """
+
+    async def dispatch(self, handler: Callable, *args, **kwargs) -> None:
+        await run_handler(handler, *args, **kwargs)
+
+
+class BackgroundHookDispatcher(HookDispatcher):
+    """
+    Run the hooks in background tasks, without waiting for them.
+
+    Sync hooks are run in a threadpool. Failures are logged.
+    """
+
+    _tasks: Set[asyncio.Future]
+
+    def __init__(self):
+        self._tasks = set()
+
+    async def dispatch(self, handler: Callable, *args, **kwargs) -> None:
+        task = asyncio.ensure_future(self._run(handler, *args, **kwargs))
+        # Keep a reference until it's done so it's not garbage collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def join(self) -> None:
+        """Wait for the hooks in progress."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def _run(self, handler: Callable, *args, **kwargs):
+        try:
+            await run_handler_in_threadpool(handler, *args, **kwargs)
+        except Exception:
+            logger.exception("Hook %r failed", handler)
+
+
+class QueueHookDispatcher(HookDispatcher):
+    """
+    Run the hooks from a bounded queue, consumed by worker tasks.
+
+    Sync hooks are run in a threadpool. Failed hooks are retried;
+    hooks dispatched while the queue is full are dropped.
+
+    :param max_size: Maximum number of hooks waiting in the queue.
+    :param workers: Number of worker tasks running the hooks.
+    :param max_retries: Number of retries of a failed hook.
+    :param retry_delay_seconds: Delay before retrying a failed hook.
+    """
+
+    max_size: int
+    workers: int
+    max_retries: int
+    retry_delay_seconds: float
+    dispatched: int
+    succeeded: int
+    retried: int
+    failed: int
+    dropped: int
+    _queue: Optional["asyncio.Queue[Tuple[Callable, Tuple, Dict[str, Any]]]"]
+    _workers: List[asyncio.Future]
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        workers: int = 1,
+        max_retries: int = 3,
+        retry_delay_seconds: float = 1,
+    ):
+        self.max_size = max_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay_seconds = retry_delay_seconds
+        self.dispatched = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = None
+        self._workers = []
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Return a snapshot of the queue size and of the counters."""
+        return {
+            "queue_size": self.queue_size,
+            "dispatched": self.dispatched,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    async def dispatch(self, handler: Callable, *args, **kwargs) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_size)
+            self._workers = [
+                asyncio.ensure_future(self._work(self._queue))
+                for _ in range(self.workers)
+            ]
+
+        try:
+            self._queue.put_nowait((handler, args, kwargs))
+            self.dispatched += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Hook queue is full, dropped %r", handler)
+
+    async def join(self) -> None:
+        """Wait for the queued hooks to be run."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Run the queued hooks, then stop the workers."""
+        await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+
+    async def _work(self, queue: "asyncio.Queue[Tuple[Callable, Tuple, Dict]]"):
+        while True:
+            handler, args, kwargs = await queue.get()
+            try:
+                await self._run(handler, args, kwargs)
+            finally:
+                queue.task_done()
+
+    async def _run(self, handler: Callable, args: Tuple, kwargs: Dict[str, Any]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await run_handler_in_threadpool(handler, *args, **kwargs)
+                self.succeeded += 1
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.exception("Hook %r failed", handler)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_delay_seconds)
+
+
+@contextmanager
+def handle_password_hashing_overload() -> Iterator[None]:
+    """Turn a rejected password hash into a 503 response."""
+    try:
+        yield
+    except PasswordHashingOverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ErrorCode.PASSWORD_HASHING_OVERLOADED,
+            headers={"Retry-After": str(e.retry_after_seconds)},
+        )
+
+
+async def check_rate_limit(
+    rate_limiter: Optional[RateLimiter],
+    scope: str,
+    request: Request,
+    email: Optional[str] = None,
+):
+    """Turn an exceeded rate limit into a 429 response."""
+    if rate_limiter is None:
+        return
+    try:
+        await rate_limiter.check(scope, request, email)
+    except RateLimitExceededError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=ErrorCode.RATE_LIMIT_EXCEEDED,
+            headers={"Retry-After": str(e.retry_after_seconds)},
+        )
@@ -8,8 +8,12 @@ from httpx_oauth.oauth2 import BaseOAuth2
 from fastapi_users import models
 from fastapi_users.authentication import Authenticator
 from fastapi_users.db import BaseUserDatabase
-from fastapi_users.password import generate_password, get_password_hash
-from fastapi_users.router.common import ErrorCode, run_handler
+from fastapi_users.password import generate_password, get_password_hash_async
+from fastapi_users.router.common import (
+    ErrorCode,
+    HookDispatcher,
+    handle_password_hashing_overload,
+)
 from fastapi_users.utils import JWT_ALGORITHM, generate_jwt
 
 STATE_TOKEN_AUDIENCE = "fastapi-users:oauth-state"
@@ -39,8 +43,10 @@ def get_oauth_router(
     state_secret: str,
     redirect_url: str = None,
     after_register: Optional[Callable[[models.UD, Request], None]] = None,
+    hook_dispatcher: Optional[HookDispatcher] = None,
 ) -> APIRouter:
     """Generate a router with the OAuth routes."""
+    dispatcher = hook_dispatcher or HookDispatcher()
     router = APIRouter()
     callback_route_name = f"{oauth_client.name}-callback"
 
@@ -119,28 +125,32 @@ def get_oauth_router(
             if user:
                 # Link account
                 user.oauth_accounts.append(new_oauth_account)  # type: ignore
-                await user_db.update(user)
+                await user_db.update_fields(user, {"oauth_accounts"})
             else:
                 # Create account
                 password = generate_password()
+                with handle_password_hashing_overload():
+                    hashed_password = await get_password_hash_async(password)
                 user = user_db_model(
                     email=account_email,
-                    hashed_password=get_password_hash(password),
+                    hashed_password=hashed_password,
                     oauth_accounts=[new_oauth_account],
                 )
                 await user_db.create(user)
                 if after_register:
-                    await run_handler(after_register, user, request)
+                    await dispatcher.dispatch(after_register, user, request)
         else:
             # Update oauth
             updated_oauth_accounts = []
             for oauth_account in user.oauth_accounts:  # type: ignore
                 if oauth_account.account_id == account_id:
+                    # Keep the id so the existing account is updated in place
+                    new_oauth_account.id = oauth_account.id
                     updated_oauth_accounts.append(new_oauth_account)
                 else:
                     updated_oauth_accounts.append(oauth_account)
             user.oauth_accounts = updated_oauth_accounts  # type: ignore
-            await user_db.update(user)
+            await user_db.update_fields(user, {"oauth_accounts"})
 
         if not user.is_active:
             raise HTTPException(
@@ -5,9 +5,15 @@ from fastapi import APIRouter, Body, HTTPException, Request, status
 from pydantic import UUID4
 
 from fastapi_users import models
-from fastapi_users.db import BaseUserDatabase
-from fastapi_users.password import get_password_hash
-from fastapi_users.router.common import ErrorCode, run_handler
+from fastapi_users.db import BaseUserDatabase, UserAlreadyExists
+from fastapi_users.password import get_password_hash_async
+from fastapi_users.ratelimit import RateLimiter
+from fastapi_users.router.common import (
+    ErrorCode,
+    HookDispatcher,
+    check_rate_limit,
+    handle_password_hashing_overload,
+)
 from fastapi_users.utils import JWT_ALGORITHM, generate_jwt
 
 ACTIVATE_USER_TOKEN_AUDIENCE = "fastapi-users:activate"
@@ -22,8 +28,11 @@ def get_register_router(
     activation_callback: Optional[Callable[[models.UD, str, Request], None]] = None,
     activation_token_secret: str = None,
     activation_token_lifetime_seconds: int = 3600,
+    rate_limiter: Optional[RateLimiter] = None,
+    hook_dispatcher: Optional[HookDispatcher] = None,
 ) -> APIRouter:
     """Generate a router with the register route."""
+    dispatcher = hook_dispatcher or HookDispatcher()
 
     if activation_token_secret and not activation_callback:
         raise ValueError("Must supply activation_callback with activation_token_secret")
@@ -37,23 +46,26 @@ def get_register_router(
     )
     async def register(request: Request, user: user_create_model):  # type: ignore
         user = cast(models.BaseUserCreate, user)  # Prevent mypy complain
-        existing_user = await user_db.get_by_email(user.email)
-
-        if existing_user is not None and existing_user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=ErrorCode.REGISTER_USER_ALREADY_EXISTS,
-            )
+        await check_rate_limit(rate_limiter, "register", request, user.email)
+
+        with handle_password_hashing_overload():
+            hashed_password = await get_password_hash_async(user.password)
+        db_user = user_db_model(
+            **user.create_update_dict(),
+            hashed_password=hashed_password,
+            is_active=not activation_callback
+        )
 
-        hashed_password = get_password_hash(user.password)
-        if existing_user is None:
-            db_user = user_db_model(
-                **user.create_update_dict(),
-                hashed_password=hashed_password,
-                is_active=not activation_callback
-            )
+        try:
             created_user = await user_db.create(db_user)
-        else:
+        except UserAlreadyExists:
+            # An inactive user may register again to get a new activation token
+            existing_user = await user_db.get_by_email(user.email)
+            if existing_user is None or existing_user.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=ErrorCode.REGISTER_USER_ALREADY_EXISTS,
+                )
             created_user = existing_user
 
         if activation_callback:
@@ -66,9 +78,9 @@ def get_register_router(
                 activation_token_lifetime_seconds,
                 activation_token_secret,
             )
-            await run_handler(activation_callback, created_user, token, request)
+            await dispatcher.dispatch(activation_callback, created_user, token, request)
         elif after_register:
-            await run_handler(after_register, created_user, request)
+            await dispatcher.dispatch(after_register, created_user, request)
 
         return created_user
 
@@ -125,9 +137,9 @@ def get_register_router(
                 )
             user.is_active = True
 
-            await user_db.update(user)
+            await user_db.update_fields(user, {"is_active"})
             if after_register:
-                await run_handler(after_register, user, request)
+                await dispatcher.dispatch(after_register, user, request)
             return user
 
     return router
@@ -6,8 +6,14 @@ from pydantic import UUID4, EmailStr
 
 from fastapi_users import models
 from fastapi_users.db import BaseUserDatabase
-from fastapi_users.password import get_password_hash
-from fastapi_users.router.common import ErrorCode, run_handler
+from fastapi_users.password import get_password_hash_async
+from fastapi_users.ratelimit import RateLimiter
+from fastapi_users.router.common import (
+    ErrorCode,
+    HookDispatcher,
+    check_rate_limit,
+    handle_password_hashing_overload,
+)
 from fastapi_users.utils import JWT_ALGORITHM, generate_jwt
 
 RESET_PASSWORD_TOKEN_AUDIENCE = "fastapi-users:reset"
@@ -18,14 +24,18 @@ def get_reset_password_router(
     reset_password_token_secret: str,
     reset_password_token_lifetime_seconds: int = 3600,
     after_forgot_password: Optional[Callable[[models.UD, str, Request], None]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    hook_dispatcher: Optional[HookDispatcher] = None,
 ) -> APIRouter:
     """Generate a router with the reset password routes."""
+    dispatcher = hook_dispatcher or HookDispatcher()
     router = APIRouter()
 
     @router.post("/forgot-password", status_code=status.HTTP_202_ACCEPTED)
     async def forgot_password(
         request: Request, email: EmailStr = Body(..., embed=True)
     ):
+        await check_rate_limit(rate_limiter, "forgot_password", request, email)
         user = await user_db.get_by_email(email)
 
         if user is not None and user.is_active:
@@ -36,7 +46,7 @@ def get_reset_password_router(
                 reset_password_token_secret,
             )
             if after_forgot_password:
-                await run_handler(after_forgot_password, user, token, request)
+                await dispatcher.dispatch(after_forgot_password, user, token, request)
 
         return None
 
@@ -71,8 +81,9 @@ def get_reset_password_router(
                     detail=ErrorCode.RESET_PASSWORD_BAD_TOKEN,
                 )
 
-            user.hashed_password = get_password_hash(password)
-            await user_db.update(user)
+            with handle_password_hashing_overload():
+                user.hashed_password = await get_password_hash_async(password)
+            await user_db.update_fields(user, {"hashed_password"})
         except jwt.PyJWTError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
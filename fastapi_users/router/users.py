@@ -1,13 +1,20 @@
-from typing import Any, Callable, Dict, Optional, Type, cast
+from typing import Any, Callable, Dict, List, Optional, Type, cast
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from pydantic import UUID4
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import UUID4, create_model
 
 from fastapi_users import models
 from fastapi_users.authentication import Authenticator
 from fastapi_users.db import BaseUserDatabase
-from fastapi_users.password import get_password_hash
-from fastapi_users.router.common import run_handler
+from fastapi_users.export import (
+    EXPORT_MEDIA_TYPES,
+    ExportFormat,
+    get_export_fields,
+    stream_users_export,
+)
+from fastapi_users.password import get_password_hash_async
+from fastapi_users.router.common import HookDispatcher, handle_password_hashing_overload
 
 
 def get_users_router(
@@ -17,13 +24,21 @@ def get_users_router(
     user_db_model: Type[models.BaseUserDB],
     authenticator: Authenticator,
     after_update: Optional[Callable[[models.UD, Dict[str, Any], Request], None]] = None,
+    hook_dispatcher: Optional[HookDispatcher] = None,
 ) -> APIRouter:
     """Generate a router with the authentication routes."""
+    dispatcher = hook_dispatcher or HookDispatcher()
     router = APIRouter()
 
     get_current_active_user = authenticator.get_current_active_user
     get_current_superuser = authenticator.get_current_superuser
 
+    users_page_model = create_model(
+        "UsersPage",
+        results=(List[user_model], ...),  # type: ignore
+        next_cursor=(Optional[UUID4], None),
+    )
+
     async def _get_or_404(id: UUID4) -> models.BaseUserDB:
         user = await user_db.get(id)
         if user is None:
@@ -33,15 +48,19 @@ def get_users_router(
     async def _update_user(
         user: models.BaseUserDB, update_dict: Dict[str, Any], request: Request
     ):
+        updated_fields = set()
         for field in update_dict:
             if field == "password":
-                hashed_password = get_password_hash(update_dict[field])
+                with handle_password_hashing_overload():
+                    hashed_password = await get_password_hash_async(update_dict[field])
                 user.hashed_password = hashed_password
+                updated_fields.add("hashed_password")
             else:
                 setattr(user, field, update_dict[field])
-        updated_user = await user_db.update(user)
+                updated_fields.add(field)
+        updated_user = await user_db.update_fields(user, updated_fields)
         if after_update:
-            await run_handler(after_update, updated_user, update_dict, request)
+            await dispatcher.dispatch(after_update, updated_user, update_dict, request)
         return updated_user
 
     @router.get("/me", response_model=user_model)
@@ -60,11 +79,46 @@ def get_users_router(
             models.BaseUserUpdate,
             updated_user,
         )  # Prevent mypy complain
+        if isinstance(user, models.UserFromClaims):
+            # Built from stateless token claims: load it fully before writing
+            user = await _get_or_404(cast(models.BaseUserDB, user).id)
         updated_user_data = updated_user.create_update_dict()
         updated_user = await _update_user(user, updated_user_data, request)
 
         return updated_user
 
+    @router.get(
+        "/",
+        response_model=users_page_model,
+        dependencies=[Depends(get_current_superuser)],
+    )
+    async def list_users(
+        cursor: Optional[UUID4] = None,
+        limit: int = Query(50, ge=1, le=100),
+        is_active: Optional[bool] = None,
+        is_superuser: Optional[bool] = None,
+        email_prefix: Optional[str] = None,
+    ):
+        filters = models.UserListFilters(
+            is_active=is_active, is_superuser=is_superuser, email_prefix=email_prefix
+        )
+        # Fetch one more user to know whether there is a next page
+        users = await user_db.list(cursor, limit + 1, filters)
+        next_cursor = users[limit - 1].id if len(users) > limit else None
+        return {"results": users[:limit], "next_cursor": next_cursor}
+
+    @router.get("/export", dependencies=[Depends(get_current_superuser)])
+    async def export_users(format: ExportFormat = ExportFormat.NDJSON):
+        fields = get_export_fields(user_model, format)
+        content = stream_users_export(user_db.iterate(), format, fields)
+        return StreamingResponse(
+            content,
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": f'attachment; filename="users.{format.value}"'
+            },
+        )
+
     @router.get(
         "/{id}",
         response_model=user_model,
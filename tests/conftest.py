@@ -10,11 +10,12 @@ from httpx_oauth.oauth2 import OAuth2
 from pydantic import UUID4
 from starlette.applications import ASGIApp
 
-from fastapi_users import models
+from fastapi_users import models, password
 from fastapi_users.authentication import Authenticator, BaseAuthentication
-from fastapi_users.db import BaseUserDatabase
+from fastapi_users.db import BaseUserDatabase, UserAlreadyExists
 from fastapi_users.models import BaseOAuthAccount, BaseOAuthAccountMixin, BaseUserDB
-from fastapi_users.password import get_password_hash
+from fastapi_users.password import HashingAdmissionController, get_password_hash
+from fastapi_users.ratelimit import RateLimit, RateLimiter
 
 guinevere_password_hash = get_password_hash("guinevere")
 angharad_password_hash = get_password_hash("angharad")
@@ -150,6 +151,22 @@ def oauth_account3() -> BaseOAuthAccount:
     )
 
 
+@pytest.fixture
+def rate_limiter() -> RateLimiter:
+    """Allow a single request per email and per minute."""
+    return RateLimiter(ip_limit=None, email_limit=RateLimit(times=1, seconds=60))
+
+
+@pytest.fixture
+def overloaded_hashing(mocker) -> HashingAdmissionController:
+    """Reject every password hash, as if all the slots were taken."""
+    admission_controller = HashingAdmissionController(
+        max_in_flight=0, retry_after_seconds=5
+    )
+    mocker.patch.object(password, "hashing_admission_controller", admission_controller)
+    return admission_controller
+
+
 @pytest.fixture
 def mock_user_db(user, active_user, inactive_user, superuser) -> BaseUserDatabase:
     class MockUserDatabase(BaseUserDatabase[UserDB]):
@@ -174,7 +191,33 @@ def mock_user_db(user, active_user, inactive_user, superuser) -> BaseUserDatabas
                 return superuser
             return None
 
+        async def list(
+            self,
+            cursor: Optional[UUID4] = None,
+            limit: int = 100,
+            filters: Optional[models.UserListFilters] = None,
+        ) -> List[UserDB]:
+            users = sorted(
+                [user, active_user, inactive_user, superuser],
+                key=lambda user: str(user.id),
+            )
+            if cursor is not None:
+                users = [user for user in users if str(user.id) > str(cursor)]
+            if filters is not None:
+                if filters.is_active is not None:
+                    users = [u for u in users if u.is_active == filters.is_active]
+                if filters.is_superuser is not None:
+                    users = [u for u in users if u.is_superuser == filters.is_superuser]
+                if filters.email_prefix:
+                    prefix = filters.email_prefix.lower()
+                    users = [u for u in users if u.email.lower().startswith(prefix)]
+            return users[:limit]
+
         async def create(self, user: UserDB) -> UserDB:
+            # Like the adapters, whose case-insensitive unique email
+            # is tested in test_db_*.py
+            if await self.get_by_email(user.email) is not None:
+                raise UserAlreadyExists()
             return user
 
         async def update(self, user: UserDB) -> UserDB:
@@ -1,12 +1,17 @@
 from typing import Optional
 
 import pytest
-from fastapi import Request, status
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.security.base import SecurityBase
 
-from fastapi_users.authentication import BaseAuthentication, DuplicateBackendNamesError
+from fastapi_users.authentication import (
+    Authenticator,
+    BaseAuthentication,
+    DuplicateBackendNamesError,
+)
 from fastapi_users.db import BaseUserDatabase
 from fastapi_users.models import BaseUserDB
+from tests.conftest import MockAuthentication, UserDB
 
 
 class MockSecurityScheme(SecurityBase):
@@ -61,3 +66,45 @@ async def test_authenticators_with_same_name(get_test_auth_client):
     with pytest.raises(DuplicateBackendNamesError):
         async for client in get_test_auth_client([BackendNone(), BackendNone()]):
             pass
+
+
+@pytest.mark.authentication
+@pytest.mark.asyncio
+async def test_authenticator_resolves_user_once(mocker, get_test_client, user):
+    backend = BackendUser(user)
+    mocker.spy(BackendUser, "__call__")
+    authenticator = Authenticator([backend], BaseUserDatabase(UserDB))
+    app = FastAPI()
+
+    @app.get(
+        "/test-several-dependencies",
+        dependencies=[Depends(authenticator.get_current_superuser)],
+    )
+    def test_several_dependencies(
+        user: UserDB = Depends(authenticator.get_current_active_user),
+        optional_user: UserDB = Depends(authenticator.get_optional_current_user),
+    ):
+        return user
+
+    async for client in get_test_client(app):
+        response = await client.get("/test-several-dependencies")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert BackendUser.__call__.call_count == 1
+
+
+@pytest.mark.authentication
+def test_authenticator_openapi_security_schemes(mock_user_db):
+    authenticator = Authenticator(
+        [MockAuthentication(), MockAuthentication(name="mock-bis")], mock_user_db
+    )
+    app = FastAPI()
+
+    @app.get("/test-current-superuser")
+    def test_current_superuser(
+        user: UserDB = Depends(authenticator.get_current_superuser),
+    ):
+        return user
+
+    openapi = app.openapi()
+    security = openapi["paths"]["/test-current-superuser"]["get"]["security"]
+    assert len(security) == 2
@@ -1,9 +1,16 @@
+from datetime import datetime
+
 import jwt
 import pytest
 from fastapi import Response
 
-from fastapi_users.authentication.jwt import JWTAuthentication
+from fastapi_users.authentication.jwt import (
+    JWTAuthentication,
+    get_user_from_claims_model,
+)
+from fastapi_users.models import UserFromClaims
 from fastapi_users.utils import JWT_ALGORITHM, generate_jwt
+from tests.conftest import UserDB
 
 SECRET = "SECRET"
 LIFETIME = 3600
@@ -83,3 +90,102 @@ async def test_get_login_response(jwt_authentication, user):
 async def test_get_logout_response(jwt_authentication, user):
     with pytest.raises(NotImplementedError):
         await jwt_authentication.get_logout_response(user, Response())
+
+
+@pytest.fixture
+def stateless_jwt_authentication():
+    return JWTAuthentication(
+        SECRET, LIFETIME, TOKEN_URL, stateless=True, extra_claims_fields=["first_name"]
+    )
+
+
+@pytest.mark.authentication
+class TestStateless:
+    @pytest.mark.asyncio
+    async def test_login_response_claims(self, stateless_jwt_authentication, user):
+        user.first_name = "Arthur"
+        login_response = await stateless_jwt_authentication.get_login_response(
+            user, Response()
+        )
+
+        token = login_response["access_token"]
+        decoded = jwt.decode(
+            token, SECRET, audience="fastapi-users:auth", algorithms=[JWT_ALGORITHM]
+        )
+        assert decoded["user_id"] == str(user.id)
+        assert "iat" in decoded
+        assert decoded["user"] == {
+            "email": user.email,
+            "is_active": True,
+            "is_superuser": False,
+            "first_name": "Arthur",
+        }
+
+    @pytest.mark.asyncio
+    async def test_authenticate_without_database(
+        self, mocker, stateless_jwt_authentication, mock_user_db, superuser
+    ):
+        mocker.spy(mock_user_db, "get")
+        login_response = await stateless_jwt_authentication.get_login_response(
+            superuser, Response()
+        )
+
+        authenticated_user = await stateless_jwt_authentication(
+            login_response["access_token"], mock_user_db
+        )
+        assert mock_user_db.get.called is False
+        assert authenticated_user.id == superuser.id
+        assert authenticated_user.email == superuser.email
+        assert authenticated_user.is_superuser is True
+        assert isinstance(authenticated_user, UserFromClaims)
+        assert isinstance(authenticated_user, type(superuser))
+        assert authenticated_user.hashed_password is None
+
+    @pytest.mark.asyncio
+    async def test_token_without_claims(
+        self, mocker, stateless_jwt_authentication, mock_user_db, token, user
+    ):
+        mocker.spy(mock_user_db, "get")
+        authenticated_user = await stateless_jwt_authentication(
+            token(user.id), mock_user_db
+        )
+        assert mock_user_db.get.called is True
+        assert authenticated_user.id == user.id
+
+    @pytest.mark.asyncio
+    async def test_stale_token(self, mocker, mock_user_db, user):
+        stateless_jwt_authentication = JWTAuthentication(
+            SECRET, LIFETIME, TOKEN_URL, stateless=True, max_staleness_seconds=-1
+        )
+        mocker.spy(mock_user_db, "get")
+        login_response = await stateless_jwt_authentication.get_login_response(
+            user, Response()
+        )
+
+        authenticated_user = await stateless_jwt_authentication(
+            login_response["access_token"], mock_user_db
+        )
+        assert mock_user_db.get.called is True
+        assert authenticated_user.id == user.id
+
+    @pytest.mark.asyncio
+    async def test_invalid_claims(
+        self, stateless_jwt_authentication, mock_user_db, user
+    ):
+        data = {
+            "aud": "fastapi-users:auth",
+            "user_id": str(user.id),
+            "user": {"email": "arthur"},
+            "iat": datetime.utcnow(),
+        }
+        token = generate_jwt(data, LIFETIME, SECRET, JWT_ALGORITHM)
+        authenticated_user = await stateless_jwt_authentication(token, mock_user_db)
+        assert authenticated_user is None
+
+
+def test_get_user_from_claims_model():
+    model = get_user_from_claims_model(UserDB)
+    assert model is get_user_from_claims_model(UserDB)
+    assert issubclass(model, UserDB)
+    assert issubclass(model, UserFromClaims)
+    assert model.__name__ == "UserDBFromClaims"
@@ -1,8 +1,19 @@
+import sqlite3
+import time
+import uuid
+
 import pytest
 from fastapi.security import OAuth2PasswordRequestForm
 
-from fastapi_users.db import BaseUserDatabase
-from tests.conftest import UserDB
+from fastapi_users import password
+from fastapi_users.authentication.jwt import get_user_from_claims_model
+from fastapi_users.db import BaseUserDatabase, UserNotWritable
+from fastapi_users.db.base import (
+    check_writable,
+    construct_trusted_model,
+    is_unique_violation,
+)
+from tests.conftest import UserDB, UserDBOAuth
 
 
 @pytest.fixture
@@ -27,16 +38,131 @@ async def test_not_implemented_methods(user):
     with pytest.raises(NotImplementedError):
         await base_user_db.get_by_oauth_account("google", "user_oauth1")
 
+    with pytest.raises(NotImplementedError):
+        await base_user_db.list()
+
+    with pytest.raises(NotImplementedError):
+        await base_user_db.iterate().__anext__()
+
     with pytest.raises(NotImplementedError):
         await base_user_db.create(user)
 
     with pytest.raises(NotImplementedError):
         await base_user_db.update(user)
 
+    with pytest.raises(NotImplementedError):
+        await base_user_db.update_fields(user, {"email"})
+
     with pytest.raises(NotImplementedError):
         await base_user_db.delete(user)
 
 
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_iterate(mocker, mock_user_db):
+    mocker.spy(mock_user_db, "list")
+
+    users = [user async for user in mock_user_db.iterate(batch_size=2)]
+
+    assert len(users) == 4
+    assert [str(user.id) for user in users] == sorted(str(user.id) for user in users)
+    # Two full pages, then an empty one
+    assert mock_user_db.list.call_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_many(mock_user_db, user, superuser):
+    id_users = await mock_user_db.get_many([user.id, superuser.id, uuid.uuid4()])
+    assert id_users == {user.id: user, superuser.id: superuser}
+
+    email_users = await mock_user_db.get_many_by_email(
+        [user.email.upper(), "lancelot@camelot.bt"]
+    )
+    assert email_users == {user.email.lower(): user}
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many(mock_user_db, user):
+    users = [
+        UserDB(email="lancelot@camelot.bt", hashed_password="guinevere"),
+        UserDB(email=user.email, hashed_password="guinevere"),
+    ]
+    assert await mock_user_db.create_many(users) == [1]
+
+
+@pytest.mark.db
+def test_construct_trusted_model(user_oauth: UserDBOAuth):
+    user_dict = user_oauth.dict()
+    user_dict["_id"] = "ObjectId"
+    user_dict["id"] = str(user_oauth.id)
+    user_dict.pop("is_superuser")
+    for oauth_account in user_dict["oauth_accounts"]:
+        oauth_account["user_id"] = user_oauth.id
+
+    user = construct_trusted_model(UserDBOAuth, user_dict)
+
+    assert user == user_oauth
+    assert user.id == user_oauth.id
+    assert user.is_superuser is False
+    assert "is_superuser" not in user.__fields_set__
+    assert "_id" not in user.__dict__
+    assert user.oauth_accounts[0] == user_oauth.oauth_accounts[0]
+    assert "user_id" not in user.oauth_accounts[0].__dict__
+
+
+@pytest.mark.db
+def test_load_user(mock_user_db, user: UserDB):
+    user_dict = user.dict()
+
+    loaded_user = mock_user_db._load_user(user_dict)
+    assert loaded_user == user
+
+    mock_user_db.validate_on_load = False
+    user_dict["email"] = "not-an-email"
+    loaded_user = mock_user_db._load_user(user_dict)
+    assert loaded_user.email == "not-an-email"
+
+
+@pytest.mark.db
+def test_check_writable(user: UserDB):
+    check_writable(user)
+
+    user_from_claims = get_user_from_claims_model(UserDB)(id=user.id, email=user.email)
+    with pytest.raises(UserNotWritable):
+        check_writable(user_from_claims)
+
+
+class PostgresError(Exception):
+    def __init__(self, sqlstate):
+        self.sqlstate = sqlstate
+
+
+class WrappedError(Exception):
+    def __init__(self, orig):
+        self.orig = orig
+
+
+@pytest.mark.db
+@pytest.mark.parametrize(
+    "error,expected",
+    [
+        (sqlite3.IntegrityError("UNIQUE constraint failed: user.email"), True),
+        (sqlite3.IntegrityError("NOT NULL constraint failed: user.email"), False),
+        (PostgresError("23505"), True),
+        (PostgresError("23502"), False),
+        (Exception(1062, "Duplicate entry 'lancelot@camelot.bt'"), True),
+        (Exception(1048, "Column 'email' cannot be null"), False),
+        (WrappedError(PostgresError("23505")), True),
+        (Exception(sqlite3.IntegrityError("UNIQUE constraint failed")), True),
+        (ValueError("Invalid email"), False),
+    ],
+)
+def test_is_unique_violation(error, expected):
+    assert is_unique_violation(error) is expected
+
+
 @pytest.mark.db
 class TestAuthenticate:
     @pytest.mark.asyncio
@@ -47,6 +173,38 @@ class TestAuthenticate:
         user = await mock_user_db.authenticate(form)
         assert user is None
 
+    @pytest.mark.asyncio
+    async def test_unknown_user_does_not_hash(
+        self, mocker, create_oauth2_password_request_form, mock_user_db
+    ):
+        password.get_dummy_password_hash()
+        mocker.spy(password, "get_password_hash")
+        mocker.spy(password, "verify_dummy_password")
+
+        form = create_oauth2_password_request_form("lancelot@camelot.bt", "guinevere")
+        user = await mock_user_db.authenticate(form)
+        assert user is None
+        assert password.get_password_hash.called is False
+        password.verify_dummy_password.assert_called_once_with("guinevere")
+
+    @pytest.mark.asyncio
+    async def test_unknown_user_timing(
+        self, create_oauth2_password_request_form, mock_user_db
+    ):
+        async def time_authenticate(username: str) -> float:
+            form = create_oauth2_password_request_form(username, "percival")
+            start = time.perf_counter()
+            for _ in range(3):
+                assert await mock_user_db.authenticate(form) is None
+            return time.perf_counter() - start
+
+        # Compute the dummy hash beforehand
+        await time_authenticate("lancelot@camelot.bt")
+
+        unknown_user_time = await time_authenticate("lancelot@camelot.bt")
+        wrong_password_time = await time_authenticate("king.arthur@camelot.bt")
+        assert 0.5 < unknown_user_time / wrong_password_time < 2
+
     @pytest.mark.asyncio
     async def test_wrong_password(
         self, create_oauth2_password_request_form, mock_user_db
@@ -74,6 +232,7 @@ class TestAuthenticate:
             "fastapi_users.password.verify_and_update_password"
         )
         verify_and_update_password_patch.return_value = (True, "updated_hash")
+        mocker.spy(mock_user_db, "update_fields")
         mocker.spy(mock_user_db, "update")
 
         form = create_oauth2_password_request_form(
@@ -82,4 +241,6 @@ class TestAuthenticate:
         user = await mock_user_db.authenticate(form)
         assert user is not None
         assert user.email == "king.arthur@camelot.bt"
+        assert user.hashed_password == "updated_hash"
+        mock_user_db.update_fields.assert_called_once_with(user, {"hashed_password"})
         assert mock_user_db.update.called is True
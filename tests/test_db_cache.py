@@ -0,0 +1,116 @@
+import uuid
+
+import pytest
+
+from fastapi_users.db import CachedUserDatabase
+from fastapi_users.models import UserListFilters
+from tests.conftest import UserDB
+
+
+@pytest.fixture
+def cached_user_db(mock_user_db) -> CachedUserDatabase:
+    return CachedUserDatabase(mock_user_db, ttl_seconds=60, max_size=2)
+
+
+@pytest.mark.db
+class TestGet:
+    @pytest.mark.asyncio
+    async def test_unknown_user(self, mocker, cached_user_db, mock_user_db):
+        mocker.spy(mock_user_db, "get")
+        unknown_id = uuid.uuid4()
+        assert await cached_user_db.get(unknown_id) is None
+        assert await cached_user_db.get(unknown_id) is None
+
+        assert mock_user_db.get.call_count == 2
+        assert cached_user_db.hits == 0
+        assert cached_user_db.misses == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_user(self, mocker, cached_user_db, mock_user_db, user):
+        mocker.spy(mock_user_db, "get")
+
+        first_user = await cached_user_db.get(user.id)
+        second_user = await cached_user_db.get(user.id)
+
+        assert first_user == user
+        assert second_user == user
+        assert mock_user_db.get.call_count == 1
+        assert cached_user_db.hits == 1
+        assert cached_user_db.misses == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_user_copy(self, cached_user_db, user):
+        await cached_user_db.get(user.id)
+        cached_user = await cached_user_db.get(user.id)
+        cached_user.is_superuser = True
+
+        cached_user = await cached_user_db.get(user.id)
+        assert cached_user.is_superuser is False
+
+    @pytest.mark.asyncio
+    async def test_expired_user(self, mocker, cached_user_db, mock_user_db, user):
+        mocker.spy(mock_user_db, "get")
+        cached_user_db.ttl_seconds = 0
+
+        await cached_user_db.get(user.id)
+        await cached_user_db.get(user.id)
+
+        assert mock_user_db.get.call_count == 2
+        assert cached_user_db.hits == 0
+
+    @pytest.mark.asyncio
+    async def test_evict_least_recently_used(
+        self, mocker, cached_user_db, mock_user_db, user, active_user, superuser
+    ):
+        await cached_user_db.get(user.id)
+        await cached_user_db.get(active_user.id)
+        await cached_user_db.get(user.id)
+        await cached_user_db.get(superuser.id)
+
+        mocker.spy(mock_user_db, "get")
+        await cached_user_db.get(user.id)
+        assert mock_user_db.get.called is False
+        await cached_user_db.get(active_user.id)
+        assert mock_user_db.get.called is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_invalidate_on_update(mocker, cached_user_db, mock_user_db, user):
+    mocker.spy(mock_user_db, "get")
+    mocker.spy(mock_user_db, "update")
+
+    cached_user = await cached_user_db.get(user.id)
+    await cached_user_db.update(cached_user)
+    await cached_user_db.get(user.id)
+
+    assert mock_user_db.update.called is True
+    assert mock_user_db.get.call_count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_invalidate_on_delete(mocker, cached_user_db, mock_user_db, user):
+    mocker.spy(mock_user_db, "get")
+    mocker.spy(mock_user_db, "delete")
+
+    cached_user = await cached_user_db.get(user.id)
+    await cached_user_db.delete(cached_user)
+    await cached_user_db.get(user.id)
+
+    assert mock_user_db.delete.called is True
+    assert mock_user_db.get.call_count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_forward_queries(cached_user_db, user):
+    email_user = await cached_user_db.get_by_email(user.email)
+    assert email_user == user
+
+    users = await cached_user_db.list(filters=UserListFilters(email_prefix="king"))
+    assert users == [user]
+
+    new_user = UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    created_user = await cached_user_db.create(new_user)
+    assert created_user == new_user
@@ -0,0 +1,76 @@
+import asyncio
+import uuid
+
+import pytest
+
+from fastapi_users.db import BatchingUserDatabase
+
+
+@pytest.fixture
+def batching_user_db(mock_user_db) -> BatchingUserDatabase:
+    return BatchingUserDatabase(mock_user_db)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_batch_get(
+    mocker, batching_user_db, mock_user_db, user, inactive_user, superuser
+):
+    mocker.spy(mock_user_db, "get_many")
+    unknown_id = uuid.uuid4()
+
+    users = await asyncio.gather(
+        batching_user_db.get(user.id),
+        batching_user_db.get(superuser.id),
+        batching_user_db.get(unknown_id),
+        batching_user_db.get(user.id),
+    )
+
+    assert users == [user, superuser, None, user]
+    # Callers asking for the same user get their own copy
+    assert users[0] is not users[3]
+    assert mock_user_db.get_many.call_count == 1
+    assert set(mock_user_db.get_many.call_args[0][0]) == {
+        user.id,
+        superuser.id,
+        unknown_id,
+    }
+    assert batching_user_db.calls == 4
+    assert batching_user_db.batches == 1
+
+    # Lookups of the next iterations are in another batch
+    assert await batching_user_db.get(inactive_user.id) == inactive_user
+    assert batching_user_db.batches == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_batch_get_by_email(mocker, batching_user_db, mock_user_db, user):
+    mocker.spy(mock_user_db, "get_many_by_email")
+
+    users = await asyncio.gather(
+        batching_user_db.get_by_email(user.email),
+        batching_user_db.get_by_email(user.email.upper()),
+        batching_user_db.get_by_email("lancelot@camelot.bt"),
+    )
+
+    assert users == [user, user, None]
+    assert mock_user_db.get_many_by_email.call_count == 1
+    assert mock_user_db.get_many_by_email.call_args[0][0] == [
+        user.email.lower(),
+        "lancelot@camelot.bt",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_batch_error(mocker, batching_user_db, mock_user_db, user, superuser):
+    mocker.patch.object(mock_user_db, "get_many", side_effect=RuntimeError())
+
+    results = await asyncio.gather(
+        batching_user_db.get(user.id),
+        batching_user_db.get(superuser.id),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -1,10 +1,15 @@
+import asyncio
 from typing import AsyncGenerator
 
+import asynctest
 import motor.motor_asyncio
 import pymongo.errors
 import pytest
 
+from fastapi_users.authentication.jwt import get_user_from_claims_model
+from fastapi_users.db import UserAlreadyExists, UserNotWritable
 from fastapi_users.db.mongodb import MongoDBUserDatabase
+from fastapi_users.models import UserListFilters
 from fastapi_users.password import get_password_hash
 from tests.conftest import UserDB, UserDBOAuth
 
@@ -85,9 +90,15 @@ async def test_queries(mongodb_user_db: MongoDBUserDatabase[UserDB]):
     assert email_user.id == user_db.id
 
     # Exception when inserting existing email
-    with pytest.raises(pymongo.errors.DuplicateKeyError):
+    with pytest.raises(UserAlreadyExists):
         await mongodb_user_db.create(user)
 
+    # Exception when inserting a case variant of an existing email
+    with pytest.raises(UserAlreadyExists):
+        await mongodb_user_db.create(
+            UserDB(email="Lancelot@Camelot.bt", hashed_password="guinevere")
+        )
+
     # Unknown user
     unknown_user = await mongodb_user_db.get_by_email("galahad@camelot.bt")
     assert unknown_user is None
@@ -194,3 +205,376 @@ async def test_queries_oauth(
     # Unknown OAuth account
     unknown_oauth_user = await mongodb_user_db_oauth.get_by_oauth_account("foo", "bar")
     assert unknown_oauth_user is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_fields(
+    mongodb_user_db_oauth: MongoDBUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1],
+    )
+    await mongodb_user_db_oauth.create(user)
+
+    user.is_superuser = True
+    user.first_name = "Lancelot"
+    user.oauth_accounts = [oauth_account2]
+    await mongodb_user_db_oauth.update_fields(user, {"first_name"})
+
+    id_user = await mongodb_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.first_name == "Lancelot"
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account1.id]
+
+    await mongodb_user_db_oauth.update_fields(user, {"oauth_accounts"})
+
+    id_user = await mongodb_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account2.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_init_indexes(mongodb_user_db_oauth: MongoDBUserDatabase[UserDBOAuth]):
+    created_indexes = await mongodb_user_db_oauth.init_indexes()
+    assert set(created_indexes) == {
+        "id_1",
+        "email_1",
+        "case_insensitive_email_index",
+        "oauth_account_index",
+    }
+
+    index_information = await mongodb_user_db_oauth.collection.index_information()
+    assert set(created_indexes).issubset(index_information)
+
+    assert await mongodb_user_db_oauth.init_indexes() == []
+
+    # A second adapter on the same collection finds the existing indexes
+    other_user_db = MongoDBUserDatabase(UserDBOAuth, mongodb_user_db_oauth.collection)
+    assert await other_user_db.init_indexes() == []
+
+
+@pytest.fixture
+def mock_collection():
+    collection = asynctest.MagicMock()
+    collection.index_information = asynctest.CoroutineMock(
+        return_value={"_id_": {}, "email_1": {}}
+    )
+    collection.create_indexes = asynctest.CoroutineMock(
+        side_effect=lambda indexes: [index.document["name"] for index in indexes]
+    )
+    collection.find_one = asynctest.CoroutineMock(return_value=None)
+    return collection
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_indexes_not_created_on_init(mock_collection):
+    MongoDBUserDatabase(UserDB, mock_collection)
+    assert mock_collection.create_index.called is False
+    assert mock_collection.create_indexes.called is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_indexes_created_once_before_first_operation(mock_collection):
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+
+    await asyncio.gather(
+        user_db.get_by_email("lancelot@camelot.bt"),
+        user_db.get_by_email("galahad@camelot.bt"),
+    )
+    await user_db.get_by_email("percival@camelot.bt")
+
+    mock_collection.index_information.assert_awaited_once()
+    mock_collection.create_indexes.assert_awaited_once()
+    created_indexes = mock_collection.create_indexes.call_args[0][0]
+    assert [index.document["name"] for index in created_indexes] == [
+        "id_1",
+        "case_insensitive_email_index",
+    ]
+    # Case variants of an existing email are rejected
+    assert created_indexes[1].document["unique"] is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_by_oauth_account_same_account(
+    mongodb_user_db_oauth: MongoDBUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await mongodb_user_db_oauth.create(user)
+
+    # OAuth name of the first account, account id of the second one
+    oauth_user = await mongodb_user_db_oauth.get_by_oauth_account(
+        oauth_account1.oauth_name, oauth_account2.account_id
+    )
+    assert oauth_user is None
+
+    oauth_user = await mongodb_user_db_oauth.get_by_oauth_account(
+        oauth_account2.oauth_name, oauth_account2.account_id
+    )
+    assert oauth_user is not None
+    assert oauth_user.id == user.id
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_without_oauth_accounts(
+    mongodb_user_db_oauth: MongoDBUserDatabase[UserDBOAuth], oauth_account1
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1],
+    )
+    await mongodb_user_db_oauth.create(user)
+
+    mongodb_user_db_oauth.load_oauth_accounts_on_get = False
+    id_user = await mongodb_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.oauth_accounts == []
+
+    # Updating the user leaves its OAuth accounts untouched
+    id_user.is_superuser = True
+    await mongodb_user_db_oauth.update(id_user)
+
+    email_user = await mongodb_user_db_oauth.get_by_email(user.email)
+    assert email_user is not None
+    assert email_user.is_superuser is True
+    assert [a.id for a in email_user.oauth_accounts] == [oauth_account1.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_oauth_accounts_projection(mock_collection):
+    user_db = MongoDBUserDatabase(
+        UserDBOAuth, mock_collection, load_oauth_accounts_on_get=False
+    )
+    user = UserDBOAuth(email="lancelot@camelot.bt", hashed_password="guinevere")
+
+    await user_db.get(user.id)
+    assert mock_collection.find_one.call_args[0] == (
+        {"id": user.id},
+        {"oauth_accounts": False},
+    )
+
+    user_db.load_oauth_accounts_on_get = True
+    await user_db.get(user.id)
+    assert mock_collection.find_one.call_args[0] == ({"id": user.id}, None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_list(mongodb_user_db: MongoDBUserDatabase[UserDB]):
+    users = [
+        UserDB(
+            email=f"{name}@camelot.bt",
+            hashed_password=get_password_hash("guinevere"),
+            is_active=name != "mordred",
+        )
+        for name in ["arthur", "lancelot", "galahad", "mordred", "percival"]
+    ]
+    for user in users:
+        await mongodb_user_db.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    first_page = await mongodb_user_db.list(limit=2)
+    assert [user.id for user in first_page] == [users[0].id, users[1].id]
+    second_page = await mongodb_user_db.list(cursor=first_page[-1].id)
+    assert [user.id for user in second_page] == [user.id for user in users[2:]]
+
+    inactive_users = await mongodb_user_db.list(
+        filters=UserListFilters(is_active=False)
+    )
+    assert [user.email for user in inactive_users] == ["mordred@camelot.bt"]
+
+    prefix_users = await mongodb_user_db.list(
+        filters=UserListFilters(email_prefix="GALA", is_superuser=False)
+    )
+    assert [user.email for user in prefix_users] == ["galahad@camelot.bt"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_list_query(mock_collection):
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+    documents = mock_collection.find.return_value.sort.return_value.limit.return_value
+    documents.to_list = asynctest.CoroutineMock(return_value=[])
+    cursor = UserDB(email="lancelot@camelot.bt", hashed_password="guinevere").id
+
+    await user_db.list(
+        cursor=cursor, limit=10, filters=UserListFilters(email_prefix="king.a")
+    )
+    assert mock_collection.find.call_args[0] == (
+        {"id": {"$gt": cursor}, "email": {"$regex": "^king\\.a", "$options": "i"}},
+        None,
+    )
+    mock_collection.find.return_value.sort.assert_called_once_with("id", 1)
+    mock_collection.find.return_value.sort.return_value.limit.assert_called_once_with(
+        10
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_iterate(mongodb_user_db: MongoDBUserDatabase[UserDB]):
+    users = [
+        UserDB(email=f"{name}@camelot.bt", hashed_password="guinevere")
+        for name in ["arthur", "lancelot", "galahad"]
+    ]
+    for user in users:
+        await mongodb_user_db.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    iterated_users = [user async for user in mongodb_user_db.iterate(batch_size=2)]
+    assert [user.id for user in iterated_users] == [user.id for user in users]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many(mongodb_user_db: MongoDBUserDatabase[UserDB]):
+    await mongodb_user_db.create(
+        UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    )
+
+    users = [
+        UserDB(email="galahad@camelot.bt", hashed_password="guinevere"),
+        UserDB(email="lancelot@camelot.bt", hashed_password="guinevere"),
+        UserDB(email="percival@camelot.bt", hashed_password="guinevere"),
+        UserDB(email="Percival@camelot.bt", hashed_password="guinevere"),
+    ]
+    assert await mongodb_user_db.create_many(users) == [1, 3]
+    assert len(await mongodb_user_db.list()) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many_write_errors(mock_collection):
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+    users = [
+        UserDB(email=f"knight{i}@camelot.bt", hashed_password="guinevere")
+        for i in range(3)
+    ]
+
+    mock_collection.insert_many = asynctest.CoroutineMock(
+        side_effect=pymongo.errors.BulkWriteError(
+            {"writeErrors": [{"index": 2, "code": 11000}, {"index": 0, "code": 11000}]}
+        )
+    )
+    assert await user_db.create_many(users) == [0, 2]
+    assert mock_collection.insert_many.call_args[1] == {"ordered": False}
+
+    mock_collection.insert_many.side_effect = pymongo.errors.BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 121}]}
+    )
+    with pytest.raises(pymongo.errors.BulkWriteError):
+        await user_db.create_many(users)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_many(mongodb_user_db: MongoDBUserDatabase[UserDB]):
+    arthur = UserDB(email="arthur@camelot.bt", hashed_password="guinevere")
+    lancelot = UserDB(email="Lancelot@camelot.bt", hashed_password="guinevere")
+    for user in [arthur, lancelot]:
+        await mongodb_user_db.create(user)
+
+    id_users = await mongodb_user_db.get_many([arthur.id, lancelot.id])
+    assert set(id_users) == {arthur.id, lancelot.id}
+
+    email_users = await mongodb_user_db.get_many_by_email(
+        ["ARTHUR@camelot.bt", "lancelot@camelot.bt", "percival@camelot.bt"]
+    )
+    assert set(email_users) == {"arthur@camelot.bt", "lancelot@camelot.bt"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_many_query(mock_collection):
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+    user = UserDB(email="King.Arthur@camelot.bt", hashed_password="guinevere")
+    mock_collection.find.return_value.to_list = asynctest.CoroutineMock(
+        return_value=[user.dict()]
+    )
+
+    assert await user_db.get_many([user.id, user.id]) == {user.id: user}
+    assert mock_collection.find.call_args[0] == ({"id": {"$in": [user.id]}}, None)
+
+    email_users = await user_db.get_many_by_email(["king.arthur@camelot.bt"])
+    assert email_users == {"king.arthur@camelot.bt": user}
+    assert mock_collection.find.call_args[0] == (
+        {"email": {"$in": ["king.arthur@camelot.bt"]}},
+    )
+    assert mock_collection.find.call_args[1] == {"collation": user_db.email_collation}
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_without_validation(mock_collection, user_oauth: UserDBOAuth):
+    user_db = MongoDBUserDatabase(UserDBOAuth, mock_collection, validate_on_load=False)
+    mock_collection.find_one.return_value = {"_id": "ObjectId", **user_oauth.dict()}
+
+    id_user = await user_db.get(user_oauth.id)
+    assert id_user == user_oauth
+    assert id_user is not None
+    assert "_id" not in id_user.__dict__
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_user_from_claims(mock_collection, user: UserDB):
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+    user_from_claims = get_user_from_claims_model(UserDB)(id=user.id, email=user.email)
+
+    with pytest.raises(UserNotWritable):
+        await user_db.update(user_from_claims)
+    with pytest.raises(UserNotWritable):
+        await user_db.update_fields(user_from_claims, {"email"})
+    assert mock_collection.replace_one.called is False
+    assert mock_collection.update_one.called is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_without_unique_email_index(caplog, mock_collection, user: UserDB):
+    mock_collection.index_information.return_value = {
+        "_id_": {},
+        "id_1": {"unique": True},
+        "email_1": {"unique": True},
+        "case_insensitive_email_index": {},
+    }
+    mock_collection.insert_one = asynctest.CoroutineMock()
+    mock_collection.find_one.return_value = user.dict()
+    user_db = MongoDBUserDatabase(UserDB, mock_collection)
+
+    assert await user_db.init_indexes() == []
+    assert user_db.email_index_unique is False
+    assert "case_insensitive_email_index" in caplog.text
+
+    with pytest.raises(UserAlreadyExists):
+        await user_db.create(
+            UserDB(email=user.email.upper(), hashed_password="guinevere")
+        )
+    assert mock_collection.insert_one.called is False
+
+    users = [
+        UserDB(email="galahad@camelot.bt", hashed_password="guinevere"),
+        UserDB(email=user.email.upper(), hashed_password="guinevere"),
+    ]
+    mock_collection.find_one.side_effect = [None, user.dict()]
+    assert await user_db.create_many(users) == [1]
+    assert mock_collection.insert_one.await_count == 1
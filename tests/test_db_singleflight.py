@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from fastapi_users.db import SingleFlightUserDatabase
+
+
+@pytest.fixture
+def slow_user_db(mock_user_db):
+    get = mock_user_db.get
+    get_by_email = mock_user_db.get_by_email
+
+    async def slow_get(id):
+        await asyncio.sleep(0.01)
+        return await get(id)
+
+    async def slow_get_by_email(email):
+        await asyncio.sleep(0.01)
+        return await get_by_email(email)
+
+    mock_user_db.get = slow_get
+    mock_user_db.get_by_email = slow_get_by_email
+    return mock_user_db
+
+
+@pytest.fixture
+def single_flight_user_db(slow_user_db) -> SingleFlightUserDatabase:
+    return SingleFlightUserDatabase(slow_user_db)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_coalesce_concurrent_get(
+    mocker, single_flight_user_db, slow_user_db, user
+):
+    mocker.spy(slow_user_db, "get")
+
+    users = await asyncio.gather(
+        *[single_flight_user_db.get(user.id) for _ in range(5)]
+    )
+
+    assert slow_user_db.get.call_count == 1
+    assert all(u == user for u in users)
+    assert single_flight_user_db.calls == 5
+    assert single_flight_user_db.coalesced == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_coalesced_users_are_copies(single_flight_user_db, user):
+    first_user, second_user = await asyncio.gather(
+        single_flight_user_db.get(user.id), single_flight_user_db.get(user.id)
+    )
+    assert first_user is not second_user
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_coalesce_concurrent_get_by_email(
+    mocker, single_flight_user_db, slow_user_db, user
+):
+    mocker.spy(slow_user_db, "get_by_email")
+
+    users = await asyncio.gather(
+        single_flight_user_db.get_by_email("king.arthur@camelot.bt"),
+        single_flight_user_db.get_by_email("King.Arthur@camelot.bt"),
+    )
+
+    assert slow_user_db.get_by_email.call_count == 1
+    assert all(u == user for u in users)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_sequential_calls_not_coalesced(
+    mocker, single_flight_user_db, slow_user_db, user, superuser
+):
+    mocker.spy(slow_user_db, "get")
+
+    await single_flight_user_db.get(user.id)
+    await single_flight_user_db.get(user.id)
+    await asyncio.gather(
+        single_flight_user_db.get(user.id), single_flight_user_db.get(superuser.id)
+    )
+
+    assert slow_user_db.get.call_count == 4
+    assert single_flight_user_db.coalesced == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_coalesced_exception(single_flight_user_db, slow_user_db, user):
+    async def failing_get(id):
+        await asyncio.sleep(0.01)
+        raise RuntimeError()
+
+    slow_user_db.get = failing_get
+
+    results = await asyncio.gather(
+        single_flight_user_db.get(user.id),
+        single_flight_user_db.get(user.id),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert single_flight_user_db._in_flight == {}
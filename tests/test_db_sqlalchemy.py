@@ -1,18 +1,23 @@
 import sqlite3
-from typing import AsyncGenerator
+import uuid
+from typing import AsyncGenerator, cast
 
 import pytest
 import sqlalchemy
 from databases import Database
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Table
+from sqlalchemy.dialects.sqlite import dialect as sqlite_dialect
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 
+from fastapi_users.authentication.jwt import get_user_from_claims_model
+from fastapi_users.db import UserAlreadyExists, UserNotWritable
 from fastapi_users.db.sqlalchemy import (
     NotSetOAuthAccountTableError,
     SQLAlchemyBaseOAuthAccountTable,
     SQLAlchemyBaseUserTable,
     SQLAlchemyUserDatabase,
 )
+from fastapi_users.models import UserListFilters
 from fastapi_users.password import get_password_hash
 from tests.conftest import UserDB, UserDBOAuth
 
@@ -102,10 +107,20 @@ async def test_queries(sqlalchemy_user_db: SQLAlchemyUserDatabase[UserDB]):
     assert email_user is not None
     assert email_user.id == user_db.id
 
+    # List
+    users = await sqlalchemy_user_db.list()
+    assert [list_user.id for list_user in users] == [user_db.id]
+
     # Exception when inserting existing email
-    with pytest.raises(sqlite3.IntegrityError):
+    with pytest.raises(UserAlreadyExists):
         await sqlalchemy_user_db.create(user)
 
+    # Exception when inserting a case variant of an existing email
+    with pytest.raises(UserAlreadyExists):
+        await sqlalchemy_user_db.create(
+            UserDB(email="Lancelot@Camelot.bt", hashed_password="guinevere")
+        )
+
     # Exception when inserting non-nullable fields
     with pytest.raises(sqlite3.IntegrityError):
         wrong_user = UserDB(hashed_password="aaa")
@@ -201,3 +216,532 @@ async def test_queries_oauth(
         "foo", "bar"
     )
     assert unknown_oauth_user is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_oauth_single_query(
+    mocker,
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await sqlalchemy_user_db_oauth.create(user)
+    user_without_oauth = UserDBOAuth(
+        email="galahad@camelot.bt", hashed_password=get_password_hash("guinevere")
+    )
+    await sqlalchemy_user_db_oauth.create(user_without_oauth)
+
+    mocker.spy(sqlalchemy_user_db_oauth.database, "fetch_all")
+
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert {a.id for a in id_user.oauth_accounts} == {
+        oauth_account1.id,
+        oauth_account2.id,
+    }
+
+    email_user = await sqlalchemy_user_db_oauth.get_by_email(str(user.email))
+    assert email_user is not None
+    assert len(email_user.oauth_accounts) == 2
+
+    oauth_user = await sqlalchemy_user_db_oauth.get_by_oauth_account(
+        oauth_account2.oauth_name, oauth_account2.account_id
+    )
+    assert oauth_user is not None
+    assert oauth_user.id == user.id
+    assert len(oauth_user.oauth_accounts) == 2
+
+    no_oauth_user = await sqlalchemy_user_db_oauth.get(user_without_oauth.id)
+    assert no_oauth_user is not None
+    assert no_oauth_user.oauth_accounts == []
+
+    assert sqlalchemy_user_db_oauth.database.fetch_all.call_count == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_oauth_skip_on_get(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await sqlalchemy_user_db_oauth.create(user)
+
+    user_db = SQLAlchemyUserDatabase(
+        UserDBOAuth,
+        sqlalchemy_user_db_oauth.database,
+        sqlalchemy_user_db_oauth.users,
+        sqlalchemy_user_db_oauth.oauth_accounts,
+        load_oauth_accounts_on_get=False,
+    )
+
+    id_user = await user_db.get(user.id)
+    assert id_user is not None
+    assert id_user.oauth_accounts == []
+
+    # Updating the user shouldn't remove its OAuth accounts
+    id_user.is_superuser = True
+    await user_db.update(id_user)
+
+    email_user = await user_db.get_by_email(str(user.email))
+    assert email_user is not None
+    assert email_user.is_superuser is True
+    assert len(email_user.oauth_accounts) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_email_lookup_uses_index(
+    sqlalchemy_user_db: SQLAlchemyUserDatabase[UserDB],
+):
+    users = sqlalchemy_user_db.users
+    query = users.select().where(
+        sqlalchemy.func.lower(users.c.email)
+        == sqlalchemy.func.lower("lancelot@camelot.bt")
+    )
+    compiled_query = query.compile(
+        dialect=sqlite_dialect(), compile_kwargs={"literal_binds": True}
+    )
+
+    plan = await sqlalchemy_user_db.database.fetch_all(
+        f"EXPLAIN QUERY PLAN {compiled_query}"
+    )
+    details = " ".join(row[-1] for row in plan)
+    assert f"USING INDEX ix_{users.name}_email_lower" in details
+
+
+@pytest.mark.db
+def test_email_lower_index_skipped_on_mysql():
+    Base: DeclarativeMeta = declarative_base()
+
+    class User(SQLAlchemyBaseUserTable, Base):
+        pass
+
+    statements = []
+
+    def executor(sql, *args, **kwargs):
+        statements.append(str(sql.compile(dialect=engine.dialect)))
+
+    engine = sqlalchemy.create_engine("mysql://", strategy="mock", executor=executor)
+    Base.metadata.create_all(engine, checkfirst=False)
+
+    assert not any("email_lower" in statement for statement in statements)
+    assert any("ix_user_email" in statement for statement in statements)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_oauth_update_diff(
+    mocker,
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+    oauth_account3,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await sqlalchemy_user_db_oauth.create(user)
+
+    # Nothing changed on the OAuth accounts
+    mocker.spy(sqlalchemy_user_db_oauth.database, "execute")
+    mocker.spy(sqlalchemy_user_db_oauth.database, "execute_many")
+    await sqlalchemy_user_db_oauth.update(user)
+    assert sqlalchemy_user_db_oauth.database.execute.call_count == 1
+    assert sqlalchemy_user_db_oauth.database.execute_many.called is False
+
+    # Update one, remove one, add one
+    user.oauth_accounts[0].access_token = "NEW_TOKEN"
+    user.oauth_accounts = [user.oauth_accounts[0], oauth_account3]
+    await sqlalchemy_user_db_oauth.update(user)
+
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user is not None
+    oauth_accounts = {a.id: a for a in id_user.oauth_accounts}
+    assert set(oauth_accounts) == {oauth_account1.id, oauth_account3.id}
+    assert oauth_accounts[oauth_account1.id].access_token == "NEW_TOKEN"
+
+    # Remove all
+    id_user.oauth_accounts = []
+    await sqlalchemy_user_db_oauth.update(id_user)
+
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.oauth_accounts == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_fields(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1],
+    )
+    await sqlalchemy_user_db_oauth.create(user)
+
+    user.is_superuser = True
+    user.first_name = "Lancelot"
+    user.oauth_accounts = [oauth_account2]
+    await sqlalchemy_user_db_oauth.update_fields(user, {"first_name"})
+
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.first_name == "Lancelot"
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account1.id]
+
+    await sqlalchemy_user_db_oauth.update_fields(user, {"oauth_accounts"})
+
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account2.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_list(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    users = [
+        UserDBOAuth(
+            email=f"{name}@camelot.bt",
+            hashed_password=get_password_hash("guinevere"),
+            is_active=name != "mordred",
+            oauth_accounts=[oauth_account1, oauth_account2] if name == "arthur" else [],
+        )
+        for name in ["arthur", "lancelot", "galahad", "mordred", "percival"]
+    ]
+    for user in users:
+        await sqlalchemy_user_db_oauth.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    # The page size is counted in users, not in joined rows
+    first_page = await sqlalchemy_user_db_oauth.list(limit=2)
+    assert [user.id for user in first_page] == [users[0].id, users[1].id]
+    second_page = await sqlalchemy_user_db_oauth.list(cursor=first_page[-1].id)
+    assert [user.id for user in second_page] == [user.id for user in users[2:]]
+
+    all_users = {user.email: user for user in first_page + second_page}
+    assert len(all_users["arthur@camelot.bt"].oauth_accounts) == 2
+    assert all_users["lancelot@camelot.bt"].oauth_accounts == []
+
+    inactive_users = await sqlalchemy_user_db_oauth.list(
+        filters=UserListFilters(is_active=False)
+    )
+    assert [user.email for user in inactive_users] == ["mordred@camelot.bt"]
+
+    prefix_users = await sqlalchemy_user_db_oauth.list(
+        filters=UserListFilters(email_prefix="GALA", is_superuser=False)
+    )
+    assert [user.email for user in prefix_users] == ["galahad@camelot.bt"]
+
+    # LIKE wildcards are matched literally
+    wildcard_users = await sqlalchemy_user_db_oauth.list(
+        filters=UserListFilters(email_prefix="%")
+    )
+    assert wildcard_users == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_iterate(
+    mocker,
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+    oauth_account3,
+):
+    users = [
+        UserDBOAuth(
+            email=f"{name}@camelot.bt",
+            hashed_password=get_password_hash("guinevere"),
+            oauth_accounts=oauth_accounts,
+        )
+        for name, oauth_accounts in [
+            ("arthur", [oauth_account1, oauth_account2]),
+            ("lancelot", []),
+            ("galahad", [oauth_account3]),
+        ]
+    ]
+    for user in users:
+        await sqlalchemy_user_db_oauth.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    mocker.spy(sqlalchemy_user_db_oauth.database, "fetch_all")
+    iterated_users = [user async for user in sqlalchemy_user_db_oauth.iterate()]
+
+    assert [user.id for user in iterated_users] == [user.id for user in users]
+    for iterated_user, user in zip(iterated_users, users):
+        assert {a.id for a in iterated_user.oauth_accounts} == {
+            a.id for a in user.oauth_accounts
+        }
+    assert sqlalchemy_user_db_oauth.database.fetch_all.called is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many(
+    mocker,
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    users = [
+        UserDBOAuth(
+            email=f"knight{i}@camelot.bt",
+            hashed_password="guinevere",
+            oauth_accounts=[oauth_account1, oauth_account2] if i == 0 else [],
+        )
+        for i in range(300)
+    ]
+    mocker.spy(sqlalchemy_user_db_oauth.database, "execute")
+
+    existing_indexes = await sqlalchemy_user_db_oauth.create_many(users)
+    assert existing_indexes == []
+    # 6 columns per user: 166 users per statement, then 1 for the OAuth accounts
+    assert sqlalchemy_user_db_oauth.database.execute.call_count == 3
+
+    created_users = [user async for user in sqlalchemy_user_db_oauth.iterate()]
+    assert len(created_users) == 300
+    knight0 = await sqlalchemy_user_db_oauth.get_by_email("knight0@camelot.bt")
+    assert knight0 is not None
+    assert len(knight0.oauth_accounts) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many_existing(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+):
+    existing_user = UserDBOAuth(email="lancelot@camelot.bt", hashed_password="a")
+    await sqlalchemy_user_db_oauth.create(existing_user)
+
+    users = [
+        UserDBOAuth(email="galahad@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="lancelot@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="percival@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="Galahad@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="Lancelot@camelot.bt", hashed_password="a"),
+    ]
+    existing_indexes = await sqlalchemy_user_db_oauth.create_many(users)
+    assert existing_indexes == [1, 3, 4]
+
+    created_users = await sqlalchemy_user_db_oauth.list()
+    assert sorted(user.email for user in created_users) == [
+        "galahad@camelot.bt",
+        "lancelot@camelot.bt",
+        "percival@camelot.bt",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_many(
+    mocker,
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+    oauth_account3,
+):
+    users = [
+        UserDBOAuth(
+            email=f"{name}@camelot.bt",
+            hashed_password="guinevere",
+            oauth_accounts=oauth_accounts,
+        )
+        for name, oauth_accounts in [
+            ("arthur", [oauth_account1, oauth_account2]),
+            ("lancelot", []),
+            ("galahad", [oauth_account3]),
+        ]
+    ]
+    for user in users:
+        await sqlalchemy_user_db_oauth.create(user)
+    arthur, lancelot, galahad = users
+    mocker.spy(sqlalchemy_user_db_oauth.database, "fetch_all")
+
+    id_users = await sqlalchemy_user_db_oauth.get_many(
+        [arthur.id, lancelot.id, galahad.id, uuid.uuid4()]
+    )
+    assert set(id_users) == {arthur.id, lancelot.id, galahad.id}
+    assert len(id_users[arthur.id].oauth_accounts) == 2
+    assert id_users[lancelot.id].oauth_accounts == []
+    assert [a.id for a in id_users[galahad.id].oauth_accounts] == [oauth_account3.id]
+    # Users, then their OAuth accounts
+    assert sqlalchemy_user_db_oauth.database.fetch_all.call_count == 2
+
+    email_users = await sqlalchemy_user_db_oauth.get_many_by_email(
+        ["Arthur@camelot.bt", "lancelot@camelot.bt", "percival@camelot.bt"]
+    )
+    assert set(email_users) == {"arthur@camelot.bt", "lancelot@camelot.bt"}
+    assert email_users["arthur@camelot.bt"].id == arthur.id
+
+    assert await sqlalchemy_user_db_oauth.get_many([]) == {}
+    assert await sqlalchemy_user_db_oauth.get_many_by_email([]) == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_without_validation(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await sqlalchemy_user_db_oauth.create(user)
+    validated_user = await sqlalchemy_user_db_oauth.get(user.id)
+
+    sqlalchemy_user_db_oauth.validate_on_load = False
+    id_user = await sqlalchemy_user_db_oauth.get(user.id)
+    assert id_user == validated_user
+    assert id_user is not None
+    assert id_user.__fields_set__ == validated_user.__fields_set__
+
+    id_users = await sqlalchemy_user_db_oauth.get_many([user.id])
+    assert id_users[user.id] == validated_user
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_user_from_claims(
+    sqlalchemy_user_db: SQLAlchemyUserDatabase[UserDB],
+):
+    user = UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    await sqlalchemy_user_db.create(user)
+
+    user_from_claims = get_user_from_claims_model(UserDB)(
+        id=user.id, email=user.email, first_name="Lancelot"
+    )
+    with pytest.raises(UserNotWritable):
+        await sqlalchemy_user_db.update(user_from_claims)
+    with pytest.raises(UserNotWritable):
+        await sqlalchemy_user_db.update_fields(user_from_claims, {"first_name"})
+
+    id_user = await sqlalchemy_user_db.get(user.id)
+    assert id_user is not None
+    assert id_user.hashed_password == "guinevere"
+    assert id_user.first_name is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_lookups_matching_several_users(
+    sqlalchemy_user_db_oauth: SQLAlchemyUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+    oauth_account3,
+):
+    # Table created before the unique index on the lowercased email
+    await sqlalchemy_user_db_oauth.database.execute("DROP INDEX ix_user_email_lower")
+    lancelot = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password="guinevere",
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    other_lancelot = UserDBOAuth(
+        email="Lancelot@camelot.bt",
+        hashed_password="guinevere",
+        oauth_accounts=[
+            oauth_account3,
+            oauth_account1.copy(update={"id": uuid.uuid4()}),
+        ],
+    )
+    # Inserted before the upgrade, without the lookup of create
+    database = sqlalchemy_user_db_oauth.database
+    oauth_accounts = cast(Table, sqlalchemy_user_db_oauth.oauth_accounts)
+    for user in [lancelot, other_lancelot]:
+        user_dict = user.dict()
+        user_oauth_accounts = user_dict.pop("oauth_accounts")
+        await database.execute(sqlalchemy_user_db_oauth.users.insert(), user_dict)
+        await database.execute_many(
+            oauth_accounts.insert(),
+            [{"user_id": user.id, **a} for a in user_oauth_accounts],
+        )
+    oauth_account_ids = {
+        user.id: {a.id for a in user.oauth_accounts}
+        for user in [lancelot, other_lancelot]
+    }
+
+    email_user = await sqlalchemy_user_db_oauth.get_by_email("lancelot@camelot.bt")
+    assert email_user is not None
+    assert {a.id for a in email_user.oauth_accounts} == oauth_account_ids[email_user.id]
+
+    oauth_user = await sqlalchemy_user_db_oauth.get_by_oauth_account(
+        oauth_account1.oauth_name, oauth_account1.account_id
+    )
+    assert oauth_user is not None
+    assert {a.id for a in oauth_user.oauth_accounts} == oauth_account_ids[oauth_user.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_check_email_index(
+    mocker, sqlalchemy_user_db: SQLAlchemyUserDatabase[UserDB]
+):
+    mocker.spy(sqlalchemy_user_db, "get_by_email")
+    assert await sqlalchemy_user_db.check_email_index() is True
+    await sqlalchemy_user_db.create(
+        UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    )
+    assert sqlalchemy_user_db.get_by_email.called is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+@pytest.mark.parametrize(
+    "index_statement",
+    [
+        "DROP INDEX ix_user_email_lower",
+        # Created before the index was unique
+        "CREATE INDEX ix_user_email_lower ON user (lower(email))",
+    ],
+)
+async def test_create_without_unique_email_index(
+    caplog, sqlalchemy_user_db: SQLAlchemyUserDatabase[UserDB], index_statement
+):
+    await sqlalchemy_user_db.database.execute("DROP INDEX ix_user_email_lower")
+    if index_statement.startswith("CREATE"):
+        await sqlalchemy_user_db.database.execute(index_statement)
+
+    assert await sqlalchemy_user_db.check_email_index() is False
+    assert "ix_user_email_lower" in caplog.text
+
+    await sqlalchemy_user_db.create(
+        UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    )
+    with pytest.raises(UserAlreadyExists):
+        await sqlalchemy_user_db.create(
+            UserDB(email="Lancelot@camelot.bt", hashed_password="guinevere")
+        )
+
+    users = [
+        UserDB(email="galahad@camelot.bt", hashed_password="guinevere"),
+        UserDB(email="LANCELOT@camelot.bt", hashed_password="guinevere"),
+    ]
+    assert await sqlalchemy_user_db.create_many(users) == [1]
+    assert len(await sqlalchemy_user_db.list()) == 2
@@ -2,13 +2,17 @@ from typing import AsyncGenerator
 
 import pytest
 from tortoise import Tortoise, fields
-from tortoise.exceptions import IntegrityError
+from tortoise.exceptions import DoesNotExist
+from tortoise.queryset import UpdateQuery
 
+from fastapi_users.authentication.jwt import get_user_from_claims_model
+from fastapi_users.db import UserAlreadyExists, UserNotWritable
 from fastapi_users.db.tortoise import (
     TortoiseBaseOAuthAccountModel,
     TortoiseBaseUserModel,
     TortoiseUserDatabase,
 )
+from fastapi_users.models import UserListFilters
 from fastapi_users.password import get_password_hash
 from tests.conftest import UserDB, UserDBOAuth
 
@@ -87,9 +91,15 @@ async def test_queries(tortoise_user_db: TortoiseUserDatabase[UserDB]):
     assert email_user.id == user_db.id
 
     # Exception when inserting existing email
-    with pytest.raises(IntegrityError):
+    with pytest.raises(UserAlreadyExists):
         await tortoise_user_db.create(user)
 
+    # Exception when inserting a case variant of an existing email
+    with pytest.raises(UserAlreadyExists):
+        await tortoise_user_db.create(
+            UserDB(email="Lancelot@Camelot.bt", hashed_password="guinevere")
+        )
+
     # Exception when inserting non-nullable fields
     with pytest.raises(ValueError):
         wrong_user = UserDB(hashed_password="aaa")
@@ -167,3 +177,346 @@ async def test_queries_oauth(
     # Unknown OAuth account
     unknown_oauth_user = await tortoise_user_db_oauth.get_by_oauth_account("foo", "bar")
     assert unknown_oauth_user is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_oauth_update_diff(
+    mocker,
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+    oauth_account3,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await tortoise_user_db_oauth.create(user)
+
+    # Nothing changed on the OAuth accounts
+    mocker.spy(OAuthAccount, "bulk_create")
+    await tortoise_user_db_oauth.update(user)
+    assert OAuthAccount.bulk_create.called is False
+
+    # Update one, remove one, add one
+    user.oauth_accounts[0].access_token = "NEW_TOKEN"
+    user.oauth_accounts = [user.oauth_accounts[0], oauth_account3]
+    await tortoise_user_db_oauth.update(user)
+
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user is not None
+    oauth_accounts = {a.id: a for a in id_user.oauth_accounts}
+    assert set(oauth_accounts) == {oauth_account1.id, oauth_account3.id}
+    assert oauth_accounts[oauth_account1.id].access_token == "NEW_TOKEN"
+
+    # Remove all
+    id_user.oauth_accounts = []
+    await tortoise_user_db_oauth.update(id_user)
+
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.oauth_accounts == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_fields(
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1],
+    )
+    await tortoise_user_db_oauth.create(user)
+
+    user.is_superuser = True
+    user.first_name = "Lancelot"
+    user.oauth_accounts = [oauth_account2]
+    await tortoise_user_db_oauth.update_fields(user, {"first_name"})
+
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.first_name == "Lancelot"
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account1.id]
+
+    await tortoise_user_db_oauth.update_fields(user, {"oauth_accounts"})
+
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert id_user.is_superuser is False
+    assert [a.id for a in id_user.oauth_accounts] == [oauth_account2.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_single_statement(
+    mocker, tortoise_user_db: TortoiseUserDatabase[UserDB]
+):
+    user = UserDB(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+    )
+    await tortoise_user_db.create(user)
+
+    mocker.spy(User, "get")
+    user.is_superuser = True
+    await tortoise_user_db.update(user)
+    assert User.get.called is False
+
+    id_user = await tortoise_user_db.get(user.id)
+    assert id_user is not None
+    assert id_user.is_superuser is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_not_existing(tortoise_user_db: TortoiseUserDatabase[UserDB]):
+    user = UserDB(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+    )
+
+    with pytest.raises(DoesNotExist):
+        await tortoise_user_db.update(user)
+
+    with pytest.raises(DoesNotExist):
+        await tortoise_user_db.update_fields(user, {"is_active"})
+
+    assert await User.filter(id=user.id).exists() is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_unchanged_values(
+    mocker, tortoise_user_db: TortoiseUserDatabase[UserDB]
+):
+    user = UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    await tortoise_user_db.create(user)
+
+    # Like MySQL, which counts the changed rows only
+    async def execute_without_changes(self) -> int:
+        return 0
+
+    mocker.patch.object(UpdateQuery, "_execute", execute_without_changes)
+
+    assert await tortoise_user_db.update(user) == user
+    assert await tortoise_user_db.update_fields(user, {"is_active"}) == user
+
+    unknown_user = UserDB(email="galahad@camelot.bt", hashed_password="guinevere")
+    with pytest.raises(DoesNotExist):
+        await tortoise_user_db.update(unknown_user)
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_reuses_prefetched_oauth_accounts(
+    mocker,
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await tortoise_user_db_oauth.create(user)
+
+    connection = Tortoise.get_connection("default")
+    mocker.spy(connection, "execute_query")
+    mocker.spy(connection, "execute_query_dict")
+
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user is not None
+    assert {a.id for a in id_user.oauth_accounts} == {
+        oauth_account1.id,
+        oauth_account2.id,
+    }
+
+    # The user and its prefetched OAuth accounts, nothing more
+    assert connection.execute_query.call_count == 2
+    assert connection.execute_query_dict.called is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_list(
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    users = [
+        UserDBOAuth(
+            email=f"{name}@camelot.bt",
+            hashed_password=get_password_hash("guinevere"),
+            is_active=name != "mordred",
+            oauth_accounts=[oauth_account1, oauth_account2] if name == "arthur" else [],
+        )
+        for name in ["arthur", "lancelot", "galahad", "mordred", "percival"]
+    ]
+    for user in users:
+        await tortoise_user_db_oauth.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    first_page = await tortoise_user_db_oauth.list(limit=2)
+    assert [user.id for user in first_page] == [users[0].id, users[1].id]
+    second_page = await tortoise_user_db_oauth.list(cursor=first_page[-1].id)
+    assert [user.id for user in second_page] == [user.id for user in users[2:]]
+
+    all_users = {user.email: user for user in first_page + second_page}
+    assert len(all_users["arthur@camelot.bt"].oauth_accounts) == 2
+    assert all_users["lancelot@camelot.bt"].oauth_accounts == []
+
+    inactive_users = await tortoise_user_db_oauth.list(
+        filters=UserListFilters(is_active=False)
+    )
+    assert [user.email for user in inactive_users] == ["mordred@camelot.bt"]
+
+    prefix_users = await tortoise_user_db_oauth.list(
+        filters=UserListFilters(email_prefix="GALA", is_superuser=False)
+    )
+    assert [user.email for user in prefix_users] == ["galahad@camelot.bt"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_iterate(
+    mocker, tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth], oauth_account1
+):
+    users = [
+        UserDBOAuth(
+            email=f"{name}@camelot.bt",
+            hashed_password=get_password_hash("guinevere"),
+            oauth_accounts=[oauth_account1] if name == "arthur" else [],
+        )
+        for name in ["arthur", "lancelot", "galahad", "percival", "merlin"]
+    ]
+    for user in users:
+        await tortoise_user_db_oauth.create(user)
+    users.sort(key=lambda user: str(user.id))
+
+    mocker.spy(tortoise_user_db_oauth, "list")
+    iterated_users = [user async for user in tortoise_user_db_oauth.iterate(2)]
+
+    assert [user.id for user in iterated_users] == [user.id for user in users]
+    arthur = next(user for user in iterated_users if user.email == "arthur@camelot.bt")
+    assert [a.id for a in arthur.oauth_accounts] == [oauth_account1.id]
+    # Retrieved by chunks of 2 users
+    assert tortoise_user_db_oauth.list.call_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_create_many(
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth], oauth_account1
+):
+    existing_user = UserDBOAuth(email="lancelot@camelot.bt", hashed_password="a")
+    await tortoise_user_db_oauth.create(existing_user)
+
+    users = [
+        UserDBOAuth(
+            email="galahad@camelot.bt",
+            hashed_password="a",
+            oauth_accounts=[oauth_account1],
+        ),
+        UserDBOAuth(email="percival@camelot.bt", hashed_password="a"),
+    ]
+    assert await tortoise_user_db_oauth.create_many(users) == []
+
+    galahad = await tortoise_user_db_oauth.get_by_email("galahad@camelot.bt")
+    assert galahad is not None
+    assert [a.id for a in galahad.oauth_accounts] == [oauth_account1.id]
+
+    users = [
+        UserDBOAuth(email="bors@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="Lancelot@camelot.bt", hashed_password="a"),
+    ]
+    assert await tortoise_user_db_oauth.create_many(users) == [1]
+
+    users = [
+        UserDBOAuth(email="gawain@camelot.bt", hashed_password="a"),
+        UserDBOAuth(email="Gawain@camelot.bt", hashed_password="a"),
+    ]
+    assert await tortoise_user_db_oauth.create_many(users) == [1]
+    assert await tortoise_user_db_oauth.get_by_email("bors@camelot.bt") is not None
+    assert len(await tortoise_user_db_oauth.list()) == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_get_many(
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    arthur = UserDBOAuth(
+        email="arthur@camelot.bt",
+        hashed_password="guinevere",
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    lancelot = UserDBOAuth(email="Lancelot@camelot.bt", hashed_password="guinevere")
+    for user in [arthur, lancelot]:
+        await tortoise_user_db_oauth.create(user)
+
+    id_users = await tortoise_user_db_oauth.get_many([arthur.id, lancelot.id])
+    assert set(id_users) == {arthur.id, lancelot.id}
+    assert len(id_users[arthur.id].oauth_accounts) == 2
+    assert id_users[lancelot.id].oauth_accounts == []
+
+    email_users = await tortoise_user_db_oauth.get_many_by_email(
+        ["ARTHUR@camelot.bt", "lancelot@camelot.bt", "percival@camelot.bt"]
+    )
+    assert set(email_users) == {"arthur@camelot.bt", "lancelot@camelot.bt"}
+    assert email_users["lancelot@camelot.bt"].id == lancelot.id
+
+    assert await tortoise_user_db_oauth.get_many([]) == {}
+    assert await tortoise_user_db_oauth.get_many_by_email([]) == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_queries_without_validation(
+    tortoise_user_db_oauth: TortoiseUserDatabase[UserDBOAuth],
+    oauth_account1,
+    oauth_account2,
+):
+    user = UserDBOAuth(
+        email="lancelot@camelot.bt",
+        hashed_password=get_password_hash("guinevere"),
+        oauth_accounts=[oauth_account1, oauth_account2],
+    )
+    await tortoise_user_db_oauth.create(user)
+    validated_user = await tortoise_user_db_oauth.get(user.id)
+
+    tortoise_user_db_oauth.validate_on_load = False
+    id_user = await tortoise_user_db_oauth.get(user.id)
+    assert id_user == validated_user
+
+    email_user = await tortoise_user_db_oauth.get_by_email(user.email)
+    assert email_user == validated_user
+
+
+@pytest.mark.asyncio
+@pytest.mark.db
+async def test_update_user_from_claims(tortoise_user_db: TortoiseUserDatabase[UserDB]):
+    user = UserDB(email="lancelot@camelot.bt", hashed_password="guinevere")
+    await tortoise_user_db.create(user)
+
+    user_from_claims = get_user_from_claims_model(UserDB)(
+        id=user.id, email=user.email, first_name="Lancelot"
+    )
+    with pytest.raises(UserNotWritable):
+        await tortoise_user_db.update(user_from_claims)
+    with pytest.raises(UserNotWritable):
+        await tortoise_user_db.update_fields(user_from_claims, {"first_name"})
+
+    id_user = await tortoise_user_db.get(user.id)
+    assert id_user is not None
+    assert id_user.hashed_password == "guinevere"
+    assert id_user.first_name is None
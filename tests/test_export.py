@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+import pytest
+
+from fastapi_users.export import ExportFormat, get_export_fields, stream_users_export
+from tests.conftest import User, UserDBOAuth, UserOAuth
+
+
+async def iterate(users: List[UserDBOAuth]) -> AsyncIterator[UserDBOAuth]:
+    for user in users:
+        yield user
+
+
+async def export(users: List[UserDBOAuth], export_format: ExportFormat, **kwargs):
+    fields = get_export_fields(UserOAuth, export_format)
+    return [
+        chunk
+        async for chunk in stream_users_export(
+            iterate(users), export_format, fields, **kwargs
+        )
+    ]
+
+
+def test_get_export_fields():
+    assert get_export_fields(User, ExportFormat.NDJSON) == [
+        "id",
+        "email",
+        "is_active",
+        "is_superuser",
+        "first_name",
+    ]
+    assert "oauth_accounts" in get_export_fields(UserOAuth, ExportFormat.NDJSON)
+    assert "oauth_accounts" not in get_export_fields(UserOAuth, ExportFormat.CSV)
+    assert "hashed_password" not in get_export_fields(UserDBOAuth, ExportFormat.CSV)
+
+
+@pytest.mark.asyncio
+async def test_ndjson(user_oauth: UserDBOAuth, superuser_oauth: UserDBOAuth):
+    chunks = await export([user_oauth, superuser_oauth], ExportFormat.NDJSON)
+    lines = "".join(chunks).splitlines()
+    assert len(lines) == 2
+
+    exported_user = json.loads(lines[0])
+    assert exported_user["id"] == str(user_oauth.id)
+    assert "hashed_password" not in exported_user
+    assert len(exported_user["oauth_accounts"]) == 2
+    for oauth_account in exported_user["oauth_accounts"]:
+        assert "access_token" not in oauth_account
+        assert "refresh_token" not in oauth_account
+        assert "account_id" in oauth_account
+
+
+@pytest.mark.asyncio
+async def test_csv(user_oauth: UserDBOAuth, superuser_oauth: UserDBOAuth):
+    chunks = await export([user_oauth, superuser_oauth], ExportFormat.CSV)
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows == [
+        ["id", "email", "is_active", "is_superuser", "first_name"],
+        [str(user_oauth.id), user_oauth.email, "True", "False", ""],
+        [str(superuser_oauth.id), superuser_oauth.email, "True", "True", ""],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_no_users():
+    chunks = await export([], ExportFormat.CSV)
+    assert chunks == ["id,email,is_active,is_superuser,first_name\r\n"]
+
+
+@pytest.mark.asyncio
+async def test_chunks(user_oauth: UserDBOAuth):
+    chunks = await export([user_oauth] * 5, ExportFormat.NDJSON, chunk_size=2)
+    assert [chunk.count("\n") for chunk in chunks] == [2, 2, 1]
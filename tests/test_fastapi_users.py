@@ -4,7 +4,8 @@ import httpx
 import pytest
 from fastapi import Depends, FastAPI, status
 
-from fastapi_users import FastAPIUsers
+from fastapi_users import FastAPIUsers, password
+from fastapi_users.router import BackgroundHookDispatcher
 from tests.conftest import User, UserCreate, UserDB, UserUpdate
 
 
@@ -278,3 +279,36 @@ class TestOptionalGetCurrentSuperuser:
         )
         assert response.status_code == status.HTTP_200_OK
         assert response.json() is not None
+
+
+@pytest.mark.fastapi_users
+def test_password_context(mocker, mock_user_db, mock_authentication):
+    mocker.patch.object(password, "pwd_context", password.pwd_context)
+    password_context = password.get_password_context("scrypt", rounds=4)
+
+    FastAPIUsers(
+        mock_user_db,
+        [mock_authentication],
+        User,
+        UserCreate,
+        UserUpdate,
+        UserDB,
+        password_context=password_context,
+    )
+    assert password.pwd_context is password_context
+
+
+@pytest.mark.fastapi_users
+def test_hook_dispatcher(mock_user_db, mock_authentication):
+    hook_dispatcher = BackgroundHookDispatcher()
+
+    fastapi_users = FastAPIUsers(
+        mock_user_db,
+        [mock_authentication],
+        User,
+        UserCreate,
+        UserUpdate,
+        UserDB,
+        hook_dispatcher=hook_dispatcher,
+    )
+    assert fastapi_users.hook_dispatcher is hook_dispatcher
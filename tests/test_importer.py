@@ -0,0 +1,120 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List
+
+import pytest
+
+from fastapi_users import password
+from fastapi_users.importer import ImportErrorCode, ImportFormat, import_users
+from tests.conftest import UserDB
+
+
+@pytest.fixture
+def created_users(mocker, mock_user_db) -> List[UserDB]:
+    created_users: List[UserDB] = []
+
+    async def create_many(users):
+        existing_indexes = []
+        for index, user in enumerate(users):
+            if await mock_user_db.get_by_email(user.email) is not None:
+                existing_indexes.append(index)
+            else:
+                created_users.append(user)
+        return existing_indexes
+
+    mocker.patch.object(mock_user_db, "create_many", side_effect=create_many)
+    return created_users
+
+
+async def async_lines(lines: List[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson(mock_user_db, created_users, user: UserDB):
+    hashed_password = password.get_password_hash("angharad")
+    lines = [
+        json.dumps({"email": "lancelot@camelot.bt", "password": "guinevere"}),
+        json.dumps(
+            {
+                "email": "galahad@camelot.bt",
+                "hashed_password": hashed_password,
+                "is_superuser": True,
+            }
+        ),
+        "",
+        json.dumps({"email": user.email, "password": "guinevere"}),
+        json.dumps({"email": "bors@camelot.bt"}),
+        json.dumps({"email": "bors@camelot.bt", "hashed_password": "plaintext"}),
+        json.dumps({"email": "not-an-email", "password": "guinevere"}),
+        "{",
+        "[]",
+    ]
+
+    report = await import_users(mock_user_db, lines, ImportFormat.NDJSON)
+
+    assert report.created == 2
+    lancelot, galahad = created_users
+    verified, _ = password.verify_and_update_password(
+        "guinevere", lancelot.hashed_password
+    )
+    assert verified is True
+    assert galahad.hashed_password == hashed_password
+    assert galahad.is_superuser is True
+
+    errors = sorted(report.errors)
+    assert [(error.line, error.code) for error in errors] == [
+        (4, ImportErrorCode.USER_ALREADY_EXISTS),
+        (5, ImportErrorCode.MISSING_PASSWORD),
+        (6, ImportErrorCode.INVALID_PASSWORD_HASH),
+        (7, ImportErrorCode.INVALID_ROW),
+        (8, ImportErrorCode.INVALID_ROW),
+        (9, ImportErrorCode.INVALID_ROW),
+    ]
+    assert errors[0].email == user.email
+    assert errors[3].detail is not None
+    assert errors[3].detail.startswith("email: ")
+
+
+@pytest.mark.asyncio
+async def test_import_csv(mock_user_db, created_users):
+    lines = [
+        "email,password,is_active,first_name\n",
+        "lancelot@camelot.bt,guinevere,false,Lancelot\n",
+        "galahad@camelot.bt,guinevere,,\n",
+    ]
+
+    report = await import_users(mock_user_db, async_lines(lines), ImportFormat.CSV)
+
+    assert report.created == 2
+    assert report.errors == []
+    lancelot, galahad = created_users
+    assert lancelot.is_active is False
+    assert lancelot.first_name == "Lancelot"
+    assert galahad.is_active is True
+    assert galahad.first_name is None
+
+
+@pytest.mark.asyncio
+async def test_import_batches(mocker, mock_user_db, created_users):
+    lines = [
+        json.dumps({"email": f"knight{i}@camelot.bt", "password": "guinevere"})
+        for i in range(5)
+    ]
+    executor = ThreadPoolExecutor(max_workers=2)
+    mocker.spy(executor, "submit")
+
+    report = await import_users(
+        mock_user_db,
+        lines,
+        ImportFormat.NDJSON,
+        batch_size=2,
+        hashing_executor=executor,
+        hashing_chunk_size=1,
+    )
+
+    assert report.created == 5
+    assert mock_user_db.create_many.call_count == 3
+    assert executor.submit.call_count == 5
+    executor.shutdown()
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+OPTIONAL_DEPENDENCIES = ["databases", "httpx_oauth", "motor", "sqlalchemy", "tortoise"]
+
+
+def get_loaded_dependencies(statement: str):
+    script = (
+        f"import json, sys; {statement}; "
+        f"print(json.dumps([name for name in {OPTIONAL_DEPENDENCIES!r} "
+        "if name in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize(
+    "statement,expected_dependencies",
+    [
+        ("import fastapi_users", []),
+        ("from fastapi_users import FastAPIUsers", []),
+        ("from fastapi_users.db import BaseUserDatabase", []),
+        ("from fastapi_users.router import get_users_router", []),
+        (
+            "from fastapi_users.db import SQLAlchemyUserDatabase",
+            ["databases", "sqlalchemy"],
+        ),
+        ("from fastapi_users.db import MongoDBUserDatabase", ["motor"]),
+        ("from fastapi_users.db import TortoiseUserDatabase", ["tortoise"]),
+        ("from fastapi_users.router import get_oauth_router", ["httpx_oauth"]),
+    ],
+)
+def test_optional_dependencies_loaded_on_use(statement, expected_dependencies):
+    assert get_loaded_dependencies(statement) == expected_dependencies
+
+
+def test_lazy_exports():
+    import fastapi_users
+    from fastapi_users import db, router
+    from fastapi_users.db.sqlalchemy import SQLAlchemyUserDatabase
+    from fastapi_users.fastapi_users import FastAPIUsers
+    from fastapi_users.router.oauth import get_oauth_router
+
+    assert fastapi_users.FastAPIUsers is FastAPIUsers
+    assert db.SQLAlchemyUserDatabase is SQLAlchemyUserDatabase
+    assert router.get_oauth_router is get_oauth_router
+    assert "SQLAlchemyUserDatabase" in dir(db)
+
+    with pytest.raises(AttributeError):
+        db.UnknownUserDatabase
@@ -0,0 +1,317 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from passlib.context import CryptContext
+
+from fastapi_users import password
+
+
+@pytest.fixture
+def hashing_executor():
+    executor = password.configure_hashing_executor(max_workers=1)
+    yield executor
+    password.hashing_executor.shutdown()
+    password.hashing_executor = None
+
+
+@pytest.mark.asyncio
+async def test_get_password_hash_async():
+    hashed_password = await password.get_password_hash_async("guinevere")
+    verified, updated_password_hash = password.verify_and_update_password(
+        "guinevere", hashed_password
+    )
+    assert verified is True
+    assert updated_password_hash is None
+
+
+@pytest.mark.asyncio
+async def test_verify_and_update_password_async():
+    hashed_password = password.get_password_hash("guinevere")
+
+    verified, _ = await password.verify_and_update_password_async(
+        "guinevere", hashed_password
+    )
+    assert verified is True
+
+    verified, _ = await password.verify_and_update_password_async(
+        "lancelot", hashed_password
+    )
+    assert verified is False
+
+
+@pytest.mark.asyncio
+async def test_configure_hashing_executor(mocker, hashing_executor):
+    assert password.hashing_executor is hashing_executor
+    assert isinstance(hashing_executor, ThreadPoolExecutor)
+
+    mocker.spy(hashing_executor, "submit")
+    await password.get_password_hash_async("guinevere")
+    assert hashing_executor.submit.called is True
+
+
+def test_configure_hashing_executor_replace(hashing_executor):
+    custom_executor = ThreadPoolExecutor(max_workers=2)
+    executor = password.configure_hashing_executor(executor=custom_executor)
+    assert executor is custom_executor
+    assert password.hashing_executor is custom_executor
+
+    with pytest.raises(RuntimeError):
+        hashing_executor.submit(print)
+
+
+def test_get_dummy_password_hash(mocker):
+    mocker.patch.object(password, "_dummy_password_hash", None)
+    dummy_password_hash = password.get_dummy_password_hash()
+    assert password.pwd_context.identify(dummy_password_hash) == "bcrypt"
+    assert password.get_dummy_password_hash() == dummy_password_hash
+
+    mocker.patch.object(password, "pwd_context", CryptContext(schemes=["md5_crypt"]))
+    assert password.pwd_context.identify(password.get_dummy_password_hash()) == (
+        "md5_crypt"
+    )
+
+
+@pytest.mark.asyncio
+async def test_verify_dummy_password_async(mocker):
+    mocker.spy(password, "verify_and_update_password")
+    mocker.spy(password.pwd_context, "hash")
+
+    await password.verify_dummy_password_async("guinevere")
+    await password.verify_dummy_password_async("lancelot")
+
+    assert password.verify_and_update_password.call_count == 2
+    assert password.pwd_context.hash.call_count <= 1
+
+
+def test_get_password_context_unsupported_scheme():
+    with pytest.raises(ValueError):
+        password.get_password_context("md5_crypt")
+
+
+@pytest.mark.parametrize(
+    "scheme,scheme_settings,prefix",
+    [
+        ("bcrypt", {"rounds": 5}, "$2b$05$"),
+        ("scrypt", {"rounds": 8, "block_size": 4}, "$scrypt$ln=8,r=4,p=1$"),
+        (
+            "argon2",
+            {"time_cost": 1, "memory_cost": 1024, "parallelism": 1},
+            "$argon2id$v=19$m=1024,t=1,p=1$",
+        ),
+    ],
+)
+def test_get_password_context(scheme, scheme_settings, prefix):
+    if scheme == "argon2":
+        pytest.importorskip("argon2")
+
+    context = password.get_password_context(scheme, **scheme_settings)
+    hashed_password = context.hash("guinevere")
+    assert hashed_password.startswith(prefix)
+    assert context.verify("guinevere", hashed_password) is True
+
+
+@pytest.mark.parametrize("scheme", ["scrypt", "argon2"])
+def test_password_context_migrate_bcrypt(mocker, scheme):
+    if scheme == "argon2":
+        pytest.importorskip("argon2")
+
+    bcrypt_password_hash = password.get_password_hash("guinevere")
+    mocker.patch.object(password, "pwd_context", password.pwd_context)
+    password.configure_password_context(
+        password.get_password_context(scheme, rounds=4)
+        if scheme == "scrypt"
+        else password.get_password_context(scheme, memory_cost=1024)
+    )
+
+    verified, updated_password_hash = password.verify_and_update_password(
+        "guinevere", bcrypt_password_hash
+    )
+    assert verified is True
+    assert password.pwd_context.identify(updated_password_hash) == scheme
+
+    verified, updated_password_hash = password.verify_and_update_password(
+        "guinevere", updated_password_hash
+    )
+    assert verified is True
+    assert updated_password_hash is None
+
+
+def test_calibrate_password_context(mocker):
+    # Simulated hashing duration doubling with each bcrypt round
+    def time_password_hash(context, samples):
+        rounds = context.to_dict()["bcrypt__rounds"]
+        return 0.001 * 2 ** (rounds - 4)
+
+    mocker.patch.object(password, "_time_password_hash", time_password_hash)
+
+    context = password.calibrate_password_context("bcrypt", target_seconds=0.05)
+    assert context.to_dict()["bcrypt__rounds"] == 9
+    assert context.default_scheme() == "bcrypt"
+
+
+def test_calibrate_password_context_argon2_memory(mocker):
+    # Simulated hashing duration proportional to time and memory costs
+    def time_password_hash(context, samples):
+        settings = context.to_dict()
+        return 0.00001 * settings["argon2__time_cost"] * settings["argon2__memory_cost"]
+
+    mocker.patch.object(password, "_time_password_hash", time_password_hash)
+
+    context = password.calibrate_password_context("argon2", target_seconds=0.05)
+    settings = context.to_dict()
+    assert settings["argon2__memory_cost"] == 4864
+    assert settings["argon2__time_cost"] == 1
+
+
+def test_calibrate_password_context_host():
+    context = password.calibrate_password_context(
+        "scrypt", target_seconds=0.01, samples=1
+    )
+    assert context.default_scheme() == "scrypt"
+    assert context.to_dict()["scrypt__rounds"] >= 10
+
+
+@pytest.mark.asyncio
+class TestHashingAdmissionController:
+    async def test_in_flight_limit(self):
+        admission_controller = password.HashingAdmissionController(
+            max_in_flight=2, max_queue_depth=10
+        )
+        release = asyncio.Event()
+        max_in_flight = 0
+
+        async def hash_password():
+            nonlocal max_in_flight
+            async with admission_controller.admit():
+                max_in_flight = max(max_in_flight, admission_controller.in_flight)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hash_password()) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert admission_controller.in_flight == 2
+        assert admission_controller.queue_depth == 3
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert max_in_flight == 2
+        assert admission_controller.get_metrics() == {
+            "in_flight": 0,
+            "queue_depth": 0,
+            "admitted": 5,
+            "rejected": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+        }
+
+    async def test_queue_full(self):
+        admission_controller = password.HashingAdmissionController(
+            max_in_flight=1, max_queue_depth=1, retry_after_seconds=3
+        )
+        release = asyncio.Event()
+
+        async def hash_password():
+            async with admission_controller.admit():
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hash_password()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(password.PasswordHashingOverloadedError) as excinfo:
+            await hash_password()
+        assert excinfo.value.retry_after_seconds == 3
+        assert admission_controller.rejected_queue_full == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert admission_controller.admitted == 2
+
+    async def test_queue_timeout(self):
+        admission_controller = password.HashingAdmissionController(
+            max_in_flight=1, max_queue_depth=1, queue_timeout_seconds=0.01
+        )
+        release = asyncio.Event()
+
+        async def hash_password():
+            async with admission_controller.admit():
+                await release.wait()
+
+        task = asyncio.ensure_future(hash_password())
+        await asyncio.sleep(0)
+
+        with pytest.raises(password.PasswordHashingOverloadedError):
+            await hash_password()
+        assert admission_controller.rejected_timeout == 1
+        assert admission_controller.queue_depth == 0
+
+        release.set()
+        await task
+        assert admission_controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_configure_hashing_admission(mocker):
+    mocker.patch.object(password, "hashing_admission_controller", None)
+    admission_controller = password.configure_hashing_admission(max_in_flight=1)
+    assert password.hashing_admission_controller is admission_controller
+
+    await password.get_password_hash_async("guinevere")
+    assert admission_controller.admitted == 1
+    assert admission_controller.in_flight == 0
+
+
+@pytest.fixture
+def spawn_hashing_executor(mocker):
+    mocker.patch.object(password, "pwd_context", password.pwd_context)
+    mocker.patch.object(password, "_dummy_password_hash", None)
+    yield functools.partial(
+        password.configure_hashing_executor,
+        max_workers=1,
+        use_processes=True,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    password.hashing_executor.shutdown()
+    password.hashing_executor = None
+    password._hashing_process_pool_settings = None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("configure_context_first", [True, False])
+async def test_process_pool_password_context(
+    spawn_hashing_executor, configure_context_first
+):
+    context = password.get_password_context("scrypt", rounds=4)
+    if configure_context_first:
+        password.configure_password_context(context)
+        spawn_hashing_executor()
+    else:
+        executor = spawn_hashing_executor()
+        password.configure_password_context(context)
+        assert password.hashing_executor is not executor
+
+    # Spawned workers import the module again, with the default context
+    hashed_password = await password.get_password_hash_async("guinevere")
+    assert context.identify(hashed_password) == "scrypt"
+
+    verified, updated_password_hash = await password.verify_and_update_password_async(
+        "guinevere", context.hash("guinevere")
+    )
+    assert verified is True
+    assert updated_password_hash is None
+
+    await password.verify_dummy_password_async("guinevere")
+
+
+def test_init_hashing_worker(mocker):
+    mocker.patch.object(password, "pwd_context", password.pwd_context)
+    mocker.patch.object(password, "_dummy_password_hash", None)
+    password.get_dummy_password_hash()
+    context = password.get_password_context("scrypt", rounds=4)
+
+    password.init_hashing_worker(context.to_string())
+    assert password.pwd_context.to_string() == context.to_string()
+    assert password.pwd_context.identify(password.get_dummy_password_hash()) == (
+        "scrypt"
+    )
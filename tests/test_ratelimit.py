@@ -0,0 +1,128 @@
+import pytest
+from starlette.requests import Request
+
+from fastapi_users import ratelimit
+from fastapi_users.ratelimit import (
+    BaseRateLimitStore,
+    InMemoryRateLimitStore,
+    RateLimit,
+    RateLimiter,
+    RateLimitExceededError,
+)
+
+
+class MockClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(mocker) -> MockClock:
+    clock = MockClock()
+    mocker.patch.object(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def create_request(host: str) -> Request:
+    return Request({"type": "http", "client": (host, 1234), "headers": []})
+
+
+@pytest.mark.asyncio
+async def test_base_store():
+    store = BaseRateLimitStore()
+    with pytest.raises(NotImplementedError):
+        await store.hit("key", RateLimit(times=1, seconds=1))
+
+
+@pytest.mark.asyncio
+class TestInMemoryRateLimitStore:
+    async def test_burst_and_refill(self, clock: MockClock):
+        store = InMemoryRateLimitStore()
+        rate_limit = RateLimit(times=3, seconds=60)
+
+        for _ in range(3):
+            assert await store.hit("key", rate_limit) == 0
+        assert await store.hit("key", rate_limit) == pytest.approx(20)
+        assert await store.hit("other_key", rate_limit) == 0
+
+        clock.now += 10
+        assert await store.hit("key", rate_limit) == pytest.approx(10)
+
+        clock.now += 10
+        assert await store.hit("key", rate_limit) == 0
+        assert await store.hit("key", rate_limit) == pytest.approx(20)
+
+    async def test_eviction(self, clock: MockClock):
+        store = InMemoryRateLimitStore(shards=1, eviction_interval_seconds=30)
+        rate_limit = RateLimit(times=2, seconds=60)
+
+        await store.hit("key", rate_limit)
+        await store.hit("other_key", rate_limit)
+        await store.hit("other_key", rate_limit)
+        assert len(store) == 2
+
+        # "key" is full again after 30 seconds, "other_key" after 60 seconds
+        clock.now += 30
+        await store.hit("new_key", rate_limit)
+        assert len(store) == 2
+
+        clock.now += 30
+        await store.hit("new_key", rate_limit)
+        assert len(store) == 1
+
+
+@pytest.mark.asyncio
+class TestRateLimiter:
+    async def test_ip_limit(self, clock: MockClock):
+        rate_limiter = RateLimiter(
+            ip_limit=RateLimit(times=2, seconds=60), email_limit=None
+        )
+
+        await rate_limiter.check("login", create_request("127.0.0.1"))
+        await rate_limiter.check("login", create_request("127.0.0.1"))
+        with pytest.raises(RateLimitExceededError) as excinfo:
+            await rate_limiter.check("login", create_request("127.0.0.1"))
+        assert excinfo.value.retry_after_seconds == 30
+
+        await rate_limiter.check("login", create_request("127.0.0.2"))
+        await rate_limiter.check("register", create_request("127.0.0.1"))
+
+    async def test_email_limit(self, clock: MockClock):
+        rate_limiter = RateLimiter(
+            ip_limit=None, email_limit=RateLimit(times=1, seconds=60)
+        )
+
+        await rate_limiter.check(
+            "login", create_request("127.0.0.1"), "king.arthur@camelot.bt"
+        )
+        with pytest.raises(RateLimitExceededError):
+            await rate_limiter.check(
+                "login", create_request("127.0.0.2"), "King.Arthur@camelot.bt"
+            )
+
+        await rate_limiter.check("login", create_request("127.0.0.1"))
+        await rate_limiter.check(
+            "login", create_request("127.0.0.1"), "lancelot@camelot.bt"
+        )
+
+    async def test_custom_store_and_client_ip(self, mocker):
+        store = InMemoryRateLimitStore()
+        mocker.spy(store, "hit")
+        rate_limiter = RateLimiter(
+            store=store,
+            get_client_ip=lambda request: request.headers["x-forwarded-for"],
+        )
+        request = Request(
+            {
+                "type": "http",
+                "client": ("127.0.0.1", 1234),
+                "headers": [(b"x-forwarded-for", b"10.0.0.1")],
+            }
+        )
+
+        await rate_limiter.check("login", request, "king.arthur@camelot.bt")
+        keys = [call[0][0] for call in store.hit.call_args_list]
+        assert keys == ["login:ip:10.0.0.1", "login:email:king.arthur@camelot.bt"]
@@ -75,6 +75,17 @@ class TestLogin:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {"token": str(user.id)}
 
+    async def test_hashing_overloaded(
+        self, path, test_app_client: httpx.AsyncClient, overloaded_hashing
+    ):
+        data = {"username": "king.arthur@camelot.bt", "password": "guinevere"}
+        response = await test_app_client.post(path, data=data)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "5"
+        data = cast(Dict[str, Any], response.json())
+        assert data["detail"] == ErrorCode.PASSWORD_HASHING_OVERLOADED
+        assert overloaded_hashing.rejected_queue_full == 1
+
     async def test_inactive_user(self, path, test_app_client: httpx.AsyncClient):
         data = {"username": "percival@camelot.bt", "password": "angharad"}
         response = await test_app_client.post(path, data=data)
@@ -98,3 +109,39 @@ class TestLogout:
             path, headers={"Authorization": f"Bearer {user.id}"}
         )
         assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.fixture
+@pytest.mark.asyncio
+async def rate_limited_app_client(
+    mock_user_db, mock_authentication, rate_limiter, get_test_client
+) -> AsyncGenerator[httpx.AsyncClient, None]:
+    authenticator = Authenticator([mock_authentication], mock_user_db)
+    auth_router = get_auth_router(
+        mock_authentication, mock_user_db, authenticator, rate_limiter
+    )
+
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/mock")
+
+    async for client in get_test_client(app):
+        yield client
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+async def test_login_rate_limit(
+    mocker, rate_limited_app_client: httpx.AsyncClient, mock_user_db
+):
+    mocker.spy(mock_user_db, "authenticate")
+
+    data = {"username": "king.arthur@camelot.bt", "password": "percival"}
+    response = await rate_limited_app_client.post("/mock/login", data=data)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = await rate_limited_app_client.post("/mock/login", data=data)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "60"
+    data = cast(Dict[str, Any], response.json())
+    assert data["detail"] == ErrorCode.RATE_LIMIT_EXCEEDED
+    assert mock_user_db.authenticate.call_count == 1
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import asynctest
+import pytest
+
+from fastapi_users.router import (
+    BackgroundHookDispatcher,
+    HookDispatcher,
+    QueueHookDispatcher,
+)
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+async def test_inline_dispatcher():
+    dispatcher = HookDispatcher()
+    sync_handler = MagicMock(return_value=None)
+    async_handler = asynctest.CoroutineMock(return_value=None)
+
+    await dispatcher.dispatch(sync_handler, "lancelot", foo="bar")
+    await dispatcher.dispatch(async_handler, "lancelot", foo="bar")
+
+    sync_handler.assert_called_once_with("lancelot", foo="bar")
+    async_handler.assert_awaited_once_with("lancelot", foo="bar")
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+class TestBackgroundHookDispatcher:
+    async def test_not_awaited(self):
+        dispatcher = BackgroundHookDispatcher()
+        release = asyncio.Event()
+        done = []
+
+        async def handler(value):
+            await release.wait()
+            done.append(value)
+
+        await dispatcher.dispatch(handler, "lancelot")
+        assert done == []
+
+        release.set()
+        await dispatcher.join()
+        assert done == ["lancelot"]
+
+    async def test_sync_handler_in_threadpool(self):
+        dispatcher = BackgroundHookDispatcher()
+        threads = []
+
+        def handler():
+            threads.append(threading.current_thread())
+
+        await dispatcher.dispatch(handler)
+        await dispatcher.join()
+        assert threads[0] is not threading.main_thread()
+
+    async def test_failure_logged(self, caplog):
+        dispatcher = BackgroundHookDispatcher()
+        handler = asynctest.CoroutineMock(side_effect=ValueError("SMTP down"))
+
+        await dispatcher.dispatch(handler)
+        await dispatcher.join()
+        assert "SMTP down" in caplog.text
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+class TestQueueHookDispatcher:
+    async def test_run_by_workers(self):
+        dispatcher = QueueHookDispatcher(workers=2)
+        sync_handler = MagicMock(return_value=None)
+        async_handler = asynctest.CoroutineMock(return_value=None)
+
+        for i in range(3):
+            await dispatcher.dispatch(sync_handler, i)
+            await dispatcher.dispatch(async_handler, i)
+        await dispatcher.close()
+
+        assert sync_handler.call_count == 3
+        assert async_handler.await_count == 3
+        assert dispatcher.get_metrics() == {
+            "queue_size": 0,
+            "dispatched": 6,
+            "succeeded": 6,
+            "retried": 0,
+            "failed": 0,
+            "dropped": 0,
+        }
+
+    async def test_retries(self):
+        dispatcher = QueueHookDispatcher(max_retries=2, retry_delay_seconds=0)
+        flaky_handler = asynctest.CoroutineMock(
+            side_effect=[ValueError(), ValueError(), None]
+        )
+        failing_handler = asynctest.CoroutineMock(side_effect=ValueError())
+
+        await dispatcher.dispatch(flaky_handler)
+        await dispatcher.dispatch(failing_handler)
+        await dispatcher.close()
+
+        assert flaky_handler.await_count == 3
+        assert failing_handler.await_count == 3
+        assert dispatcher.succeeded == 1
+        assert dispatcher.retried == 4
+        assert dispatcher.failed == 1
+
+    async def test_queue_full(self):
+        dispatcher = QueueHookDispatcher(max_size=1)
+        release = asyncio.Event()
+        handler = asynctest.CoroutineMock(side_effect=lambda: release.wait())
+
+        await dispatcher.dispatch(handler)
+        # Let the worker take the first hook
+        await asyncio.sleep(0)
+        await dispatcher.dispatch(handler)
+        await dispatcher.dispatch(handler)
+        assert dispatcher.queue_size == 1
+        assert dispatcher.dropped == 1
+
+        release.set()
+        await dispatcher.close()
+        assert handler.await_count == 2
+        assert dispatcher.dispatched == 2
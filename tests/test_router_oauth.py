@@ -182,6 +182,7 @@ class TestCallback:
         test_app_client: httpx.AsyncClient,
         oauth_client,
         user_oauth,
+        oauth_account1,
         after_register,
     ):
         state_jwt = generate_state_token({"authentication_backend": "mock"}, "SECRET")
@@ -206,6 +207,10 @@ class TestCallback:
 
         get_id_email_mock.assert_awaited_once_with("TOKEN")
         user_update_mock.assert_awaited_once()
+        updated_user = user_update_mock.call_args[0][0]
+        updated_oauth_account = updated_user.oauth_accounts[0]
+        assert updated_oauth_account.id == oauth_account1.id
+        assert updated_oauth_account.expires_at == 1579179542
         data = cast(Dict[str, Any], response.json())
 
         assert data["token"] == str(user_oauth.id)
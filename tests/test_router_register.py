@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, AsyncGenerator, Dict, cast
 from unittest.mock import MagicMock
 
@@ -6,7 +7,11 @@ import httpx
 import pytest
 from fastapi import FastAPI, Request, status
 
-from fastapi_users.router import ErrorCode, get_register_router
+from fastapi_users.router import (
+    BackgroundHookDispatcher,
+    ErrorCode,
+    get_register_router,
+)
 from tests.conftest import User, UserCreate, UserDB
 
 SECRET = "SECRET"
@@ -91,6 +96,17 @@ class TestRegister:
         assert data["detail"] == ErrorCode.REGISTER_USER_ALREADY_EXISTS
         assert after_register.called is False
 
+    async def test_hashing_overloaded(
+        self, test_app_client: httpx.AsyncClient, after_register, overloaded_hashing
+    ):
+        json = {"email": "lancelot@camelot.bt", "password": "guinevere"}
+        response = await test_app_client.post("/register", json=json)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "5"
+        data = cast(Dict[str, Any], response.json())
+        assert data["detail"] == ErrorCode.PASSWORD_HASHING_OVERLOADED
+        assert after_register.called is False
+
     @pytest.mark.parametrize("email", ["lancelot@camelot.bt", "Lancelot@camelot.bt"])
     async def test_valid_body(
         self, email, test_app_client: httpx.AsyncClient, after_register
@@ -140,3 +156,72 @@ class TestRegister:
 
         data = cast(Dict[str, Any], response.json())
         assert data["is_active"] is True
+
+
+@pytest.fixture
+@pytest.mark.asyncio
+async def rate_limited_app_client(
+    mock_user_db, rate_limiter, get_test_client
+) -> AsyncGenerator[httpx.AsyncClient, None]:
+    register_router = get_register_router(
+        mock_user_db, User, UserCreate, UserDB, rate_limiter=rate_limiter
+    )
+
+    app = FastAPI()
+    app.include_router(register_router)
+
+    async for client in get_test_client(app):
+        yield client
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+async def test_register_rate_limit(
+    mocker, rate_limited_app_client: httpx.AsyncClient, mock_user_db
+):
+    mocker.spy(mock_user_db, "create")
+
+    json = {"email": "lancelot@camelot.bt", "password": "guinevere"}
+    response = await rate_limited_app_client.post("/register", json=json)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = await rate_limited_app_client.post("/register", json=json)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert "Retry-After" in response.headers
+    data = cast(Dict[str, Any], response.json())
+    assert data["detail"] == ErrorCode.RATE_LIMIT_EXCEEDED
+    assert mock_user_db.create.call_count == 1
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+async def test_register_background_hook(mock_user_db, get_test_client):
+    hook_dispatcher = BackgroundHookDispatcher()
+    release = asyncio.Event()
+    registered_users = []
+
+    async def after_register(user: UserDB, request: Request):
+        await release.wait()
+        registered_users.append(user)
+
+    register_router = get_register_router(
+        mock_user_db,
+        User,
+        UserCreate,
+        UserDB,
+        after_register,
+        hook_dispatcher=hook_dispatcher,
+    )
+    app = FastAPI()
+    app.include_router(register_router)
+
+    async for client in get_test_client(app):
+        json = {"email": "lancelot@camelot.bt", "password": "guinevere"}
+        response = await client.post("/register", json=json)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert registered_users == []
+
+        release.set()
+        await hook_dispatcher.join()
+        assert len(registered_users) == 1
+        assert registered_users[0].email == "lancelot@camelot.bt"
@@ -154,6 +154,24 @@ class TestRegister:
         request = activation_callback.call_args[0][2]
         assert isinstance(request, Request)
 
+    async def test_existing_inactive_user(
+        self,
+        test_app_client: httpx.AsyncClient,
+        inactive_user: UserDB,
+        after_register,
+        activation_callback,
+    ):
+        json = {"email": inactive_user.email, "password": "guinevere"}
+        response = await test_app_client.post("/register", json=json)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert after_register.called is False
+        assert activation_callback.called is True
+        data = cast(Dict[str, Any], response.json())
+        assert data["id"] == str(inactive_user.id)
+
+        actual_user = activation_callback.call_args[0][0]
+        assert actual_user.id == inactive_user.id
+
     async def test_valid_body_is_superuser(
         self, test_app_client: httpx.AsyncClient, after_register, activation_callback
     ):
@@ -200,3 +200,38 @@ class TestResetPassword:
 
         updated_user = mock_user_db.update.call_args[0][0]
         assert updated_user.hashed_password != current_hashed_password
+
+
+@pytest.fixture
+@pytest.mark.asyncio
+async def rate_limited_app_client(
+    mock_user_db, rate_limiter, get_test_client
+) -> AsyncGenerator[httpx.AsyncClient, None]:
+    reset_router = get_reset_password_router(
+        mock_user_db, SECRET, LIFETIME, rate_limiter=rate_limiter
+    )
+
+    app = FastAPI()
+    app.include_router(reset_router)
+
+    async for client in get_test_client(app):
+        yield client
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+async def test_forgot_password_rate_limit(
+    mocker, rate_limited_app_client: httpx.AsyncClient, mock_user_db
+):
+    mocker.spy(mock_user_db, "get_by_email")
+
+    json = {"email": "king.arthur@camelot.bt"}
+    response = await rate_limited_app_client.post("/forgot-password", json=json)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    response = await rate_limited_app_client.post("/forgot-password", json=json)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert "Retry-After" in response.headers
+    data = cast(Dict[str, Any], response.json())
+    assert data["detail"] == ErrorCode.RATE_LIMIT_EXCEEDED
+    assert mock_user_db.get_by_email.call_count == 1
@@ -4,9 +4,10 @@ from unittest.mock import MagicMock
 import asynctest
 import httpx
 import pytest
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, Request, Response, status
 
-from fastapi_users.authentication import Authenticator
+from fastapi_users.authentication import Authenticator, JWTAuthentication
+from fastapi_users.models import UserFromClaims
 from fastapi_users.router import get_users_router
 from tests.conftest import MockAuthentication, User, UserDB, UserUpdate
 
@@ -206,6 +207,147 @@ class TestUpdateMe:
         request = after_update.call_args[0][2]
         assert isinstance(request, Request)
 
+    async def test_user_from_stateless_token(
+        self, mocker, mock_user_db, get_test_client, user: UserDB, after_update
+    ):
+        jwt_authentication = JWTAuthentication(SECRET, LIFETIME, stateless=True)
+        user_router = get_users_router(
+            mock_user_db,
+            User,
+            UserUpdate,
+            UserDB,
+            Authenticator([jwt_authentication], mock_user_db),
+            after_update,
+        )
+        app = FastAPI()
+        app.include_router(user_router)
+        login_response = await jwt_authentication.get_login_response(user, Response())
+        mocker.spy(mock_user_db, "update")
+
+        async for client in get_test_client(app):
+            response = await client.patch(
+                "/me",
+                json={"email": "king.arthur@tintagel.bt"},
+                headers={"Authorization": f"Bearer {login_response['access_token']}"},
+            )
+        assert response.status_code == status.HTTP_200_OK
+
+        # The user is retrieved from the database before being written
+        updated_user = mock_user_db.update.call_args[0][0]
+        assert not isinstance(updated_user, UserFromClaims)
+        assert updated_user.hashed_password == user.hashed_password
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+class TestListUsers:
+    async def test_missing_token(self, test_app_client: httpx.AsyncClient):
+        response = await test_app_client.get("/")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_regular_user(self, test_app_client: httpx.AsyncClient, user: UserDB):
+        response = await test_app_client.get(
+            "/", headers={"Authorization": f"Bearer {user.id}"}
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.parametrize("limit", [0, 101])
+    async def test_invalid_limit(
+        self, test_app_client: httpx.AsyncClient, superuser: UserDB, limit: int
+    ):
+        response = await test_app_client.get(
+            "/",
+            params={"limit": limit},
+            headers={"Authorization": f"Bearer {superuser.id}"},
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_pages(self, test_app_client: httpx.AsyncClient, superuser: UserDB):
+        headers = {"Authorization": f"Bearer {superuser.id}"}
+        ids = []
+        params: Dict[str, Any] = {"limit": 3}
+        while True:
+            response = await test_app_client.get("/", params=params, headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+
+            data = cast(Dict[str, Any], response.json())
+            assert len(data["results"]) <= 3
+            assert all("hashed_password" not in user for user in data["results"])
+            ids += [user["id"] for user in data["results"]]
+            if data["next_cursor"] is None:
+                break
+            assert data["next_cursor"] == ids[-1]
+            params["cursor"] = data["next_cursor"]
+
+        assert len(ids) == 4
+        assert ids == sorted(ids)
+
+    async def test_filters(
+        self,
+        test_app_client: httpx.AsyncClient,
+        superuser: UserDB,
+        inactive_user: UserDB,
+    ):
+        response = await test_app_client.get(
+            "/",
+            params={"is_active": False, "email_prefix": "PERCI"},
+            headers={"Authorization": f"Bearer {superuser.id}"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        data = cast(Dict[str, Any], response.json())
+        assert [user["id"] for user in data["results"]] == [str(inactive_user.id)]
+        assert data["next_cursor"] is None
+
+
+@pytest.mark.router
+@pytest.mark.asyncio
+class TestExportUsers:
+    async def test_missing_token(self, test_app_client: httpx.AsyncClient):
+        response = await test_app_client.get("/export")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_regular_user(self, test_app_client: httpx.AsyncClient, user: UserDB):
+        response = await test_app_client.get(
+            "/export", headers={"Authorization": f"Bearer {user.id}"}
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_invalid_format(
+        self, test_app_client: httpx.AsyncClient, superuser: UserDB
+    ):
+        response = await test_app_client.get(
+            "/export",
+            params={"format": "xml"},
+            headers={"Authorization": f"Bearer {superuser.id}"},
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_ndjson(self, test_app_client: httpx.AsyncClient, superuser: UserDB):
+        response = await test_app_client.get(
+            "/export", headers={"Authorization": f"Bearer {superuser.id}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        lines = response.text.splitlines()
+        assert len(lines) == 4
+        assert all("hashed_password" not in line for line in lines)
+
+    async def test_csv(self, test_app_client: httpx.AsyncClient, superuser: UserDB):
+        response = await test_app_client.get(
+            "/export",
+            params={"format": "csv"},
+            headers={"Authorization": f"Bearer {superuser.id}"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="users.csv"' in response.headers["content-disposition"]
+
+        lines = response.text.splitlines()
+        assert lines[0] == "id,email,is_active,is_superuser,first_name"
+        assert len(lines) == 5
+
 
 @pytest.mark.router
 @pytest.mark.asyncio